@@ -1,145 +1,242 @@
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.booking_request import BookingRequest
 from app.models.listing import Listing
 from app.models.user import User
 from app.schemas import BookingRequestStructure
-from app.database import SessionLocal
 from fastapi import status
+from app.services import availability
+from app.services.result_cache import search_cache
+from app.services.booking_events import broker
 from fastapi.responses import JSONResponse
 
-def get_booking_request_by_id(booking_request_id: int):
-    session = SessionLocal()
-    try:
-        query = session.query(BookingRequest)
-        br_data = query.filter(BookingRequest.id == booking_request_id).first()
-        if not br_data:
-            return None
-        return {
+def get_booking_request_by_id(session: Session, booking_request_id: int):
+    query = session.query(BookingRequest)
+    br_data = query.filter(BookingRequest.id == booking_request_id).first()
+    if not br_data:
+        return None
+    return {
         "listing_id": br_data.listing_id,
         "subletter_id": br_data.subletter_id,
     }
-    finally:
-        session.close()
 
         
-def create_booking_request(data):
-    db = SessionLocal()
-    try:
-        # prevent duplicates
-        existing = db.query(BookingRequest).filter(
-            BookingRequest.subletter_id == data.subletter_id,
-            BookingRequest.listing_id == data.listing_id
-        ).first()
-        if existing:
-            return {"error": "Request already exists"}
-
-        new = BookingRequest(
-            listing_id=data.listing_id,
-            subletter_id=data.subletter_id,
-        )
-        db.add(new)
-        db.commit()
-        db.refresh(new)
-        return new
-    finally:
-        db.close()
-
-
-def delete_booking_request(br_id: int):
-    session = SessionLocal()
-    try:
-        br = session.query(BookingRequest).filter(BookingRequest.id == br_id).first()
-        if not br:
-            return JSONResponse(
-                {"detail": f"Booking request {br_id} not found"},
-                status_code=status.HTTP_404_NOT_FOUND
-            )
-        session.delete(br)
-        session.commit()
+def create_booking_request(db: Session, data):
+    if data.start_date and data.end_date and data.start_date > data.end_date:
+        return {"error": "start_date must be on or before end_date"}
+    # prevent duplicates
+    existing = db.query(BookingRequest).filter(
+        BookingRequest.subletter_id == data.subletter_id,
+        BookingRequest.listing_id == data.listing_id
+    ).first()
+    if existing:
+        return {"error": "Request already exists"}
+
+    new = BookingRequest(
+        listing_id=data.listing_id,
+        subletter_id=data.subletter_id,
+        start_date=data.start_date,
+        end_date=data.end_date,
+    )
+    db.add(new)
+    db.commit()
+    db.refresh(new)
+    found = get_incoming_request(db, new.id)
+    if found:
+        broker.publish(found[0], "added", found[1])
+    return new
+
+
+def delete_booking_request(session: Session, br_id: int):
+    br = session.query(BookingRequest).filter(BookingRequest.id == br_id).first()
+    if not br:
         return JSONResponse(
-            {"message": "Deleted booking request", "br_id": br_id},
-            status_code=status.HTTP_200_OK
+            {"detail": f"Booking request {br_id} not found"},
+            status_code=status.HTTP_404_NOT_FOUND
         )
-    finally:
-        session.close()
-
-def get_incoming_requests(owner_id: int):
-    session = SessionLocal()
-    try:
-        rows = (
-            session.query(BookingRequest, Listing, User)
-            .join(Listing, BookingRequest.listing_id == Listing.id)
-            .join(User, BookingRequest.subletter_id == User.id)
-            .filter(Listing.lister == owner_id, BookingRequest.status == "pending")
-            .all()
+    owner_id = session.query(Listing.lister).filter(Listing.id == br.listing_id).scalar()
+    listing_id, old_status = br.listing_id, br.status
+    session.delete(br)
+    session.commit()
+    if old_status == "pending" and owner_id is not None:
+        broker.publish(owner_id, "removed", {"id": br_id, "status": "deleted"})
+    if old_status == "approved":
+        # the booked dates are free again, as _transition does when they get booked
+        availability.refresh_listing(session, listing_id)
+        search_cache.invalidate()
+    return JSONResponse(
+        {"message": "Deleted booking request", "br_id": br_id},
+        status_code=status.HTTP_200_OK
+    )
+
+# Plain columns rather than three ORM entities per row: nothing here is modified,
+# so there's no need to build and track objects only to read a few attributes
+_INCOMING_COLUMNS = (
+    Listing.lister,
+    BookingRequest.id, BookingRequest.listing_id, BookingRequest.subletter_id, BookingRequest.status, BookingRequest.created_at,
+    Listing.title, Listing.city, Listing.cost_per_month,
+    User.name, User.email,
+)
+
+
+def _incoming_query():
+    return (
+        select(*_INCOMING_COLUMNS)
+        .select_from(BookingRequest)
+        .join(Listing, BookingRequest.listing_id == Listing.id)
+        .join(User, BookingRequest.subletter_id == User.id)
+        .where(BookingRequest.status == "pending")
+    )
+
+
+def _incoming_row(row) -> list:
+    _, req_id, listing_id, subletter_id, req_status, created_at, title, city, cost, name, email = row
+    return [
+        {
+            "id": req_id,
+            "listing_id": listing_id,
+            "subletter_id": subletter_id,
+            "status": req_status,
+            "created_at": created_at.isoformat() if created_at else None,
+        },
+        {"id": listing_id, "title": title, "city": city, "cost_per_month": cost},
+        {"id": subletter_id, "name": name, "email": email},
+    ]
+
+
+def get_incoming_requests(session: Session, owner_id: int):
+    rows = session.execute(_incoming_query().where(Listing.lister == owner_id)).all()
+    return [_incoming_row(row) for row in rows]
+
+
+def get_incoming_request(session: Session, req_id: int):
+    """(owner_id, row) for one pending request, in the get_incoming_requests row shape."""
+    row = session.execute(_incoming_query().where(BookingRequest.id == req_id)).first()
+    if not row:
+        return None
+    return row[0], _incoming_row(row)
+
+# Both moderation actions move a request out of "pending" with one conditional
+# UPDATE: the owner check is an EXISTS on the listing and the contact emails come
+# back through RETURNING, so a request can only change state once even when two
+# approvals race. Backends without UPDATE ... RETURNING (MySQL) lock the matching
+# rows with SELECT ... FOR UPDATE first and then update exactly those.
+def _transition(db: Session, req_ids, owner_id: int, new_status: str) -> list:
+    """Move the owner's pending requests in req_ids to new_status; returns the updated rows."""
+    owns_listing = (
+        select(Listing.id)
+        .where(Listing.id == BookingRequest.listing_id, Listing.lister == owner_id)
+        .exists()
+    )
+    owner_email = select(User.email).where(User.id == owner_id).scalar_subquery()
+    requester_email = select(User.email).where(User.id == BookingRequest.subletter_id).scalar_subquery()
+    movable = (BookingRequest.id.in_(req_ids), BookingRequest.status == "pending", owns_listing)
+    returned = (BookingRequest.id, BookingRequest.listing_id, owner_email, requester_email)
+    if db.get_bind().dialect.update_returning:
+        stmt = (
+            update(BookingRequest)
+            .where(*movable)
+            .values(status=new_status)
+            .returning(*returned)
+            .execution_options(synchronize_session=False)
         )
+        rows = db.execute(stmt).all()
+    else:
+        rows = db.execute(select(*returned).where(*movable).with_for_update(of=BookingRequest)).all()
+        if rows:
+            db.execute(
+                update(BookingRequest)
+                .where(BookingRequest.id.in_([row[0] for row in rows]))
+                .values(status=new_status)
+                .execution_options(synchronize_session=False)
+            )
+    db.commit()
+    for row in rows:
+        broker.publish(owner_id, "removed", {"id": row[0], "status": new_status})
+    if new_status == "approved":
+        for listing_id in {row[1] for row in rows}:
+            availability.refresh_listing(db, listing_id)
+        if rows:
+            search_cache.invalidate()
+    return rows
+
+
+def _transition_errors(db: Session, req_ids, owner_id: int) -> dict:
+    """Why each of req_ids could not be moved; only runs when an UPDATE missed."""
+    found = db.execute(
+        select(BookingRequest.id, BookingRequest.status, Listing.lister)
+        .join(Listing, BookingRequest.listing_id == Listing.id)
+        .where(BookingRequest.id.in_(req_ids))
+    ).all()
+    errors = {req_id: "Request not found" for req_id in req_ids}
+    for req_id, req_status, lister in found:
+        if lister != owner_id:
+            errors[req_id] = "Unauthorized"
+        else:
+            errors[req_id] = f"Request already {req_status}"
+    return errors
+
+
+def _contact_info(row) -> dict:
+    return {"owner_email": row[2], "requester_email": row[3]}
+
+
+def approve_request(db: Session, req_id, owner_id):
+    rows = _transition(db, [req_id], owner_id, "approved")
+    if not rows:
+        return {"error": _transition_errors(db, [req_id], owner_id)[req_id]}
+    return {"ok": True, "contact_info": _contact_info(rows[0])}
+
+
+def reject_request(db: Session, req_id, owner_id):
+    rows = _transition(db, [req_id], owner_id, "rejected")
+    if not rows:
+        return {"error": _transition_errors(db, [req_id], owner_id)[req_id]}
+    return {"ok": True}
+
+
+def moderate_requests(db: Session, owner_id: int, action: str, req_ids):
+    """Approve or reject many pending requests in one statement."""
+    req_ids = list(dict.fromkeys(req_ids))
+    rows = _transition(db, req_ids, owner_id, "approved" if action == "approve" else "rejected")
+    updated = {row[0]: row for row in rows}
+    missed = [req_id for req_id in req_ids if req_id not in updated]
+    errors = _transition_errors(db, missed, owner_id) if missed else {}
+
+    results = []
+    for req_id in req_ids:
+        if req_id in updated:
+            result = {"id": req_id, "ok": True}
+            if action == "approve":
+                result["contact_info"] = _contact_info(updated[req_id])
+        else:
+            result = {"id": req_id, "error": errors[req_id]}
+        results.append(result)
+    return {"updated": len(updated), "results": results}
+
+
+# Async variants for async endpoints: each runs the sync function above on the
+# AsyncSession's connection, so the event loop is free while the database works.
+async def create_booking_request_async(db: AsyncSession, data):
+    return await db.run_sync(create_booking_request, data)
+
+
+async def delete_booking_request_async(session: AsyncSession, br_id: int):
+    return await session.run_sync(delete_booking_request, br_id)
+
+
+async def get_incoming_requests_async(session: AsyncSession, owner_id: int):
+    return await session.run_sync(get_incoming_requests, owner_id)
+
+
+async def approve_request_async(db: AsyncSession, req_id, owner_id):
+    return await db.run_sync(approve_request, req_id, owner_id)
+
+
+async def reject_request_async(db: AsyncSession, req_id, owner_id):
+    return await db.run_sync(reject_request, req_id, owner_id)
+
 
-        out = []
-        for req, listing, user in rows:
-            req_dict = {
-                "id": req.id,
-                "listing_id": req.listing_id,
-                "subletter_id": req.subletter_id,
-                "status": req.status,
-                "created_at": req.created_at.isoformat() if getattr(req, "created_at", None) else None,
-            }
-            listing_dict = {
-                "id": listing.id,
-                "title": listing.title,
-                "city": listing.city,
-                "cost_per_month": float(listing.cost_per_month) if listing.cost_per_month is not None else None,
-            }
-            user_dict = {
-                "id": user.id,
-                "name": user.name,
-                "email": user.email,
-            }
-            out.append([req_dict, listing_dict, user_dict])
-
-        return out
-    finally:
-        session.close()
-
-def approve_request(req_id, owner_id):
-    db = SessionLocal()
-    try:
-        req = db.query(BookingRequest).filter(BookingRequest.id == req_id).first()
-        if not req:
-            return {"error": "Request not found"}
-
-        listing = db.query(Listing).filter(Listing.id == req.listing_id).first()
-        if listing.lister != owner_id:
-            return {"error": "Unauthorized"}
-
-        req.status = "approved"
-        db.commit()
-
-        requester = db.query(User).filter(User.id == req.subletter_id).first()
-        owner = db.query(User).filter(User.id == owner_id).first()
-
-        return {
-            "ok": True,
-            "contact_info": {
-                "owner_email": owner.email,
-                "requester_email": requester.email
-            }
-        }
-    finally:
-        db.close()
-
-def reject_request(req_id, owner_id):
-    db = SessionLocal()
-    try:
-        req = db.query(BookingRequest).filter(BookingRequest.id == req_id).first()
-        if not req:
-            return {"error": "Request not found"}
-
-        listing = db.query(Listing).filter(Listing.id == req.listing_id).first()
-        if listing.lister != owner_id:
-            return {"error": "Unauthorized"}
-
-        req.status = "rejected"
-        db.commit()
-        return {"ok": True}
-    finally:
-        db.close()
\ No newline at end of file
+async def moderate_requests_async(db: AsyncSession, owner_id: int, action: str, req_ids):
+    return await db.run_sync(moderate_requests, owner_id, action, req_ids)
@@ -1,66 +1,106 @@
+from sqlalchemy import select, func, exists, or_
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.listing import Listing
-from app.schemas import ListingStructure
-from app.database import SessionLocal
-from fastapi import status, Request, Form, UploadFile, File
+from app.models.booking_request import BookingRequest
+from app.schemas import ListingStructure, SearchFilterStructure
+from fastapi import status, Request, Form, UploadFile, File, HTTPException
 from dotenv import load_dotenv
-from fastapi.responses import JSONResponse
-import os, requests
-from fastapi.templating import Jinja2Templates
-import base64
+from fastapi.responses import JSONResponse, RedirectResponse
+import asyncio, os, bisect
+from datetime import date, datetime
 from app.models.user import User
+from app.services.images import ImagePipelineBusy, ImageRejected, store_photo
+from app.services import amenities as amenity_index, availability, cluster_index, search_index, similar, spatial_index
+from app.services.amenities import parse_amenities
+from app.services.geocoding import GeocodeError, get_geocoder
+from app.services.change_tracking import row_version, stored_version
+from app.services.conditional import is_not_modified, not_modified, page_validators
+from app.services.identity import get_identity
+from app.services.result_cache import fragment_cache, search_cache
+from app.templating import render_fragment, templates
 
 load_dotenv()
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-FRONTEND_DIR = os.path.join(BASE_DIR, "../..", "frontend")
-templates = Jinja2Templates(directory=os.path.join(FRONTEND_DIR, "html"))
  
-async def image_to_base64(upload_file):
+async def store_image(upload_file):
+    # Photos are re-encoded on the image pool and go to the blob store; the
+    # listing row only keeps the content hash of the full-size WebP
+    if upload_file is None:
+        return None
     file_bytes = await upload_file.read()
-    base64_string = base64.b64encode(file_bytes).decode('utf-8')
-    return base64_string
-
-def get_listing_by_id(request: Request, listing_id: int, user_id: int | None = None):
-    session = SessionLocal()
-    try:        
-        query = session.query(Listing)
-        listing_data = query.filter(Listing.id == listing_id).first()
+    if not file_bytes:
+        return None
+    try:
+        return await store_photo(file_bytes)
+    except ImageRejected as e:
+        raise HTTPException(status_code=400, detail=f"{upload_file.filename or 'Photo'}: {e}")
+    except ImagePipelineBusy:
+        raise HTTPException(status_code=503, detail="Too many photo uploads right now, please retry", headers={"Retry-After": "2"})
+
+def _listing_page_fields(listing_data) -> dict:
+    return {
+        "id": listing_data.id,
+        "title": listing_data.title,
+        "is_active": listing_data.is_active,
+        "lister": listing_data.lister, 
+        "bedrooms_available": listing_data.bedrooms_available,
+        "total_rooms": listing_data.total_rooms,
+        "bedrooms_in_use": listing_data.bedrooms_in_use, 
+        "bathrooms": listing_data.bathrooms,
+        "cost_per_month": listing_data.cost_per_month,
+        "available_start_date": listing_data.available_start_date,
+        "available_end_date": listing_data.available_end_date,
+        "address": listing_data.address,
+        "city": listing_data.city,
+        "state": listing_data.state,
+        "zip_code": listing_data.zip_code,
+        "amenities": listing_data.amenities,
+        "latitude": listing_data.latitude,
+        "longitude": listing_data.longitude,
+        "image1": listing_data.image1,
+        "image2": listing_data.image2,
+        "image3": listing_data.image3,
+        "image4": listing_data.image4,
+    }
+
+def get_listing_by_id(session: Session, request: Request, listing_id: int, user_id: int | None = None):
+    user_id = user_id or request.session.get("user_id")
+
+    # Validators come from the stored listings counter (one primary-key read, the
+    # same in every worker) and the viewer's row counter, so a matching
+    # If-None-Match is answered before the listing is queried or rendered
+    version, changed_at = stored_version(session, Listing.__tablename__)
+    parts = (listing_id, version, user_id)
+    if user_id:
+        user_version, user_changed_at = row_version(User.__tablename__, user_id)
+        parts += (user_version,)
+        changed_at = max(changed_at, user_changed_at)
+    headers = page_validators("listing", parts, changed_at)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    # The row and the rendered body are cached under the version read above; a
+    # write moves the version on, so they are never served after it
+    apt_key = ("listing", listing_id, version)
+    apt = fragment_cache.get(apt_key)
+    if apt is None:
+        listing_data = session.query(Listing).filter(Listing.id == listing_id).first()
         if not listing_data:
             return None
-        apt = {
-            "id": listing_id,
-            "title": listing_data.title,
-            "is_active": listing_data.is_active,
-            "lister": listing_data.lister, 
-            "bedrooms_available": listing_data.bedrooms_available,
-            "total_rooms": listing_data.total_rooms,
-            "bedrooms_in_use": listing_data.bedrooms_in_use, 
-            "bathrooms": listing_data.bathrooms,
-            "cost_per_month": listing_data.cost_per_month,
-            "available_start_date": listing_data.available_start_date,
-            "available_end_date": listing_data.available_end_date,
-            "address": listing_data.address,
-            "city": listing_data.city,
-            "state": listing_data.state,
-            "zip_code": listing_data.zip_code,
-            "amenities": listing_data.amenities,
-            "latitude": listing_data.latitude,
-            "longitude": listing_data.longitude,
-            "image1": listing_data.image1,
-            "image2": listing_data.image2,
-            "image3": listing_data.image3,
-            "image4": listing_data.image4,
-        }
-        
-        user_id = user_id or request.session.get("user_id")
-        user_name = None
-        if user_id:
-            user = session.get(User, user_id)
-            if user:
-                user_name = user.name
-
-    finally:
-        session.close()
+        apt = _listing_page_fields(listing_data)
+        fragment_cache.put(apt_key, apt, fragment_cache.generation)
+
+    can_request = bool(user_id and user_id != apt["lister"])
+    body_key = ("listing_body", listing_id, version, can_request)
+    listing_body = fragment_cache.get_or_compute(
+        body_key, lambda: render_fragment("fragments/listing_body.html", apt=apt, can_request=can_request)
+    )
+
+    user_name = None
+    if user_id:
+        identity = get_identity(session, user_id)
+        if identity:
+            user_name = identity["name"]
 
     map_key = os.getenv("GOOGLE_MAP_KEY")
 
@@ -69,17 +109,20 @@ def get_listing_by_id(request: Request, listing_id: int, user_id: int | None = N
         {
             "request": request,
             "apt": apt,
+            "listing_body": listing_body,
             "map_key": map_key,
             "user_id": user_id,
-            "latitude": listing_data.latitude,
-            "longitude": listing_data.longitude,
+            "latitude": apt["latitude"],
+            "longitude": apt["longitude"],
             "user_name": user_name,
             "listing_id": listing_id
-        }
+        },
+        headers=headers,
     )
     
 
 async def create_listing(
+    session: AsyncSession,
     request: Request,
     title: str,
     bedrooms_available: int,
@@ -100,67 +143,70 @@ async def create_listing(
     image4: UploadFile = None,
 ):
 
-    # Getting longitude and latitude
-
-    map_key = os.getenv("GOOGLE_MAP_KEY")
-    full_address = f"{address}, {city}, {state} {zip_code}"
+    uid = request.session.get("user_id")
+    if not uid:
+        return RedirectResponse(url="/login", status_code=303)
 
-    geo_url = (
-        "https://maps.googleapis.com/maps/api/geocode/json"
-        f"?address={full_address}&key={map_key}"
-    )
+    try:
+        start_date = date.fromisoformat(available_start_date)
+        end_date = date.fromisoformat(available_end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
 
-    geo_response = requests.get(geo_url).json()
+    # Getting longitude and latitude
 
-    if geo_response["status"] != "OK":
+    full_address = f"{address}, {city}, {state} {zip_code}"
+    try:
+        coords = await get_geocoder().geocode(full_address)
+    except GeocodeError:
+        raise HTTPException(status_code=502, detail="Geocoding service unavailable")
+    if coords is None:
         raise HTTPException(status_code=400, detail="Invalid address - could not geocode")
+    latitude, longitude = coords
 
-    location = geo_response["results"][0]["geometry"]["location"]
-    latitude = location["lat"]
-    longitude = location["lng"]
-
-    # Convert images to base64
-    image1_base64 = await image_to_base64(image1)
-    image2_base64 = await image_to_base64(image2)
-    image3_base64 = await image_to_base64(image3)
-    image4_base64 = await image_to_base64(image4)
+    # Process the photos in parallel on the image pool, then save them to the blob store
+    image1_hash, image2_hash, image3_hash, image4_hash = await asyncio.gather(
+        store_image(image1), store_image(image2), store_image(image3), store_image(image4)
+    )
 
     # Adding the listing to database
 
-    uid = request.session.get("user_id")
-    if not uid:
-        return RedirectResponse(url="/login", status_code=303)
-    session = SessionLocal()
-    try:
-        new_listing = Listing(title=title, lister=uid, is_active=True, bedrooms_available=bedrooms_available, total_rooms=total_rooms, bedrooms_in_use=bedrooms_in_use, bathrooms=bathrooms, cost_per_month=cost_per_month, available_start_date=available_start_date, available_end_date=available_end_date, address=address, city=city, state=state, zip_code=zip_code, amenities=amenities, latitude=latitude, longitude=longitude, image1=image1_base64, image2=image2_base64, image3=image3_base64, image4=image4_base64)
-        session.add(new_listing)
-        session.commit()
-        session.refresh(new_listing) # Adds the id to new_listing
-        return JSONResponse({"message": "Listing added", "listing": {"id": new_listing.id, "title": new_listing.title}}, status_code=status.HTTP_201_CREATED)
-    finally:
-        session.close()
+    new_listing = Listing(title=title, lister=uid, is_active=True, bedrooms_available=bedrooms_available, total_rooms=total_rooms, bedrooms_in_use=bedrooms_in_use, bathrooms=bathrooms, cost_per_month=cost_per_month, available_start_date=start_date, available_end_date=end_date, address=address, city=city, state=state, zip_code=zip_code, amenities=amenities, amenity_mask=parse_amenities(amenities), latitude=latitude, longitude=longitude, image1=image1_hash, image2=image2_hash, image3=image3_hash, image4=image4_hash)
+    session.add(new_listing)
+    await session.commit()  # the session keeps new_listing loaded, id included
+    spatial_index.index_listing(new_listing.id, latitude, longitude, True)
+    cluster_index.index_listing(new_listing.id, latitude, longitude, new_listing.cost_per_month, True)
+    search_index.index_listing(new_listing)
+    amenity_index.index_listing(new_listing)
+    similar.index_listing(new_listing)
+    await session.run_sync(availability.refresh_listing, new_listing.id)
+    search_cache.invalidate()
+    return JSONResponse({"message": "Listing added", "listing": {"id": new_listing.id, "title": new_listing.title}}, status_code=status.HTTP_201_CREATED)
 
 
-def delete_listing(listing_id: int):
-    session = SessionLocal()
-    try:
-        listing = session.query(Listing).filter(Listing.id == listing_id).first()
-        if not listing:
-            return JSONResponse(
-                {"detail": f"Listing {listing_id} not found"},
-                status_code=status.HTTP_404_NOT_FOUND
-            )
-        session.delete(listing)
-        session.commit()
+def delete_listing(session: Session, listing_id: int):
+    listing = session.query(Listing).filter(Listing.id == listing_id).first()
+    if not listing:
         return JSONResponse(
-            {"message": "Deleted listing", "listing": listing_id},
-            status_code=status.HTTP_200_OK
+            {"detail": f"Listing {listing_id} not found"},
+            status_code=status.HTTP_404_NOT_FOUND
         )
-    finally:
-        session.close()
+    session.delete(listing)
+    session.commit()
+    spatial_index.unindex_listing(listing_id)
+    cluster_index.unindex_listing(listing_id)
+    search_index.unindex_listing(listing_id)
+    amenity_index.unindex_listing(listing_id)
+    similar.unindex_listing(listing_id)
+    availability.unindex_listing(listing_id)
+    search_cache.invalidate()
+    return JSONResponse(
+        {"message": "Deleted listing", "listing": listing_id},
+        status_code=status.HTTP_200_OK
+    )
 
 
-def set_listing_active_state(db, listing_id: int, user_id: int, activate: bool):
+def set_listing_active_state(db: Session, listing_id: int, user_id: int, activate: bool):
     listing = db.query(Listing).filter(Listing.id == listing_id).first()
     if not listing:
         return {"error": "Listing not found"}
@@ -170,4 +216,163 @@ def set_listing_active_state(db, listing_id: int, user_id: int, activate: bool):
 
     listing.is_active = activate
     db.commit()
+    spatial_index.index_listing(listing_id, listing.latitude, listing.longitude, activate)
+    cluster_index.index_listing(listing_id, listing.latitude, listing.longitude, listing.cost_per_month, activate)
+    search_index.index_listing(listing)
+    amenity_index.index_listing(listing)
+    similar.index_listing(listing)
+    availability.refresh_listing(db, listing_id)
+    search_cache.invalidate()
     return {"ok": True, "listing_id": listing_id, "is_active": activate}
+
+
+# Async variants for async endpoints: the sync functions above run on the
+# AsyncSession's connection without blocking the event loop.
+async def delete_listing_async(session: AsyncSession, listing_id: int):
+    return await session.run_sync(delete_listing, listing_id)
+
+
+async def set_listing_active_state_async(db: AsyncSession, listing_id: int, user_id: int, activate: bool):
+    return await db.run_sync(set_listing_active_state, listing_id, user_id, activate)
+
+
+async def get_listing_cards_async(session: AsyncSession, ids):
+    return await session.run_sync(get_listing_cards, ids)
+
+
+# Columns the map feed may return; images are digests, so they're cheap to include
+FEED_FIELDS = (
+    "id", "title", "bedrooms_available", "total_rooms", "bedrooms_in_use", "bathrooms",
+    "cost_per_month", "available_start_date", "available_end_date", "address", "city",
+    "state", "zip_code", "amenities", "latitude", "longitude",
+    "image1", "image2", "image3", "image4",
+)
+# What the map needs for a pin, the default for the columnar layout
+COLUMN_FIELDS = ("id", "latitude", "longitude", "cost_per_month")
+
+
+def _feed_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _feed_page(session: Session, after_id: int, limit: int, fields, ids):
+    fields = ("id",) + tuple(f for f in fields if f != "id")
+    columns = [getattr(Listing, f) for f in fields]
+    stmt = select(*columns).order_by(Listing.id)
+    if ids is not None:
+        start = bisect.bisect_right(ids, after_id)
+        page_ids = ids[start:start + limit + 1]
+        if not page_ids:
+            return fields, [], None
+        stmt = stmt.where(Listing.id.in_(page_ids))
+    else:
+        stmt = stmt.where(Listing.latitude.isnot(None), Listing.longitude.isnot(None), Listing.id > after_id)
+    stmt = stmt.limit(limit + 1)  # one extra row tells us whether another page exists
+    rows = session.execute(stmt).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return fields, rows, rows[-1][0] if has_more else None
+
+
+def get_listing_feed(session: Session, after_id: int = 0, limit: int = 100, fields=FEED_FIELDS, ids=None):
+    """
+    One keyset page of geocoded listings, selecting only `fields`.
+    `ids` (sorted) restricts the page to listings already picked by the spatial index.
+    Returns (items, next_after_id); next_after_id is None on the last page.
+    Dates are left as dates for the response's encoder (app.responses).
+    """
+    fields, rows, next_after_id = _feed_page(session, after_id, limit, fields, ids)
+    return [dict(zip(fields, row)) for row in rows], next_after_id
+
+
+def get_listing_feed_columns(session: Session, after_id: int = 0, limit: int = 100, fields=FEED_FIELDS, ids=None):
+    """The same page as parallel arrays, ({field: [values]}, next_after_id)."""
+    fields, rows, next_after_id = _feed_page(session, after_id, limit, fields, ids)
+    values = zip(*rows) if rows else [()] * len(fields)
+    return {f: list(v) for f, v in zip(fields, values)}, next_after_id
+
+
+# What a search result card needs; image1 is the cover photo
+CARD_FIELDS = (
+    "id", "title", "city", "state", "cost_per_month", "bedrooms_available", "bathrooms",
+    "available_start_date", "available_end_date", "latitude", "longitude", "image1",
+)
+
+
+# Above this many candidates an IN list costs more than filtering in SQL
+MAX_AVAILABLE_IDS = 20000
+
+
+def has_amenities(mask: int):
+    """SQL condition: the listing has every amenity in mask."""
+    return Listing.amenity_mask.op("&")(mask) == mask
+
+
+def search_filter_conditions(filters: SearchFilterStructure) -> list:
+    conditions = [Listing.is_active == True]
+    ids = None
+    dated = filters.start_date is not None and filters.end_date is not None
+    if dated:
+        # The availability index knows about approved bookings, not just the listing window
+        ids = availability.get_availability_index().available(filters.start_date, filters.end_date)
+    if filters.amenities:
+        conditions.append(has_amenities(filters.amenities))
+        index = amenity_index.get_amenity_index()
+        if index is not None:
+            # one vectorized pass however many amenities are asked for
+            ids = index.matching(filters.amenities, within=ids)
+    if ids is not None and len(ids) <= MAX_AVAILABLE_IDS:
+        conditions.append(Listing.id.in_(sorted(ids)))
+    elif dated:
+        conditions.append(~exists().where(
+            BookingRequest.listing_id == Listing.id,
+            BookingRequest.status == "approved",
+            or_(BookingRequest.start_date.is_(None), BookingRequest.start_date <= filters.end_date),
+            or_(BookingRequest.end_date.is_(None), BookingRequest.end_date >= filters.start_date),
+        ))
+    if filters.price is not None:
+        conditions.append(Listing.cost_per_month <= filters.price)
+    if filters.bedrooms is not None:
+        conditions.append(Listing.bedrooms_available >= filters.bedrooms)
+    if filters.bathrooms is not None:
+        conditions.append(Listing.bathrooms >= filters.bathrooms)
+    if filters.start_date is not None:
+        conditions.append(Listing.available_start_date <= filters.start_date)
+    if filters.end_date is not None:
+        conditions.append(Listing.available_end_date >= filters.end_date)
+    return conditions
+
+
+def search_listings(session: Session, filters: SearchFilterStructure, limit: int = 50, offset: int = 0) -> dict:
+    """One page of result cards plus the total match count, from a single SELECT."""
+    conditions = search_filter_conditions(filters)
+    columns = [getattr(Listing, f) for f in CARD_FIELDS]
+    rows = session.execute(
+        select(*columns, func.count().over().label("total"))
+        .where(*conditions)
+        .order_by(Listing.id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # paged past the end, so there's no row to carry the window count
+        total = session.scalar(select(func.count(Listing.id)).where(*conditions))
+    else:
+        total = 0
+    items = [{f: _feed_value(v) for f, v in zip(CARD_FIELDS, row)} for row in rows]
+    return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+
+def get_listing_cards(session: Session, ids: list) -> list:
+    """Cards for many listings in one SELECT, in the order the ids were given."""
+    if not ids:
+        return []
+    columns = [getattr(Listing, f) for f in CARD_FIELDS]
+    rows = session.execute(select(*columns).where(Listing.id.in_(ids))).all()
+    by_id = {row.id: {f: _feed_value(v) for f, v in zip(CARD_FIELDS, row)} for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
@@ -0,0 +1,303 @@
+"""
+Bulk listing import and export (CSV or NDJSON).
+
+Import reads its input a line at a time, validates every row against
+ListingStructure, geocodes each chunk of rows with one geocode_many() call
+and writes the chunk with a single multi-row INSERT ... RETURNING, one
+commit per chunk. A bad row is reported by line number and skipped; it
+doesn't stop the rest of the file. Rows may carry latitude/longitude, in
+which case they aren't geocoded, so an export imports back as-is.
+
+Export streams rows read with yield_per, so memory stays flat whatever the
+size of the table.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SessionLocal
+from app.models.listing import Listing
+import app.models.user  # noqa: F401  (Listing.lister_user needs User mapped, e.g. in the export CLI)
+from app.schemas import ListingStructure
+from app.services import amenities as amenity_index, availability, cluster_index, search_index, similar, spatial_index
+from app.services.amenities import parse_amenities
+from app.services.blob_store import is_digest
+from app.services.geocoding import GeocodeError, get_geocoder
+from app.services.result_cache import search_cache
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+IMPORT_MAX_LINE = 64 * 1024
+MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH = 1000
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+IMAGE_FIELDS = ("image1", "image2", "image3", "image4")
+LISTING_FIELDS = tuple(f for f in ListingStructure.model_fields if f != "lister")
+EXPORT_FIELDS = ("id", "is_active") + LISTING_FIELDS
+# columns an export has that an import sets itself
+IGNORED_ON_IMPORT = {"id", "lister", "is_active"}
+
+
+class ImportFormatError(Exception):
+    """The rest of the input can't be read (wrong encoding, runaway line)."""
+
+
+def format_for(content_type) -> str | None:
+    mime = (content_type or "").split(";")[0].strip().lower()
+    for name, known in FORMATS.items():
+        if mime == known:
+            return name
+    if mime in ("application/ndjson", "application/jsonl", "application/json-seq"):
+        return "ndjson"
+    return None
+
+
+async def _lines(chunks):
+    """Decode a byte stream into lines without holding more than one line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()  # spreadsheets like to start with a BOM
+    pending = ""
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+            if len(pending) > IMPORT_MAX_LINE:
+                raise ImportFormatError(f"Line longer than {IMPORT_MAX_LINE} characters")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ImportFormatError("Input is not UTF-8")
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def _csv_records(lines):
+    """(line number, row dict or None, error or None); a quoted field may span lines."""
+    header = None
+    pending, start = [], 0
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not pending:
+            start = line_no
+        pending.append(line)
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            if len(text) > IMPORT_MAX_LINE:
+                raise ImportFormatError(f"Unterminated quoted field starting on line {start}")
+            continue
+        pending = []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield start, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield start, dict(zip(header, values)), None
+    if pending:
+        yield start, None, "unterminated quoted field"
+
+
+async def _ndjson_records(lines):
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def validate_row(record: dict, lister: int):
+    """ListingStructure for one input row, or raise ValueError with a readable reason."""
+    data = {}
+    for key, value in record.items():
+        key = (key or "").strip()
+        if isinstance(value, str):
+            value = value.strip()
+        if key in IGNORED_ON_IMPORT or value is None or value == "":
+            continue
+        if key not in LISTING_FIELDS:
+            raise ValueError(f"unknown column {key!r}")
+        data[key] = value
+    try:
+        row = ListingStructure(lister=lister, **data)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()))
+    for field in IMAGE_FIELDS:
+        value = getattr(row, field)
+        if value is not None and not is_digest(value):
+            raise ValueError(f"{field}: must be the hash of an uploaded photo")
+    if (row.latitude is None) != (row.longitude is None):
+        raise ValueError("give both latitude and longitude, or neither")
+    return row
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.stopped = None
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "stopped": self.stopped,
+        }
+
+
+def _address(row: ListingStructure) -> str:
+    return f"{row.address}, {row.city}, {row.state} {row.zip_code}"
+
+
+async def _write_chunk(session: AsyncSession, chunk: list, report: ImportReport) -> None:
+    addresses = [_address(row) for _, row in chunk if row.latitude is None]
+    coords = {}
+    if addresses:
+        try:
+            coords = await get_geocoder().geocode_many(addresses)
+        except GeocodeError as e:
+            for line, row in chunk:
+                if row.latitude is None:
+                    report.error(line, f"geocoding failed: {e}")
+            chunk = [(line, row) for line, row in chunk if row.latitude is not None]
+
+    lines, values = [], []
+    for line, row in chunk:
+        values_row = row.model_dump()
+        if row.latitude is None:
+            found = coords.get(_address(row))
+            if found is None:
+                report.error(line, "address could not be geocoded")
+                continue
+            values_row["latitude"], values_row["longitude"] = found
+        values_row["is_active"] = True
+        values_row["amenity_mask"] = parse_amenities(row.amenities)
+        lines.append(line)
+        values.append(values_row)
+    if not values:
+        return
+
+    try:
+        if session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            # executemany: SQLAlchemy sends the chunk as multi-row INSERT ... VALUES batches
+            listings = (await session.scalars(insert(Listing).returning(Listing, sort_by_parameter_order=True), values)).all()
+        else:
+            # no RETURNING (MySQL): the unit of work inserts the rows and reads each new id back
+            listings = [Listing(**values_row) for values_row in values]
+            session.add_all(listings)
+            await session.flush()
+        await session.commit()
+    except SQLAlchemyError as e:
+        await session.rollback()
+        for line in lines:
+            report.error(line, f"database error: {e.__class__.__name__}")
+        return
+
+    for listing in listings:
+        spatial_index.index_listing(listing.id, listing.latitude, listing.longitude, True)
+        cluster_index.index_listing(listing.id, listing.latitude, listing.longitude, listing.cost_per_month, True)
+        search_index.index_listing(listing)
+        amenity_index.index_listing(listing)
+        similar.index_listing(listing)
+    availability.index_new_listings(listings)
+    search_cache.invalidate()
+    report.inserted += len(listings)
+
+
+async def import_listings(session: AsyncSession, chunks, fmt: str, lister: int, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """
+    Import listings owned by `lister` from an async iterator of bytes in
+    `fmt` ("csv" or "ndjson"). Returns the report: row counts, the per-line
+    errors, and why reading stopped early if it did; rows read before that
+    point are still imported.
+    """
+    records = _csv_records(_lines(chunks)) if fmt == "csv" else _ndjson_records(_lines(chunks))
+    report = ImportReport()
+    chunk = []
+    try:
+        async for line, record, problem in records:
+            report.rows += 1
+            if problem is None:
+                try:
+                    chunk.append((line, validate_row(record, lister)))
+                except ValueError as e:
+                    problem = str(e)
+            if problem is not None:
+                report.error(line, problem)
+            if len(chunk) >= chunk_size:
+                await _write_chunk(session, chunk, report)
+                chunk = []
+    except ImportFormatError as e:
+        report.stopped = str(e)
+    if chunk:
+        await _write_chunk(session, chunk, report)
+    return report.as_dict()
+
+
+def _export_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def export_listings(fmt: str, lister: int | None = None):
+    """
+    Yield the listings (optionally one lister's) as CSV or NDJSON text, a
+    batch of rows per chunk. Opens its own session, because a streaming
+    response outlives the request's dependencies.
+    """
+    columns = [getattr(Listing, f) for f in EXPORT_FIELDS]
+    stmt = select(*columns).order_by(Listing.id).execution_options(yield_per=EXPORT_BATCH)
+    if lister is not None:
+        stmt = stmt.where(Listing.lister == lister)
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(EXPORT_FIELDS)
+    session = SessionLocal()
+    try:
+        for partition in session.execute(stmt).partitions():
+            for row in partition:
+                if fmt == "csv":
+                    writer.writerow(["" if v is None else _export_value(v) for v in row])
+                else:
+                    buf.write(json.dumps({f: _export_value(v) for f, v in zip(EXPORT_FIELDS, row)}))
+                    buf.write("\n")
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        session.close()
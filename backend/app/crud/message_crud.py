@@ -0,0 +1,149 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.conversation import Conversation, Message
+from app.models.listing import Listing
+from app.models.user import User
+
+MAX_MESSAGE_LENGTH = 4000
+
+
+def encode_message_cursor(created_at: datetime, message_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_message_cursor(cursor: str):
+    """(created_at, id) from a history cursor, or None if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, _, message_id = base64.urlsafe_b64decode(padded.encode()).decode().partition("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def message_dict(message) -> dict:
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "sender_id": message.sender_id,
+        "body": message.body,
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def get_conversation(session: Session, conversation_id: int, user_id: int):
+    """The conversation if user_id takes part in it, else None."""
+    conversation = session.get(Conversation, conversation_id)
+    if conversation is None or user_id not in (conversation.user_a, conversation.user_b):
+        return None
+    return conversation
+
+
+def get_or_create_conversation(db: Session, user_id: int, other_id: int, listing_id=None):
+    if user_id == other_id:
+        return {"error": "Cannot message yourself"}
+    if db.get(User, other_id) is None:
+        return {"error": "User not found"}
+    if listing_id is not None and db.get(Listing, listing_id) is None:
+        return {"error": "Listing not found"}
+
+    user_a, user_b = sorted((user_id, other_id))
+    query = select(Conversation).where(
+        Conversation.user_a == user_a,
+        Conversation.user_b == user_b,
+        Conversation.listing_id == listing_id if listing_id is not None else Conversation.listing_id.is_(None),
+    )
+    conversation = db.execute(query).scalars().first()
+    if conversation is None:
+        conversation = Conversation(user_a=user_a, user_b=user_b, listing_id=listing_id)
+        db.add(conversation)
+        try:
+            db.commit()
+        except IntegrityError:
+            # the other participant opened it at the same moment
+            db.rollback()
+            conversation = db.execute(query).scalars().one()
+    return conversation
+
+
+def list_conversations(session: Session, user_id: int, limit: int = 50) -> list:
+    """The user's conversations, most recently active first."""
+    other = aliased(User)
+    rows = session.execute(
+        select(Conversation, other.name, Listing.title)
+        .join(other, other.id == (Conversation.user_a + Conversation.user_b - user_id))
+        .outerjoin(Listing, Listing.id == Conversation.listing_id)
+        .where(or_(Conversation.user_a == user_id, Conversation.user_b == user_id))
+        .order_by(Conversation.last_message_at.desc())
+        .limit(limit)
+    ).all()
+    return [
+        {
+            "id": conversation.id,
+            "other_user_id": conversation.user_a + conversation.user_b - user_id,
+            "other_user_name": other_name,
+            "listing_id": conversation.listing_id,
+            "listing_title": listing_title,
+            "last_message_at": conversation.last_message_at.isoformat() if conversation.last_message_at else None,
+        }
+        for conversation, other_name, listing_title in rows
+    ]
+
+
+def get_messages(session: Session, conversation_id: int, before=None, limit: int = 50) -> dict:
+    """
+    One page of history, newest first. `before` is the cursor from the
+    previous page; walking (created_at, id) keeps every page an index range
+    read however far back the client scrolls.
+    """
+    stmt = select(Message).where(Message.conversation_id == conversation_id)
+    if before is not None:
+        created_at, message_id = before
+        stmt = stmt.where(or_(
+            Message.created_at < created_at,
+            and_(Message.created_at == created_at, Message.id < message_id),
+        ))
+    rows = session.execute(
+        stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+    ).scalars().all()
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_message_cursor(page[-1].created_at, page[-1].id)
+    return {"items": [message_dict(m) for m in page], "next_cursor": next_cursor}
+
+
+def add_message(db: Session, conversation_id: int, sender_id: int, body: str):
+    """Store a message from a participant; returns (message dict, participant ids) or an error dict."""
+    body = (body or "").strip()
+    if not body:
+        return {"error": "Message is empty"}
+    if len(body) > MAX_MESSAGE_LENGTH:
+        return {"error": f"Message is longer than {MAX_MESSAGE_LENGTH} characters"}
+    conversation = get_conversation(db, conversation_id, sender_id)
+    if conversation is None:
+        return {"error": "Conversation not found"}
+
+    message = Message(conversation_id=conversation_id, sender_id=sender_id, body=body, created_at=datetime.utcnow())
+    db.add(message)
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(last_message_at=message.created_at)
+    )
+    db.flush()
+    # build the reply before commit expires the objects
+    out = message_dict(message), (conversation.user_a, conversation.user_b)
+    db.commit()
+    return out
+
+
+async def add_message_async(db: AsyncSession, conversation_id: int, sender_id: int, body: str):
+    return await db.run_sync(add_message, conversation_id, sender_id, body)
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from dotenv import load_dotenv
 import os
@@ -7,13 +8,112 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, echo=True, future=True)
+
+def env_flag(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def engine_options(url: str) -> dict:
+    """
+    Engine settings, overridable from the environment:
+    DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE.
+    """
+    options = {
+        "echo": env_flag("DB_ECHO"),  # SQL logging is for debugging only
+        "future": True,
+        "pool_pre_ping": True,  # drop connections the server closed while idle
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    if url.startswith("sqlite"):
+        # handlers run in a threadpool, so connections move between threads
+        options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url:
+            return options
+    options["pool_size"] = int(os.getenv("DB_POOL_SIZE", "10"))
+    options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    options["pool_timeout"] = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    return options
+
+
+def configure_sqlite(engine) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the single writer; NORMAL is durable enough with WAL
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    configure_sqlite(engine)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
 def get_db():
+    """Request-scoped session: one per request, closed once the response is done."""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Async drivers for the sync URLs we get in DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_database_url(url: str) -> str:
+    """DATABASE_ASYNC_URL if set, else DATABASE_URL with the backend's async driver."""
+    override = os.getenv("DATABASE_ASYNC_URL")
+    if override:
+        return override
+    backend = make_url(url).get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise RuntimeError(f"No async driver known for {backend}; set DATABASE_ASYNC_URL")
+    rest = url[url.index("://"):]
+    if driver == "postgresql+asyncpg":
+        rest = rest.replace("sslmode=", "ssl=")  # asyncpg's name for the same option
+    return driver + rest
+
+
+# Created on first use so the sync-only paths (scripts, migrations) don't need
+# an async driver installed
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        url = async_database_url(DATABASE_URL)
+        _async_engine = create_async_engine(url, **engine_options(url))
+        if _async_engine.dialect.name == "sqlite":
+            configure_sqlite(_async_engine.sync_engine)
+        # objects stay usable after commit; async sessions can't lazy-load expired attributes
+        _async_sessionmaker = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def get_async_db():
+    """Request-scoped AsyncSession for async endpoints; never blocks the event loop on I/O."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Registers the session hooks that keep per-table change counters
+import app.services.change_tracking  # noqa: E402,F401
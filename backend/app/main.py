@@ -2,34 +2,69 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from starlette.middleware.sessions import SessionMiddleware
-from fastapi import FastAPI, Request, HTTPException, Form
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Request, HTTPException, Form, Query, Depends
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-import os, bcrypt
+import os, base64, hashlib
+from email.utils import formatdate
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
+from pydantic import ValidationError
+from fastapi.exceptions import RequestValidationError
 
-from app.database import Base, engine, SessionLocal
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database import engine, get_db
+from app.migrations import run_migrations
 from app.models.user import User
 from app.routes.listing import router as listing_router
 from app.routes.booking_request import router as booking_request_router
+from app.routes.image import router as image_router
+from app.routes.message import router as message_router
 from app.models.listing import Listing
-from app.schemas import SearchFilterStructure  # FIX: add this
-
-# Create tables (uses DATABASE_URL from .env)
-Base.metadata.create_all(bind=engine)
+from app.crud.listing_crud import COLUMN_FIELDS, FEED_FIELDS, get_listing_feed, get_listing_feed_columns, has_amenities, search_listings
+from app.services.change_tracking import PROCESS_EPOCH, row_version, stored_version, track_rows
+from app.services.conditional import is_not_modified, not_modified, page_validators
+from app.services.spatial_index import get_spatial_index
+from app.services.cluster_index import get_cluster_index
+from app.services.search_index import get_search_index, tokenize
+from app.services.amenities import choices as amenity_choices, get_amenity_index, parse_filter as parse_amenity_filter
+from app.services.result_cache import fragment_cache, identity_cache, search_cache
+from app.services.booking_events import broker as booking_broker
+from app.services.message_broker import get_message_broker
+from app.services.identity import current_user, get_identity
+from app.services.images import get_image_pipeline
+from app.services import metrics
+from app.services.compression import COMPRESS_ENABLED, CompressionMiddleware
+from app.services.passwords import PasswordPoolBusy, get_password_hasher
+from app.schemas import SearchFilterStructure
+from app.templating import BASE_DIR, precompile, templates
+from app.responses import FastJSONResponse
+
+# Create / upgrade tables (uses DATABASE_URL from .env)
+run_migrations(engine)
+
+# Per-row change counters behind the listing page's fragment cache and the page ETags
+track_rows(User.__tablename__)
+precompile()
 
 app = FastAPI()
 app.include_router(listing_router)
 app.include_router(booking_request_router)
+app.include_router(image_router)
+app.include_router(message_router)
 
 # Sessions (cookie-based)
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY", "change-me"), same_site="lax")
 
-# Templates (point to frontend/html)
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend/
-FRONTEND_HTML = os.path.join(BASE_DIR, "..", "frontend", "html")
-templates = Jinja2Templates(directory=FRONTEND_HTML)
+# Compresses JSON/HTML/CSV bodies over COMPRESS_MIN_BYTES for clients that accept br or gzip
+if COMPRESS_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Outermost, so the timings include the session middleware and compression
+if metrics.METRICS_ENABLED:
+    metrics.install_sql_hooks()
+    app.add_middleware(metrics.MetricsMiddleware)
 
 # Mount static files so url_for('static', path='homepage.css') works
 STATIC_DIR = os.path.join(BASE_DIR, "..", "frontend", "css")
@@ -38,19 +73,84 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 def is_edu(email: str) -> bool:
     return isinstance(email, str) and email.strip().lower().endswith(".edu")
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+async def hash_password(password: str) -> str:
+    try:
+        return await get_password_hasher().hash(password)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ins right now, please retry", headers={"Retry-After": "1"})
 
-def check_password(plain: str, hashed: str) -> bool:
+async def check_password(plain: str, hashed: str) -> bool:
     try:
-        return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
-    except Exception:
+        return await get_password_hasher().check(plain, hashed)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ins right now, please retry", headers={"Retry-After": "1"})
+
+def find_user_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+def add_user(db: Session, name: str, email: str, password_hash: str) -> bool:
+    if db.query(User).filter(User.email == email).first():
         return False
+    db.add(User(name=name, email=email, password_hash=password_hash))
+    db.commit()
+    return True
+
+def update_password_hash(db: Session, user_id: int, old_hash: str, new_hash: str) -> None:
+    # Through the row rather than a bulk update(), so only this user's row version moves;
+    # re-read under lock and only replace the hash we verified, in case the password changed meanwhile
+    user = db.get(User, user_id, populate_existing=True, with_for_update=True)
+    if user is not None and user.password_hash == old_hash:
+        user.password_hash = new_hash
+    db.commit()
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/health/auth")
+def health_auth():
+    return get_password_hasher().stats()
+
+@app.get("/health/cache")
+def health_cache():
+    return search_cache.stats()
+
+@app.get("/health/images")
+def health_images():
+    return get_image_pipeline().stats()
+
+@app.get("/health/events")
+def health_events():
+    return booking_broker.stats()
+
+@app.get("/health/messages")
+async def health_messages():
+    return get_message_broker().stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    cache = search_cache.stats()
+    fragments = fragment_cache.stats()
+    identities = identity_cache.stats()
+    messages = get_message_broker().stats()
+    gauges = [
+        ("search_cache_entries", "Entries in the search result cache.", cache["entries"]),
+        ("search_cache_bytes", "Approximate size of the search result cache.", cache["bytes"]),
+        ("search_cache_hits", "Search cache hits since start.", cache["hits"]),
+        ("search_cache_misses", "Search cache misses since start.", cache["misses"]),
+        ("fragment_cache_entries", "Rendered fragments and rows in the fragment cache.", fragments["entries"]),
+        ("fragment_cache_hits", "Fragment cache hits since start.", fragments["hits"]),
+        ("fragment_cache_misses", "Fragment cache misses since start.", fragments["misses"]),
+        ("identity_cache_entries", "Signed-in users in the identity cache.", identities["entries"]),
+        ("identity_cache_hits", "Identity cache hits since start.", identities["hits"]),
+        ("identity_cache_misses", "Identity cache misses since start.", identities["misses"]),
+        ("websocket_connections", "Open /ws/messages sockets on this worker.", messages["connections"]),
+        ("booking_event_subscribers", "Open incoming-request streams on this worker.", booking_broker.stats()["subscribers"]),
+    ]
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
 # Serve login page
 @app.get("/", response_class=HTMLResponse)
 @app.get("/login", response_class=HTMLResponse)
@@ -62,71 +162,84 @@ def show_login(request: Request):
 
 # Sign up (.edu only) -> create user
 @app.post("/signup")
-def signup(
+async def signup(
     email: str = Form(...),
     password: str = Form(...),
     first_name: str = Form(""),
     last_name: str = Form(""),
+    db: Session = Depends(get_db),
 ):
     if not is_edu(email):
         raise HTTPException(status_code=400, detail="Email must end with .edu")
     if len(password) < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
 
-    db = SessionLocal()
-    try:
-        if db.query(User).filter(User.email == email).first():
-            return JSONResponse({"ok": True, "message": "Account already exists. Please log in."})
-        name = " ".join([x for x in [first_name.strip(), last_name.strip()] if x]).strip()
-        user = User(name=name, email=email, password_hash=hash_password(password))
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        return JSONResponse({"ok": True, "message": "Account created. You can now log in."})
-    finally:
-        db.close()
+    # DB work runs in the threadpool, bcrypt on its own pool; neither blocks the event loop
+    if await run_in_threadpool(find_user_by_email, db, email):
+        return JSONResponse({"ok": True, "message": "Account already exists. Please log in."})
+    name = " ".join([x for x in [first_name.strip(), last_name.strip()] if x]).strip()
+    password_hash = await hash_password(password)
+    if not await run_in_threadpool(add_user, db, name, email, password_hash):
+        return JSONResponse({"ok": True, "message": "Account already exists. Please log in."})
+    return JSONResponse({"ok": True, "message": "Account created. You can now log in."})
 
 # Login -> set session and redirect
 @app.post("/login")
-def login(request: Request, email: str = Form(...), password: str = Form(...)):
+async def login(request: Request, email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
     if not is_edu(email):
         raise HTTPException(status_code=400, detail="Email must end with .edu")
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == email).first()
-        if not user or not check_password(password, user.password_hash):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        request.session["user_id"] = user.id
-        return JSONResponse({"ok": True, "message": "Logged in", "redirect": "/profile"})
-    finally:
-        db.close()
+    user = await run_in_threadpool(find_user_by_email, db, email)
+    if not user or not await check_password(password, user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Upgrade hashes made with an older cost factor while we have the plaintext
+    hasher = get_password_hasher()
+    if hasher.needs_rehash(user.password_hash):
+        try:
+            new_hash = await hasher.hash(password)
+            await run_in_threadpool(update_password_hash, db, user.id, user.password_hash, new_hash)
+        except PasswordPoolBusy:
+            pass  # try again on a later login
+    request.session["user_id"] = user.id
+    return JSONResponse({"ok": True, "message": "Logged in", "redirect": "/profile"})
+
+def profile_validators(session: Session, kind: str, user_id: int) -> dict:
+    # A profile shows one user row and that user's listings; listings are versioned per
+    # table, by the stored counter every worker shares, since a row counter can't tell
+    # whose listing changed
+    user_version, user_changed_at = row_version(User.__tablename__, user_id)
+    listings_version, listings_changed_at = stored_version(session, Listing.__tablename__)
+    parts = (user_id, user_version, listings_version)
+    return page_validators(kind, parts, max(user_changed_at, listings_changed_at))
 
 # Profile (requires session)
 @app.get("/profile", response_class=HTMLResponse)
-def profile(request: Request):
+def profile(request: Request, user: dict | None = Depends(current_user), db: Session = Depends(get_db)):
     uid = request.session.get("user_id")
     if not uid:
         return RedirectResponse(url="/login", status_code=303)
-    db = SessionLocal()
-    try:
-        try:
-            user = db.get(User, uid)          # SQLAlchemy 2.x
-        except Exception:
-            user = db.query(User).get(uid)     # SQLAlchemy 1.x fallback
-        if not user:
-            request.session.clear()
-            return RedirectResponse(url="/login", status_code=303)
-        listings = db.query(Listing).filter(Listing.lister == uid).all()
-        return templates.TemplateResponse("profile.html", {"request": request, "user": user, "listings": listings, "user_id": uid})
-    finally:
-        db.close()
+    headers = profile_validators(db, "profile", uid)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+    if not user:
+        request.session.clear()
+        return RedirectResponse(url="/login", status_code=303)
+    listings = db.query(Listing).filter(Listing.lister == uid).all()
+    return templates.TemplateResponse("profile.html", {"request": request, "user": user, "listings": listings, "user_id": uid}, headers=headers)
+
+# Messages (requires session)
+@app.get("/messages", response_class=HTMLResponse)
+def show_messages(request: Request):
+    uid = request.session.get("user_id")
+    if not uid:
+        return RedirectResponse(url="/login", status_code=303)
+    return templates.TemplateResponse("messaging.html", {"request": request, "user_id": uid})
 
 # Render create listing form (session required)
 @app.get("/create_listing", response_class=HTMLResponse)
 def render_create_listing(request: Request):
     if not request.session.get("user_id"):
         return RedirectResponse(url="/login", status_code=303)
-    return templates.TemplateResponse("create_listing.html", {"request": request})
+    return templates.TemplateResponse("create_listing.html", {"request": request, "amenity_choices": amenity_choices()})
  
 @app.post("/logout")
 def logout(request: Request):
@@ -134,12 +247,57 @@ def logout(request: Request):
     return RedirectResponse(url="/login", status_code=303)
 
 @app.get("/users")
-def list_users():
-    session = SessionLocal()
-    users = session.query(User).all()
-    result = [{"id": u.id, "name": u.name, "email": u.email} for u in users]
-    session.close()
-    return result
+def list_users(db: Session = Depends(get_db)):
+    rows = db.execute(select(User.id, User.name, User.email)).all()
+    return FastJSONResponse([{"id": user_id, "name": name, "email": email} for user_id, name, email in rows])
+
+SEARCH_CHUNK = 500
+
+def homepage_listings(session: Session, q: str | None, price: float | None, limit: int, amenities: int = 0) -> list:
+    listings_data = []
+    # Build query (simple filters for q, price and amenities)
+    # filter out inactive listings
+    query_stmt = session.query(Listing).filter(Listing.is_active == True)
+    if price:
+        query_stmt = query_stmt.filter(Listing.cost_per_month <= price)
+    if amenities:
+        query_stmt = query_stmt.filter(has_amenities(amenities))
+
+    if q:
+        # The text index ranks the matches; SQL applies the other filters a chunk at a time
+        # until we have the top `limit`
+        ranked = [listing_id for listing_id, _ in get_search_index().search(q)]
+        amenity_index = get_amenity_index() if amenities else None
+        if amenity_index is not None:
+            # drop listings without the amenities before any chunk reaches SQL
+            ranked = amenity_index.filter(ranked, amenities)
+        results = []
+        for start in range(0, len(ranked), SEARCH_CHUNK):
+            chunk = ranked[start:start + SEARCH_CHUNK]
+            found = {l.id: l for l in query_stmt.filter(Listing.id.in_(chunk)).all()}
+            results.extend(found[i] for i in chunk if i in found)
+            if len(results) >= limit:
+                break
+        results = results[:limit]
+    else:
+        results = query_stmt.all()
+    for l in results:
+        full_address = ", ".join(filter(None, [l.address, l.city, l.state, l.zip_code]))
+        listings_data.append({
+            "id": l.id,
+            "title": l.title,
+            "address": l.address,
+            "city": l.city,
+            "state": l.state,
+            "zip_code": l.zip_code,
+            "full_address": full_address,
+            "cost_per_month": l.cost_per_month or 0,
+            "latitude": l.latitude,
+            "longitude": l.longitude,
+            "image1": l.image1,
+        })
+    return listings_data
+
 
 @app.get("/homepage", response_class=HTMLResponse)
 def show_homepage(
@@ -147,161 +305,119 @@ def show_homepage(
     q: str | None = None,
     price: float | None = None,
     dates: str | None = None,
-    user_id: int | None = None
+    amenities: list[str] = Query([]),
+    user_id: int | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    session: Session = Depends(get_db),
 ):
+    # Everything on the page follows from the query string, the listings table and the named user
+    listings_version, changed_at = stored_version(session, Listing.__tablename__)
+    parts = (str(request.query_params), listings_version)
+    if user_id is not None:
+        user_version, user_changed_at = row_version(User.__tablename__, user_id)
+        parts += (user_version,)
+        changed_at = max(changed_at, user_changed_at)
+    headers = page_validators("homepage", parts, changed_at)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    try:
+        wanted = parse_amenity_filter(amenities)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     map_key = os.getenv("GOOGLE_MAP_KEY")
     user_name = None
-    listings_data = []
 
-    session = SessionLocal()
-    try:
-        if user_id is not None:
-            user_obj = session.get(User, user_id)
-            if user_obj:
-                user_name = user_obj.name
-
-        # Build query (simple filters for q and price)
-        # filter out inactive listings
-        query_stmt = session.query(Listing).filter(Listing.is_active == True)
-        if q:
-            q_like = f"%{q}%"
-            query_stmt = query_stmt.filter(
-                (Listing.title.ilike(q_like)) |
-                (Listing.city.ilike(q_like)) |
-                (Listing.address.ilike(q_like))
-            )
-        if price:
-            query_stmt = query_stmt.filter(Listing.cost_per_month <= price)
+    if user_id is not None:
+        identity = get_identity(session, user_id)
+        if identity:
+            user_name = identity["name"]
 
-        results = query_stmt.all()
-        for l in results:
-            full_address = ", ".join(filter(None, [l.address, l.city, l.state, l.zip_code]))
-            listings_data.append({
-                "id": l.id,
-                "title": l.title,
-                "address": l.address,
-                "city": l.city,
-                "state": l.state,
-                "zip_code": l.zip_code,
-                "full_address": full_address,
-                "cost_per_month": l.cost_per_month or 0,
-                "latitude": l.latitude,
-                "longitude": l.longitude
-            })
-    finally:
-        session.close()
+    # Unfiltered, the map asks /api/listings/clusters for its viewport instead of
+    # getting a marker per listing; popular searches come from the result cache
+    cluster_map = not q and not price and not wanted
+    if cluster_map:
+        listings_data = []
+    else:
+        key = ("homepage", listings_version, " ".join(tokenize(q)) if q else "", price, wanted, limit)
+        listings_data = search_cache.get_or_compute(key, lambda: homepage_listings(session, q, price, limit, wanted))
 
     return templates.TemplateResponse(
         "homepage.html",
         {
             "request": request,
             "listings": listings_data,
+            "cluster_map": cluster_map,
             "map_key": map_key,
             "user_name": user_name,
             "user_id": user_id,
             "query": q or "",
             "price": price or "",
-            "dates": dates or ""
-        }
+            "dates": dates or "",
+            "amenity_choices": amenity_choices(wanted),
+        },
+        headers=headers,
     )
 
 
 @app.get("/profile/{user_id}", response_class=HTMLResponse)
-def show_profile(request: Request, user_id: int):
+def show_profile(request: Request, user_id: int, session: Session = Depends(get_db)):
     """
     Render a user's profile page by id and include that user's listings.
     """
-    session = SessionLocal()
-    try:
-        user_obj = session.get(User, user_id)
-        if not user_obj:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        # convert user to a plain dict to avoid ORM lazy-loading after session close
-        user_data = {
-            "id": user_obj.id,
-            "name": user_obj.name,
-            "email": user_obj.email,
-        }
-
-         # load listings for this user
-        listings_objs = session.query(Listing).filter(Listing.lister == user_id).all()
-        listings_data = [
-            {
-                "id": l.id,
-                "title": l.title,
-                "city": l.city,
-                "cost_per_month": l.cost_per_month,
-                "is_active": l.is_active
-            } for l in listings_objs
-        ]
-    finally:
-        session.close()
+    headers = profile_validators(session, "profile-public", user_id)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    user_data = get_identity(session, user_id)
+    if not user_data:
+        raise HTTPException(status_code=404, detail="User not found")
+
+     # load listings for this user
+    listings_objs = session.query(Listing).filter(Listing.lister == user_id).all()
+    listings_data = [
+        {
+            "id": l.id,
+            "title": l.title,
+            "city": l.city,
+            "cost_per_month": l.cost_per_month,
+            "is_active": l.is_active
+        } for l in listings_objs
+    ]
 
     return templates.TemplateResponse(
         "profile.html",
-        {"request": request, "user": user_data, "listings": listings_data, "user_id": user_id, "user_name": user_data["name"]}
+        {"request": request, "user": user_data, "listings": listings_data, "user_id": user_id, "user_name": user_data["name"]},
+        headers=headers,
     )
 
-@app.get("/search_results")
-def get_search_results(
+def search_filters(
     price: Optional[str] = None,
     bedrooms: Optional[str] = None,
     bathrooms: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
-):
-    price_val = None
-    bedrooms_val = None
-    bathrooms_val = None
-    start_date_val = None
-    end_date_val = None
+    end_date: Optional[str] = None,
+    amenities: list[str] = Query([]),  # amenity keys, comma-separated or repeated; all must match
+) -> SearchFilterStructure:
+    # Raw strings go through the model so its blank-value handling applies
     try:
-        if price not in (None, '', 'null'):
-            price_val = float(price)
-    except:
-        pass
-    try:
-        if bedrooms not in (None, '', 'null'):
-            bedrooms_val = int(bedrooms)
-    except:
-        pass
-    try:
-        if bathrooms not in (None, '', 'null'):
-            bathrooms_val = int(bathrooms)
-    except:
-        pass
-    try:
-        if start_date not in (None, '', 'null'):
-            start_date_val = start_date
-    except:
-        pass
-    try:
-        if end_date not in (None, '', 'null'):
-            end_date_val = end_date
-    except:
-        pass
+        return SearchFilterStructure(price=price, bedrooms=bedrooms, bathrooms=bathrooms, start_date=start_date, end_date=end_date, amenities=amenities)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
 
-    session = SessionLocal()
-    try:
-        query = session.query(Listing)  # Initialize query for the Listing table
-        if price_val is not None:
-            query = query.filter(Listing.cost_per_month <= price)
-        if bedrooms_val is not None:
-            query = query.filter(Listing.bedrooms_available >= bedrooms)
-        if bathrooms_val is not None:
-            query = query.filter(Listing.bathrooms >= bathrooms)
-        if start_date_val is not None:
-            query = query.filter(Listing.available_start_date <= start_date)
-        if end_date_val is not None:
-            query = query.filter(Listing.available_end_date >= end_date)
-        results = query.all()
-        ids = [result.id for result in results]
-        return ids
-    except Exception as e:
-        return str(e)
-    finally:
-        session.close()
+@app.get("/search_results")
+def get_search_results(
+    filters: SearchFilterStructure = Depends(search_filters),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_db),
+):
+    if filters.start_date and filters.end_date and filters.start_date > filters.end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+    # the stored counter also moves for listing writes made by other workers and scripts
+    version, _ = stored_version(session, Listing.__tablename__)
+    key = ("search", version, tuple(sorted(filters.model_dump(mode="json").items())), limit, offset)
+    return search_cache.get_or_compute(key, lambda: search_listings(session, filters, limit, offset))
 
 # Map page (renders Google Maps)
 @app.get("/map", response_class=HTMLResponse)
@@ -312,39 +428,113 @@ def map_page(request: Request):
     )
 
 # Listings for map (only those with coordinates)
-@app.get("/api/listings")
-def api_listings():
-    db = SessionLocal()
+def encode_cursor(after_id: int) -> str:
+    return base64.urlsafe_b64encode(str(after_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
     try:
-        rows = (
-            db.query(Listing)
-            .filter(Listing.latitude.isnot(None), Listing.longitude.isnot(None))
-            .all()
-        )
-        def to_dict(l):
-            return {
-                "id": l.id,
-                "title": l.title,
-                "bedrooms_available": l.bedrooms_available,
-                "total_rooms": l.total_rooms,
-                "bedrooms_in_use": l.bedrooms_in_use,
-                "bathrooms": l.bathrooms,
-                "cost_per_month": float(l.cost_per_month) if getattr(l, "cost_per_month", None) is not None else None,
-                "available_start_date": str(l.available_start_date) if getattr(l, "available_start_date", None) is not None else None,
-                "available_end_date": str(l.available_end_date) if getattr(l, "available_end_date", None) is not None else None,
-                "address": l.address,
-                "city": l.city,
-                "state": l.state,
-                "zip_code": l.zip_code,
-                "amenities": l.amenities,
-                "latitude": float(l.latitude) if l.latitude is not None else None,
-                "longitude": float(l.longitude) if l.longitude is not None else None,
-                "image1": l.image1,
-                "image2": l.image2,
-                "image3": l.image3,
-                "image4": l.image4,
-            }
-        return {"items": [to_dict(l) for l in rows]}
-    finally:
-        db.close()
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_floats(value: str, count: int, name: str) -> list:
+    try:
+        parts = [float(x) for x in value.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) != count:
+        raise HTTPException(status_code=400, detail=f"{name} must be {count} comma-separated numbers")
+    return parts
+
+FEED_MAX_LIMIT = 500
+COLUMNS_MAX_LIMIT = 5000
 
+@app.get("/api/listings")
+def api_listings(
+    request: Request,
+    limit: int = Query(100, ge=1, le=COLUMNS_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    bbox: Optional[str] = None,  # west,south,east,north
+    near: Optional[str] = None,  # lat,lng
+    radius_km: float = Query(2.0, gt=0, le=200),
+    layout: str = Query("rows", pattern="^(rows|columns)$"),
+    db: Session = Depends(get_db),
+):
+    # layout=columns answers {"columns": {field: [values]}}: parallel arrays, cheaper to
+    # build and to send than an object per listing, so pages can be bigger
+    columnar = layout == "columns"
+    if not columnar and limit > FEED_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit is at most {FEED_MAX_LIMIT} unless layout=columns")
+    if fields:
+        requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in requested if f not in FEED_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        requested = COLUMN_FIELDS if columnar else FEED_FIELDS
+    after_id = decode_cursor(cursor) if cursor else 0
+
+    # The ETag only depends on the stored listings counter (one primary-key read, the same
+    # in every worker and after a CLI import) and the page being asked for, so an
+    # unchanged page is answered without running the query
+    version, changed_at = stored_version(db, Listing.__tablename__)
+    page_key = hashlib.sha1(f"{after_id}|{limit}|{','.join(requested)}|{bbox}|{near}|{radius_km}|{layout}".encode()).hexdigest()[:16]
+    headers = {
+        "ETag": f'"listings-{version}-{int(changed_at * 1e6):x}-{page_key}"',
+        "Last-Modified": formatdate(int(changed_at), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    # Viewport modes: the spatial index picks the (active) listings, SQL only fetches that page
+    ids = distances = None
+    if bbox:
+        west, south, east, north = parse_floats(bbox, 4, "bbox")
+        ids = get_spatial_index().bbox(south, west, north, east)
+    elif near:
+        lat, lng = parse_floats(near, 2, "near")
+        distances = get_spatial_index().near(lat, lng, radius_km)
+        ids = sorted(distances)
+
+    if columnar:
+        columns, next_after_id = get_listing_feed_columns(db, after_id, limit, requested, ids)
+        if distances is not None:
+            columns["distance_km"] = [round(distances[i], 3) for i in columns["id"]]
+        body = {"columns": columns}
+    else:
+        items, next_after_id = get_listing_feed(db, after_id, limit, requested, ids)
+        if distances is not None:
+            for item in items:
+                item["distance_km"] = round(distances[item["id"]], 3)
+        body = {"items": items}
+    body["next_cursor"] = encode_cursor(next_after_id) if next_after_id is not None else None
+    return FastJSONResponse(body, headers=headers)
+
+# Marker clusters for the map viewport, instead of a marker per listing
+@app.get("/api/listings/clusters")
+def api_listing_clusters(
+    request: Request,
+    z: int = Query(..., ge=0, le=22),
+    bbox: str = Query(...),  # west,south,east,north
+    db: Session = Depends(get_db),
+):
+    west, south, east, north = parse_floats(bbox, 4, "bbox")
+    # The stored counter moves for listing writes made anywhere; the epoch keeps
+    # one worker's ETag from validating what another worker's index produced
+    version, changed_at = stored_version(db, Listing.__tablename__)
+    etag = f'"clusters-{PROCESS_EPOCH}-{version}-{z}-{hashlib.sha1(bbox.encode()).hexdigest()[:16]}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(int(changed_at), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+    try:
+        items = get_cluster_index().clusters(z, west, south, east, north)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse({"zoom": z, "items": items}, headers=headers)
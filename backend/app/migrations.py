@@ -0,0 +1,272 @@
+"""
+Versioned schema migrations.
+
+Each migration is a (version, description, function) entry applied in
+order inside its own transaction; applied versions are recorded in the
+schema_version table, so startup only runs what is missing. Add new
+entries at the end and never edit one that has shipped.
+
+Run from backend/:  python -m app.migrations   (also runs on app startup)
+"""
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    UniqueConstraint, insert, inspect, select, text,
+)
+
+# MySQL can't declare a VARCHAR without a length
+_VARCHAR = String().with_variant(String(255), "mysql")
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", _VARCHAR, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _baseline(conn):
+    # The tables as they were before migrations existed, written out rather than
+    # taken from the models so later model changes can't leak into this step.
+    # create_all skips tables that already exist.
+    meta = MetaData()
+    Table(
+        "users",
+        meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", _VARCHAR, nullable=False),
+        Column("email", _VARCHAR, unique=True, nullable=False, index=True),
+        Column("password_hash", _VARCHAR, nullable=False),
+    )
+    Table(
+        "listings",
+        meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("title", _VARCHAR),
+        Column("lister", Integer, ForeignKey("users.id")),
+        Column("is_active", Boolean),
+        Column("bedrooms_available", Integer),
+        Column("total_rooms", Integer),
+        Column("bedrooms_in_use", Integer),
+        Column("bathrooms", Integer),
+        Column("cost_per_month", Float),
+        Column("available_start_date", Date),
+        Column("available_end_date", Date),
+        Column("address", _VARCHAR),
+        Column("city", _VARCHAR),
+        Column("state", _VARCHAR),
+        Column("zip_code", _VARCHAR),
+        Column("amenities", _VARCHAR),
+        Column("latitude", Float, nullable=True),
+        Column("longitude", Float, nullable=True),
+        Column("image1", _VARCHAR),
+        Column("image2", _VARCHAR),
+        Column("image3", _VARCHAR),
+        Column("image4", _VARCHAR),
+    )
+    Table(
+        "booking_requests",
+        meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("listing_id", Integer, ForeignKey("listings.id")),
+        Column("subletter_id", Integer, ForeignKey("users.id")),
+        Column("status", _VARCHAR),
+        Column("created_at", DateTime),
+    )
+    Table(
+        "geocode_cache",
+        meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("address_key", _VARCHAR, unique=True, nullable=False, index=True),
+        Column("latitude", Float, nullable=False),
+        Column("longitude", Float, nullable=False),
+        Column("provider", _VARCHAR),
+        Column("created_at", DateTime),
+        Column("last_used_at", DateTime, index=True),
+    )
+    meta.create_all(bind=conn)
+
+
+def _create_index(conn, name: str, table: str, columns: str, where: str | None = None):
+    if conn.dialect.name == "mysql":
+        # no CREATE INDEX IF NOT EXISTS and no partial indexes: look the name up
+        # instead, and index every row
+        if name not in {i["name"] for i in inspect(conn).get_indexes(table)}:
+            conn.execute(text(f"CREATE INDEX {name} ON {table} ({columns})"))
+        return
+    statement = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        statement += f" WHERE {where}"
+    conn.execute(text(statement))
+
+
+def _hot_query_indexes(conn):
+    # Each index matches a query shape; tests/test_query_plans.py keeps them honest
+    indexes = [
+        # profile pages and the incoming-requests join: listings owned by a user
+        ("ix_listings_lister", "listings", "lister"),
+        # homepage / search: active listings under a price cap
+        ("ix_listings_active_cost", "listings", "is_active, cost_per_month"),
+        # date-window filters on active listings
+        ("ix_listings_active_dates", "listings", "is_active, available_start_date, available_end_date"),
+        # pending requests per listing
+        ("ix_booking_requests_listing_status", "booking_requests", "listing_id, status"),
+        # duplicate check when a subletter sends a request
+        ("ix_booking_requests_subletter_listing", "booking_requests", "subletter_id, listing_id"),
+    ]
+    for name, table, columns in indexes:
+        _create_index(conn, name, table, columns)
+
+
+def _booking_request_dates(conn):
+    existing = {c["name"] for c in inspect(conn).get_columns("booking_requests")}
+    for column in ("start_date", "end_date"):
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE booking_requests ADD COLUMN {column} DATE"))
+
+
+def _approved_bookings_index(conn):
+    # availability index load: approved bookings across all listings. Partial, so
+    # the planner can't pick it for queries about pending requests.
+    _create_index(conn, "ix_booking_requests_approved", "booking_requests", "listing_id, start_date, end_date", where="status = 'approved'")
+
+
+def _messaging_tables(conn):
+    # written out like the baseline; the listing-less uniqueness index is migration 8
+    meta = MetaData()
+    Table("users", meta, Column("id", Integer, primary_key=True))
+    Table("listings", meta, Column("id", Integer, primary_key=True))
+    Table(
+        "conversations",
+        meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_a", Integer, ForeignKey("users.id"), nullable=False),
+        Column("user_b", Integer, ForeignKey("users.id"), nullable=False),
+        Column("listing_id", Integer, ForeignKey("listings.id"), nullable=True),
+        Column("created_at", DateTime),
+        Column("last_message_at", DateTime),
+        UniqueConstraint("user_a", "user_b", "listing_id", name="uq_conversations_pair_listing"),
+        Index("ix_conversations_user_a_last", "user_a", "last_message_at"),
+        Index("ix_conversations_user_b_last", "user_b", "last_message_at"),
+    )
+    Table(
+        "messages",
+        meta,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("conversation_id", Integer, ForeignKey("conversations.id"), nullable=False),
+        Column("sender_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("body", Text, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+    )
+    meta.create_all(bind=conn, tables=[meta.tables["conversations"], meta.tables["messages"]])
+
+
+def _amenity_mask(conn):
+    # The free-text amenities parsed into the fixed vocabulary's bits
+    from app.services.amenities import parse_amenities
+
+    existing = {c["name"] for c in inspect(conn).get_columns("listings")}
+    if "amenity_mask" not in existing:
+        conn.execute(text("ALTER TABLE listings ADD COLUMN amenity_mask INTEGER NOT NULL DEFAULT 0"))
+    # a batch at a time by id, so the table is never read while it is being updated
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, amenities FROM listings WHERE id > :last_id ORDER BY id LIMIT 5000"
+        ), {"last_id": last_id}).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = [{"id": listing_id, "mask": parse_amenities(amenities)} for listing_id, amenities in rows]
+        updates = [u for u in updates if u["mask"]]
+        if updates:
+            conn.execute(text("UPDATE listings SET amenity_mask = :mask WHERE id = :id"), updates)
+
+
+def _table_versions(conn):
+    # Change counters every process can read (app/services/change_tracking.py)
+    meta = MetaData()
+    table_versions = Table(
+        "table_versions",
+        meta,
+        Column("name", String(64), primary_key=True),
+        Column("version", Integer, nullable=False),
+        Column("changed_at", DateTime, nullable=False),
+    )
+    meta.create_all(bind=conn)
+    if conn.execute(select(table_versions.c.name).where(table_versions.c.name == "listings")).first() is None:
+        conn.execute(insert(table_versions).values(name="listings", version=0, changed_at=datetime.utcnow()))
+
+
+def _unique_direct_conversations(conn):
+    # uq_conversations_pair_listing lets any number of (user_a, user_b, NULL)
+    # rows through, since NULLs never compare equal. Fold duplicates into the
+    # oldest conversation of each pair, then index the listing-less ones.
+    duplicates = conn.execute(text(
+        "SELECT user_a, user_b, MIN(id), MAX(last_message_at) FROM conversations "
+        "WHERE listing_id IS NULL GROUP BY user_a, user_b HAVING COUNT(*) > 1"
+    )).all()
+    for user_a, user_b, keep, last_message_at in duplicates:
+        others = [row[0] for row in conn.execute(text(
+            "SELECT id FROM conversations WHERE user_a = :a AND user_b = :b AND listing_id IS NULL AND id <> :keep"
+        ), {"a": user_a, "b": user_b, "keep": keep})]
+        for other in others:
+            conn.execute(text("UPDATE messages SET conversation_id = :keep WHERE conversation_id = :other"), {"keep": keep, "other": other})
+            conn.execute(text("DELETE FROM conversations WHERE id = :other"), {"other": other})
+        conn.execute(text("UPDATE conversations SET last_message_at = :at WHERE id = :keep"), {"at": last_message_at, "keep": keep})
+    if conn.dialect.name == "mysql":
+        # no partial indexes; a functional key part maps NULL onto a listing id that can't exist
+        conn.execute(text(
+            "CREATE UNIQUE INDEX uq_conversations_pair_direct ON conversations (user_a, user_b, (coalesce(listing_id, 0)))"
+        ))
+    else:
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_conversations_pair_direct "
+            "ON conversations (user_a, user_b) WHERE listing_id IS NULL"
+        ))
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _baseline),
+    (2, "indexes for hot listing and booking request queries", _hot_query_indexes),
+    (3, "booking request date ranges", _booking_request_dates),
+    (4, "index approved bookings", _approved_bookings_index),
+    (5, "conversations and messages", _messaging_tables),
+    (6, "amenities as a bitmask", _amenity_mask),
+    (7, "stored change counters", _table_versions),
+    (8, "one conversation per pair without a listing", _unique_direct_conversations),
+]
+
+
+def applied_versions(conn) -> set:
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations; returns the versions that were applied."""
+    _meta.create_all(bind=engine)
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            # another worker may have got here first
+            if version in applied_versions(conn):
+                continue
+            migrate(conn)
+            conn.execute(insert(schema_version).values(version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    applied = run_migrations(engine)
+    print(f"applied migrations: {applied}" if applied else "schema is up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, DateTime, Index, text
 from datetime import datetime
 from app.database import Base
 
@@ -9,4 +9,17 @@ class BookingRequest(Base):
     subletter_id = Column(Integer, ForeignKey("users.id"))
 
     status = Column(String, default="pending")   # pending, approved, rejected
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    # requested sublet dates; when empty the request covers the listing's whole window
+    start_date = Column(Date, nullable=True)
+    end_date = Column(Date, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # created by migrations 2 and 4 (app/migrations.py)
+    __table_args__ = (
+        Index("ix_booking_requests_listing_status", "listing_id", "status"),
+        Index("ix_booking_requests_subletter_listing", "subletter_id", "listing_id"),
+        Index(
+            "ix_booking_requests_approved", "listing_id", "start_date", "end_date",
+            sqlite_where=text("status = 'approved'"), postgresql_where=text("status = 'approved'"),
+        ),
+    )
\ No newline at end of file
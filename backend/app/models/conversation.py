@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, Text, ForeignKey, DateTime, Index, UniqueConstraint, text
+from datetime import datetime
+from app.database import Base
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+    id = Column(Integer, primary_key=True, index=True)
+    # participants are stored lowest id first so a pair maps to one row per listing
+    user_a = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_b = Column(Integer, ForeignKey("users.id"), nullable=False)
+    listing_id = Column(Integer, ForeignKey("listings.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_message_at = Column(DateTime, default=datetime.utcnow)
+
+    # created by migrations 5 and 8 (app/migrations.py); NULLs never collide in the
+    # unique constraint, so conversations without a listing have their own index
+    __table_args__ = (
+        UniqueConstraint("user_a", "user_b", "listing_id", name="uq_conversations_pair_listing"),
+        Index(
+            "uq_conversations_pair_direct", "user_a", "user_b", unique=True,
+            sqlite_where=text("listing_id IS NULL"), postgresql_where=text("listing_id IS NULL"),
+        ),
+        Index("ix_conversations_user_a_last", "user_a", "last_message_at"),
+        Index("ix_conversations_user_b_last", "user_b", "last_message_at"),
+    )
+
+
+class Message(Base):
+    __tablename__ = "messages"
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    body = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # history pages walk this index newest first: (created_at, id) is the keyset
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+    )
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime
+from datetime import datetime
+from app.database import Base
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    address_key = Column(String, unique=True, nullable=False, index=True)  # normalized address
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    provider = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)  # for LRU eviction
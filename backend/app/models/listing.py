@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, Float, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -20,11 +20,19 @@ class Listing(Base):
     state = Column(String)
     zip_code = Column(String)  # String just in case there's leading zeros
     amenities = Column(String)
+    amenity_mask = Column(Integer, nullable=False, default=0, server_default="0")  # bits of app/services/amenities.py, set by migration 6 for older rows
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
-    image1 = Column(String)
+    image1 = Column(String)  # sha256 digest of the photo in the blob store
     image2 = Column(String)
     image3 = Column(String)
     image4 = Column(String)
 
-    lister_user = relationship("User", back_populates="listings")
\ No newline at end of file
+    lister_user = relationship("User", back_populates="listings")
+
+    # created by migration 2 (app/migrations.py)
+    __table_args__ = (
+        Index("ix_listings_lister", "lister"),
+        Index("ix_listings_active_cost", "is_active", "cost_per_month"),
+        Index("ix_listings_active_dates", "is_active", "available_start_date", "available_end_date"),
+    )
\ No newline at end of file
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from app.database import Base
+
+class TableVersion(Base):
+    # change counters shared by every process; see app/services/change_tracking.py
+    __tablename__ = "table_versions"
+    name = Column(String(64), primary_key=True)  # table name
+    version = Column(Integer, nullable=False, default=0)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -8,8 +8,8 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False, index=True) 
-    #  if a user matches with another user, we can just reveal their email for contact
-    #  this way we don't have to build a messaging system
+    #  approving a booking request still reveals both emails; before that,
+    #  users talk through conversations (app/models/conversation.py)
     #  i was thinking of using phone numbers but that raises privacy concerns
     password_hash = Column(String, nullable=False)
 
@@ -0,0 +1,37 @@
+"""
+JSON responses for the high-volume endpoints.
+
+FastJSONResponse serializes with orjson when it is installed and with the
+stdlib encoder otherwise. Both write dates and datetimes as ISO strings, so
+endpoints can hand over database rows without converting every value first.
+"""
+import json
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse
+
+_orjson = None
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    if _orjson:
+        return _orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
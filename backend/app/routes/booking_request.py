@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse
+from app.responses import FastJSONResponse
 from app.crud.booking_request_crud import *
 from app.schemas import *
+from app.database import AsyncSessionLocal, get_async_db, get_db
+from app.services.booking_events import broker, event_id
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+SSE_KEEPALIVE = 15  # seconds between comment lines on an idle stream
 
 router = APIRouter()
 
 @router.get("/booking_requests/{booking_request_id}")
-def read_booking_request_endpoint(booking_request_id: int):
+def read_booking_request_endpoint(booking_request_id: int, db: Session = Depends(get_db)):
     try:
-        res = get_booking_request_by_id(booking_request_id)
+        res = get_booking_request_by_id(db, booking_request_id)
         if not res:
             raise HTTPException(status_code=404, detail="Booking request not found")
         return res
@@ -15,17 +25,17 @@ def read_booking_request_endpoint(booking_request_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/booking_requests")
-def create_booking_request_endpoint(request_data: BookingRequestStructure):
+async def create_booking_request_endpoint(request_data: BookingRequestStructure, db: AsyncSession = Depends(get_async_db)):
     try:
-        res = create_booking_request(request_data)
+        res = await create_booking_request_async(db, request_data)
         return {"message": "Booking request created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/booking_requests/{booking_request_id}")
-def delete_booking_request_endpoint(booking_request_id: int):
+async def delete_booking_request_endpoint(booking_request_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        res = delete_booking_request(booking_request_id)
+        res = await delete_booking_request_async(db, booking_request_id)
         if not res:
             raise HTTPException(status_code=404, detail="Booking request not found")
         return { "message": "Booking request deleted successfully"}
@@ -33,15 +43,76 @@ def delete_booking_request_endpoint(booking_request_id: int):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/incoming_requests/{owner_id}")
-def incoming_requests(owner_id: int):
-    return get_incoming_requests(owner_id)
+def incoming_requests(owner_id: int, db: Session = Depends(get_db)):
+    return FastJSONResponse(get_incoming_requests(db, owner_id))
+
+
+def _sse(seq: int, event: str, data) -> str:
+    return f"id: {event_id(seq)}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _snapshot(owner_id: int):
+    async with AsyncSessionLocal() as session:
+        return await get_incoming_requests_async(session, owner_id)
+
+
+@router.get("/incoming_requests/{owner_id}/stream")
+async def incoming_requests_stream(
+    owner_id: int,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-sent events: a "snapshot" of the pending requests, then "added" and
+    "removed" deltas. Reconnecting with Last-Event-ID replays only the missed
+    deltas when they are still buffered.
+    """
+    # Subscribe before the snapshot so nothing committed in between is lost.
+    # The stream opens its own short session; a dependency session would hold
+    # a pooled connection for as long as the client stays connected.
+    sub, missed, seq = broker.subscribe(owner_id, last_event_id)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if missed is None:
+                yield _sse(seq, "snapshot", await _snapshot(owner_id))
+            else:
+                for item in missed:
+                    yield _sse(*item)
+            while not sub.overflowed:
+                item = await sub.next(SSE_KEEPALIVE)
+                if item is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                elif item[0] > seq:
+                    yield _sse(*item)
+        finally:
+            broker.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+
+def session_owner(request: Request) -> int:
+    # Moderation acts for the signed-in owner, never for an id the client names
+    uid = request.session.get("user_id")
+    if not uid:
+        raise HTTPException(status_code=401, detail="Login required")
+    return uid
+
+
+@router.post("/booking_requests/moderate")
+async def moderate(body: BookingModerationStructure, owner_id: int = Depends(session_owner), db: AsyncSession = Depends(get_async_db)):
+    return await moderate_requests_async(db, owner_id, body.action, body.ids)
 
 
 @router.post("/booking_requests/{req_id}/approve")
-def approve(req_id: int, owner_id: int):
-    return approve_request(req_id, owner_id)
+async def approve(req_id: int, owner_id: int = Depends(session_owner), db: AsyncSession = Depends(get_async_db)):
+    return await approve_request_async(db, req_id, owner_id)
 
 
 @router.post("/booking_requests/{req_id}/reject")
-def reject(req_id: int, owner_id: int):
-    return reject_request(req_id, owner_id)
+async def reject(req_id: int, owner_id: int = Depends(session_owner), db: AsyncSession = Depends(get_async_db)):
+    return await reject_request_async(db, req_id, owner_id)
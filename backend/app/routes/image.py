@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from app.services.blob_store import get_blob_store, variant_key
+from app.services.conditional import is_not_modified, not_modified
+from app.services.images import VARIANTS
+
+router = APIRouter()
+
+# Blobs are content-addressed, so a given URL never changes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# the smaller sizes; "full" is the blob itself
+VARIANT_NAMES = {name for name, _ in VARIANTS[1:]}
+
+
+def parse_range(header: str, size: int):
+    """Parse a single `bytes=start-end` range. Returns (start, end) or None if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start_s, _, end_s = spec.strip().partition("-")
+    try:
+        if start_s == "":
+            # suffix range: last N bytes
+            length = int(end_s)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, min(end, size - 1)
+
+
+def serve_blob(request: Request, key: str):
+    store = get_blob_store()
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    size = store.size(key)
+    media_type = store.content_type(key)
+    range_header = request.headers.get("range")
+    if range_header:
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(store.iter_range(key, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(store.iter_range(key, 0, size - 1), media_type=media_type, headers=headers)
+
+
+@router.get("/images/{digest}")
+def read_image(request: Request, digest: str):
+    if not get_blob_store().exists(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return serve_blob(request, digest)
+
+
+@router.get("/images/{digest}/{variant}")
+def read_image_variant(request: Request, digest: str, variant: str):
+    store = get_blob_store()
+    if variant not in VARIANT_NAMES or not store.exists(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not store.variant_exists(digest, variant):
+        # photos from before the image pipeline only have the original until
+        # scripts.build_image_variants has run; don't let that answer be cached for good
+        return RedirectResponse(f"/images/{digest}", status_code=307, headers={"Cache-Control": "public, max-age=3600"})
+    return serve_blob(request, variant_key(digest, variant))
@@ -1,13 +1,80 @@
-from fastapi import APIRouter, Depends, Request
-from app.database import get_db
+from fastapi import APIRouter, Depends, Request, Query, HTTPException
+from app.database import get_async_db, get_db
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.crud.listing_crud import *
+from app.crud.listing_io import FORMATS, export_listings, format_for, import_listings
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.responses import FastJSONResponse
 from app.schemas import ListingStructure
+from app.services.change_tracking import PROCESS_EPOCH, stored_version
+from app.services.conditional import is_not_modified, not_modified
+from app.services.similar import MAX_SIMILAR_K, SIMILAR_K, similar_to
 
 router = APIRouter()
 
+MAX_BATCH_IDS = 200
+
+# Declared before /listings/{listing_id} so "batch", "export" and "import" aren't parsed as ids
+@router.get("/listings/batch")
+async def read_listings_batch(ids: str = Query(...), db: AsyncSession = Depends(get_async_db)):
+    try:
+        id_list = list(dict.fromkeys(int(x) for x in ids.split(",") if x.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(id_list) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return {"items": await get_listing_cards_async(db, id_list)}
+
+@router.get("/listings/export")
+def export_listings_endpoint(request: Request, format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Login required")
+    return StreamingResponse(
+        export_listings(format, lister=user_id),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="listings.{format}"'},
+    )
+
+@router.post("/listings/import")
+async def import_listings_endpoint(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # The body is the file itself (text/csv or application/x-ndjson), read as it arrives
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Login required")
+    fmt = format or format_for(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=")
+    return await import_listings(db, request.stream(), fmt, user_id)
+
 @router.get("/listings/{listing_id}")
-def read_listing_endpoint(request: Request, listing_id: int):
-    return get_listing_by_id(request, listing_id, None)
+def read_listing_endpoint(request: Request, listing_id: int, db: Session = Depends(get_db)):
+    return get_listing_by_id(db, request, listing_id, None)
+
+@router.get("/listings/{listing_id}/similar")
+def similar_listings_endpoint(
+    request: Request,
+    listing_id: int,
+    k: int = Query(SIMILAR_K, ge=1, le=MAX_SIMILAR_K),
+    db: Session = Depends(get_db),
+):
+    # Any listing write can change the neighbours, so the ETag follows the whole table's
+    # stored counter, which writes from every worker and script move
+    version, _ = stored_version(db, Listing.__tablename__)
+    etag = f'"similar-{PROCESS_EPOCH}-{version}-{listing_id}-{k}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+    ids = similar_to(db, listing_id, k)
+    if ids is None:
+        raise HTTPException(status_code=404, detail=f"Listing {listing_id} not found")
+    return FastJSONResponse({"items": get_listing_cards(db, ids)}, headers=headers)
  
 @router.post("/listings")
 async def create_listing_endpoint(
@@ -29,27 +96,28 @@ async def create_listing_endpoint(
     image2: UploadFile = File(None),
     image3: UploadFile = File(None),
     image4: UploadFile = File(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    response = await create_listing(request=request, title=title, bedrooms_available=bedrooms_available, total_rooms=total_rooms, bedrooms_in_use=bedrooms_in_use, bathrooms=bathrooms, cost_per_month=cost_per_month, available_start_date=available_start_date, available_end_date=available_end_date, address=address, city=city, state=state, zip_code=zip_code, amenities=amenities, image1=image1, image2=image2, image3=image3, image4=image4)
+    response = await create_listing(session=db, request=request, title=title, bedrooms_available=bedrooms_available, total_rooms=total_rooms, bedrooms_in_use=bedrooms_in_use, bathrooms=bathrooms, cost_per_month=cost_per_month, available_start_date=available_start_date, available_end_date=available_end_date, address=address, city=city, state=state, zip_code=zip_code, amenities=amenities, image1=image1, image2=image2, image3=image3, image4=image4)
     return response
 
 @router.delete("/listings/{listing_id}")
-def delete_listing_endpoint(listing_id: int):
-    return delete_listing(listing_id)
+async def delete_listing_endpoint(listing_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await delete_listing_async(db, listing_id)
 
 @router.post("/listings/{listing_id}/activate")
-def activate_listing(request: Request, listing_id: int, db=Depends(get_db)):
+async def activate_listing(request: Request, listing_id: int, db: AsyncSession = Depends(get_async_db)):
     user_id = request.session.get("user_id")
     if not user_id:
         return {"error": "Login required"}
 
-    return set_listing_active_state(db, listing_id, user_id, True)
+    return await set_listing_active_state_async(db, listing_id, user_id, True)
 
 
 @router.post("/listings/{listing_id}/deactivate")
-def deactivate_listing(request: Request, listing_id: int, db=Depends(get_db)):
+async def deactivate_listing(request: Request, listing_id: int, db: AsyncSession = Depends(get_async_db)):
     user_id = request.session.get("user_id")
     if not user_id:
         return {"error": "Login required"}
 
-    return set_listing_active_state(db, listing_id, user_id, False)
+    return await set_listing_active_state_async(db, listing_id, user_id, False)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from app.crud.message_crud import *
+from app.schemas import ConversationStructure, MessageStructure
+from app.database import AsyncSessionLocal, get_db
+from app.services.message_broker import get_message_broker
+from sqlalchemy.orm import Session
+
+router = APIRouter()
+
+
+def session_user(request: Request) -> int:
+    uid = request.session.get("user_id")
+    if not uid:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    return uid
+
+
+async def send_message(conversation_id: int, sender_id: int, body: str):
+    """Store a message and fan it out to both participants' open sockets."""
+    # sockets live for hours, so each write borrows a session only for itself
+    async with AsyncSessionLocal() as session:
+        result = await add_message_async(session, conversation_id, sender_id, body)
+    if isinstance(result, dict):
+        return result
+    message, participants = result
+    await get_message_broker().publish(participants, {"type": "message", "message": message})
+    return message
+
+
+@router.get("/conversations")
+def conversations(uid: int = Depends(session_user), db: Session = Depends(get_db)):
+    return list_conversations(db, uid)
+
+
+@router.post("/conversations")
+def open_conversation(body: ConversationStructure, uid: int = Depends(session_user), db: Session = Depends(get_db)):
+    res = get_or_create_conversation(db, uid, body.user_id, body.listing_id)
+    if isinstance(res, dict):
+        raise HTTPException(status_code=400, detail=res["error"])
+    return {"id": res.id}
+
+
+@router.get("/conversations/{conversation_id}/messages")
+def conversation_history(
+    conversation_id: int,
+    before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    uid: int = Depends(session_user),
+    db: Session = Depends(get_db),
+):
+    if get_conversation(db, conversation_id, uid) is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    cursor = None
+    if before:
+        cursor = decode_message_cursor(before)
+        if cursor is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return get_messages(db, conversation_id, cursor, limit)
+
+
+@router.post("/conversations/{conversation_id}/messages")
+async def post_message(conversation_id: int, body: MessageStructure, uid: int = Depends(session_user)):
+    res = await send_message(conversation_id, uid, body.body)
+    if "error" in res:
+        raise HTTPException(status_code=400, detail=res["error"])
+    return res
+
+
+async def _write_loop(websocket: WebSocket, conn) -> None:
+    try:
+        while True:
+            text = await conn.queue.get()
+            if text is None:
+                await websocket.close(code=1013)  # fell too far behind; reconnect and reload history
+                return
+            await websocket.send_text(text)
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # the reader notices the closed socket and cleans up
+
+
+@router.websocket("/ws/messages")
+async def messages_socket(websocket: WebSocket):
+    """
+    One socket per browser tab. Receives {"type": "message", ...} for every
+    conversation the user is in; accepts {"type": "send", "conversation_id",
+    "body"} and {"type": "ping"}.
+    """
+    uid = websocket.session.get("user_id")
+    if not uid:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    broker = get_message_broker()
+    conn = await broker.connect(uid)
+    writer = asyncio.create_task(_write_loop(websocket, conn))
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+            except ValueError:
+                conn.push(json.dumps({"type": "error", "error": "Invalid JSON"}))
+                continue
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "send":
+                try:
+                    conversation_id = int(frame.get("conversation_id"))
+                except (TypeError, ValueError):
+                    conn.push(json.dumps({"type": "error", "error": "conversation_id is required"}))
+                    continue
+                res = await send_message(conversation_id, uid, str(frame.get("body", "")))
+                if "error" in res:
+                    conn.push(json.dumps({"type": "error", "error": res["error"], "client_id": frame.get("client_id")}))
+            elif kind == "ping":
+                conn.push('{"type": "pong"}')
+            else:
+                conn.push(json.dumps({"type": "error", "error": "Unknown frame type"}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        writer.cancel()
+        broker.disconnect(conn)
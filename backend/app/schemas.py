@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import date
-from typing import Optional
+from typing import List, Literal, Optional
+from app.services.amenities import parse_filter
 
 class ListingStructure(BaseModel):
     title: str
@@ -16,19 +17,58 @@ class ListingStructure(BaseModel):
     city: str
     state: str
     zip_code: str
-    amenities: str
-    image1: str
-    image2: str
-    image3: str
-    image4: str
+    amenities: str = ""
+    image1: Optional[str] = None
+    image2: Optional[str] = None
+    image3: Optional[str] = None
+    image4: Optional[str] = None
+    # imports may carry coordinates; otherwise the address is geocoded
+    latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    longitude: Optional[float] = Field(default=None, ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.available_start_date > self.available_end_date:
+            raise ValueError("available_start_date must be on or before available_end_date")
+        return self
 
 class BookingRequestStructure(BaseModel):
     listing_id: int
     subletter_id: int
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
 
 class SearchFilterStructure(BaseModel):
     price: Optional[float] = None
     bedrooms: Optional[int] = None
     bathrooms: Optional[int] = None
     start_date: Optional[date] = None
-    end_date: Optional[date] = None
\ No newline at end of file
+    end_date: Optional[date] = None
+    amenities: Optional[int] = None  # bitmask from app/services/amenities.py; every bit must be set
+
+    # The search form sends empty inputs as "", "null" or "None"
+    @field_validator("*", mode="before")
+    @classmethod
+    def blank_to_none(cls, value):
+        if isinstance(value, str) and value.strip() in ("", "null", "None"):
+            return None
+        return value
+
+    # "in_unit_laundry,furnished" (or a list of them) -> mask
+    @field_validator("amenities", mode="before")
+    @classmethod
+    def parse_amenity_names(cls, value):
+        if isinstance(value, (str, list)):
+            return parse_filter(value) or None
+        return value
+
+class BookingModerationStructure(BaseModel):
+    action: Literal["approve", "reject"]
+    ids: List[int] = Field(min_length=1, max_length=200)
+
+class ConversationStructure(BaseModel):
+    user_id: int
+    listing_id: Optional[int] = None
+
+class MessageStructure(BaseModel):
+    body: str
@@ -0,0 +1,209 @@
+"""
+Structured amenities: a fixed vocabulary stored as a bitmask.
+
+Each amenity owns one bit of Listing.amenity_mask, so "in-unit laundry and
+furnished" is one integer comparison, (mask & wanted) == wanted, in SQL or
+in memory. The free-text amenities column is kept for display and text
+search; the mask is parsed from it when a listing is written (and, for
+rows that predate the column, by migration 6). Bits are positions in
+AMENITIES: only ever append to it.
+
+AmenityIndex keeps the masks of active listings in a NumPy array indexed
+by listing id, so filtering every listing, or a list of candidate ids, is
+one vectorized AND and compare however many amenities are asked for.
+Like the other indexes it is loaded on first use and maintained by the
+listing CRUD functions; without NumPy there is no index and searches
+filter in SQL only.
+"""
+import re
+import threading
+
+from sqlalchemy import select
+
+from app.services.index_loader import IndexLoader, numpy_module
+
+# (key, label, other ways listers write it); the key is what ?amenities= takes
+AMENITIES = (
+    ("wifi", "wifi", ("wi fi", "internet", "wireless internet")),
+    ("laundry", "laundry", ("laundry in building", "shared laundry", "laundry room")),
+    ("in_unit_laundry", "in-unit laundry", ("washer dryer", "washer and dryer", "washer dryer in unit", "w d in unit", "in unit washer dryer")),
+    ("furnished", "furnished", ("fully furnished",)),
+    ("parking", "parking", ("parking spot", "garage", "garage parking", "street parking")),
+    ("gym", "gym", ("fitness center", "fitness room")),
+    ("dishwasher", "dishwasher", ()),
+    ("air_conditioning", "air conditioning", ("ac", "a c", "air conditioner", "central air")),
+    ("pets_allowed", "pets allowed", ("pet friendly", "pets ok", "pets welcome")),
+    ("balcony", "balcony", ("patio", "terrace")),
+    ("utilities_included", "utilities included", ("all utilities included", "utilities paid")),
+    ("elevator", "elevator", ()),
+    ("private_bathroom", "private bathroom", ("private bath", "ensuite", "en suite bathroom")),
+    ("heating", "heating", ("heat included",)),
+)
+
+BITS = {key: 1 << i for i, (key, _, _) in enumerate(AMENITIES)}
+LABELS = {key: label for key, label, _ in AMENITIES}
+# Set for every listing in AmenityIndex, so "no such listing" never matches a filter
+_PRESENT = 1 << 31
+
+_SPLIT_RE = re.compile(r"[,;\n|]")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+# a phrase with one of these says the amenity is missing ("no pets", "heat not
+# included", "tenant pays utilities"), so none of it counts
+_NEGATION_RE = re.compile(r"\b(no|not|without|excluded|tenant pays|tenants pay|paid by tenant)\b")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+
+# every spelling (key, label, alias), normalized -> bit
+_BIT_OF = {}
+for _key, _label, _aliases in AMENITIES:
+    for _name in (_key, _label) + _aliases:
+        _BIT_OF[_normalize(_name)] = BITS[_key]
+# longest first, so "in unit laundry" is taken before "laundry" can be
+_BY_LENGTH = sorted(_BIT_OF, key=len, reverse=True)
+
+
+def parse_amenities(text: str | None) -> int:
+    """Mask of the known amenities mentioned in a free-text list ("Wi-Fi, in-unit laundry")."""
+    mask = 0
+    for phrase in _SPLIT_RE.split(text or ""):
+        phrase = _normalize(phrase)
+        if not phrase or _NEGATION_RE.search(phrase):
+            continue
+        bit = _BIT_OF.get(phrase)
+        if bit is not None:
+            mask |= bit
+            continue
+        # "free wifi", "gym and parking": look for known names inside the phrase
+        padded = f" {phrase} "
+        for name in _BY_LENGTH:
+            if f" {name} " in padded:
+                mask |= _BIT_OF[name]
+                padded = padded.replace(f" {name} ", " ")
+    return mask
+
+
+def parse_filter(values) -> int:
+    """Mask for ?amenities= values (keys or labels, comma-separated or repeated); ValueError on unknown ones."""
+    if isinstance(values, str):
+        values = [values]
+    mask = 0
+    for value in values:
+        for name in value.split(","):
+            name = _normalize(name)
+            if not name:
+                continue
+            bit = _BIT_OF.get(name)
+            if bit is None:
+                raise ValueError(f"Unknown amenity: {name!r}; expected one of {', '.join(BITS)}")
+            mask |= bit
+    return mask
+
+
+def amenity_keys(mask: int) -> list:
+    return [key for key, bit in BITS.items() if mask & bit]
+
+
+def choices(selected: int = 0) -> list:
+    """[(key, label, checked)] for rendering the vocabulary as checkboxes."""
+    return [(key, label, bool(selected & BITS[key])) for key, label, _ in AMENITIES]
+
+
+class AmenityIndex:
+    def __init__(self, size: int = 1024):
+        np = numpy_module()
+        self.np = np
+        self.masks = np.zeros(size, dtype=np.uint32)  # listing id -> mask | _PRESENT, 0 if not indexed
+        self.count = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.count
+
+    def _ensure(self, listing_id: int) -> None:
+        size = len(self.masks)
+        if listing_id >= size:
+            while size <= listing_id:
+                size *= 2
+            grown = self.np.zeros(size, dtype=self.np.uint32)
+            grown[:len(self.masks)] = self.masks
+            self.masks = grown
+
+    def set(self, listing_id: int, mask: int) -> None:
+        with self.lock:
+            self._ensure(listing_id)
+            if not self.masks[listing_id]:
+                self.count += 1
+            self.masks[listing_id] = (mask or 0) | _PRESENT
+
+    def remove(self, listing_id: int) -> None:
+        with self.lock:
+            if listing_id < len(self.masks) and self.masks[listing_id]:
+                self.masks[listing_id] = 0
+                self.count -= 1
+
+    def matching(self, wanted: int, within=None) -> list:
+        """Sorted ids of indexed listings with every amenity in `wanted`, optionally only among `within`."""
+        np = self.np
+        wanted = np.uint32(wanted | _PRESENT)
+        with self.lock:
+            masks = self.masks
+            if within is None:
+                return np.flatnonzero((masks & wanted) == wanted).tolist()
+            ids = np.fromiter(within, dtype=np.int64)
+            ids = ids[(ids >= 0) & (ids < len(masks))]
+            keep = (masks[ids] & wanted) == wanted
+        return np.sort(ids[keep]).tolist()
+
+    def filter(self, ids: list, wanted: int) -> list:
+        """`ids` in their given order, without listings lacking any amenity in `wanted`."""
+        np = self.np
+        if not ids:
+            return []
+        wanted = np.uint32(wanted | _PRESENT)
+        arr = np.asarray(ids, dtype=np.int64)
+        with self.lock:
+            masks = self.masks
+            inside = arr < len(masks)
+            keep = np.zeros(len(arr), dtype=bool)
+            keep[inside] = (masks[arr[inside]] & wanted) == wanted
+        return arr[keep].tolist()
+
+
+def build_index(session) -> AmenityIndex:
+    from app.models.listing import Listing
+
+    np = numpy_module()
+    rows = session.execute(select(Listing.id, Listing.amenity_mask).where(Listing.is_active == True)).all()
+    index = AmenityIndex(size=max(1024, max((row.id for row in rows), default=0) + 1))
+    if rows:
+        ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+        masks = np.fromiter(((row.amenity_mask or 0) for row in rows), dtype=np.uint32, count=len(rows))
+        index.masks[ids] = masks | np.uint32(_PRESENT)
+        index.count = len(rows)
+    return index
+
+
+_loader = IndexLoader(build_index)
+
+
+def get_amenity_index() -> AmenityIndex | None:
+    """The index, loaded on first use; None without NumPy."""
+    return _loader.get() if numpy_module() else None
+
+
+def index_listing(listing) -> None:
+    if _loader.idle:
+        return
+    listing_id = listing.id
+    if listing.is_active:
+        mask = listing.amenity_mask
+        _loader.update(lambda index: index.set(listing_id, mask))
+    else:
+        unindex_listing(listing_id)
+
+
+def unindex_listing(listing_id: int) -> None:
+    _loader.update(lambda index: index.remove(listing_id))
@@ -0,0 +1,169 @@
+"""
+Listing availability.
+
+A listing's free time is its availability window minus the date ranges
+of its approved booking requests; a booking without dates takes the whole
+window. AvailabilityIndex keeps every listing's free intervals in
+per-start-month buckets, each sorted by end date, so "free for the whole
+of [start, end]" only visits buckets that begin on or before `start` and
+stops inside each bucket as soon as intervals end too early. It is loaded
+on first use and refreshed per listing by the booking and listing CRUD
+functions.
+"""
+import bisect
+import threading
+from datetime import timedelta
+
+from sqlalchemy import literal, select
+
+from app.services.index_loader import IndexLoader
+
+ONE_DAY = timedelta(days=1)
+
+
+def free_intervals(window_start, window_end, booked) -> list:
+    """[(start, end)] inclusive date ranges of the window not covered by `booked`."""
+    if window_start is None or window_end is None or window_start > window_end:
+        return []
+    free = []
+    cursor = window_start
+    for start, end in sorted((s or window_start, e or window_end) for s, e in booked):
+        if end < cursor:
+            continue
+        if start > cursor:
+            free.append((cursor, min(start - ONE_DAY, window_end)))
+        cursor = max(cursor, end + ONE_DAY)
+        if cursor > window_end:
+            break
+    if cursor <= window_end:
+        free.append((cursor, window_end))
+    return free
+
+
+def _month(d) -> int:
+    return d.year * 12 + d.month - 1
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self.buckets = {}  # start month -> [(-end.toordinal(), start, end, listing_id)] sorted
+        self.months = []  # sorted bucket keys
+        self.by_listing = {}  # listing_id -> free intervals
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.by_listing)
+
+    def set_listing(self, listing_id: int, intervals: list) -> None:
+        with self.lock:
+            self.remove_listing(listing_id)
+            if not intervals:
+                return
+            self.by_listing[listing_id] = intervals
+            for start, end in intervals:
+                key = _month(start)
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = []
+                    bisect.insort(self.months, key)
+                bisect.insort(bucket, (-end.toordinal(), start, end, listing_id))
+
+    def remove_listing(self, listing_id: int) -> None:
+        with self.lock:
+            for start, end in self.by_listing.pop(listing_id, ()):
+                key = _month(start)
+                bucket = self.buckets[key]
+                item = (-end.toordinal(), start, end, listing_id)
+                i = bisect.bisect_left(bucket, item)
+                if i < len(bucket) and bucket[i] == item:
+                    del bucket[i]
+                if not bucket:
+                    del self.buckets[key]
+                    del self.months[bisect.bisect_left(self.months, key)]
+
+    def available(self, start, end) -> set:
+        """Ids of listings with a free interval covering all of [start, end]."""
+        out = set()
+        limit = -end.toordinal()
+        with self.lock:
+            last = bisect.bisect_right(self.months, _month(start))
+            for key in self.months[:last]:
+                for neg_end, s, e, listing_id in self.buckets[key]:
+                    if neg_end > limit:
+                        break  # the rest of this bucket ends before `end`
+                    if s <= start:
+                        out.add(listing_id)
+        return out
+
+
+def listing_free_intervals(session, listing_id: int) -> list:
+    from app.models.booking_request import BookingRequest
+    from app.models.listing import Listing
+
+    listing = session.execute(
+        select(Listing.is_active, Listing.available_start_date, Listing.available_end_date).where(Listing.id == listing_id)
+    ).first()
+    if listing is None or not listing.is_active:
+        return []
+    booked = session.execute(
+        select(BookingRequest.start_date, BookingRequest.end_date)
+        .where(BookingRequest.listing_id == listing_id, BookingRequest.status == "approved")
+    ).all()
+    return free_intervals(listing.available_start_date, listing.available_end_date, booked)
+
+
+def build_index(session) -> AvailabilityIndex:
+    from app.models.booking_request import BookingRequest
+    from app.models.listing import Listing
+
+    booked = {}
+    # inline literal so the planner can match the partial index on approved bookings
+    approved = literal("approved", literal_execute=True)
+    for listing_id, start, end in session.execute(
+        select(BookingRequest.listing_id, BookingRequest.start_date, BookingRequest.end_date)
+        .where(BookingRequest.status == approved)
+    ):
+        booked.setdefault(listing_id, []).append((start, end))
+
+    index = AvailabilityIndex()
+    rows = session.execute(
+        select(Listing.id, Listing.available_start_date, Listing.available_end_date).where(Listing.is_active == True)
+    )
+    for listing_id, window_start, window_end in rows:
+        index.set_listing(listing_id, free_intervals(window_start, window_end, booked.get(listing_id, ())))
+    return index
+
+
+_loader = IndexLoader(build_index)
+
+
+def get_availability_index() -> AvailabilityIndex:
+    return _loader.get()
+
+
+def refresh_listing(session, listing_id: int) -> None:
+    """Recompute one listing's free intervals after a booking or listing write."""
+    if _loader.idle:
+        return
+    intervals = listing_free_intervals(session, listing_id)
+    _loader.update(lambda index: index.set_listing(listing_id, intervals))
+
+
+def index_new_listings(listings) -> None:
+    """Freshly inserted listings have no bookings, so their whole window is free."""
+    if _loader.idle:
+        return
+    windows = [
+        (listing.id, free_intervals(listing.available_start_date, listing.available_end_date, ()))
+        for listing in listings if listing.is_active
+    ]
+
+    def update(index):
+        for listing_id, intervals in windows:
+            index.set_listing(listing_id, intervals)
+
+    _loader.update(update)
+
+
+def unindex_listing(listing_id: int) -> None:
+    _loader.update(lambda index: index.remove_listing(listing_id))
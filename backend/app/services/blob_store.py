@@ -0,0 +1,176 @@
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # backend/
+DEFAULT_BLOB_DIR = os.path.join(BASE_DIR, "blobs")
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+VARIANT_RE = re.compile(r"^[a-z]+$")
+CHUNK_SIZE = 64 * 1024
+
+
+def is_digest(value) -> bool:
+    return isinstance(value, str) and bool(DIGEST_RE.match(value))
+
+
+def variant_key(digest: str, variant: str) -> str:
+    # Variants (resized copies) sit next to their blob, so backends need no extra index
+    if not is_digest(digest) or not VARIANT_RE.match(variant):
+        raise ValueError(f"bad variant key {digest!r}.{variant!r}")
+    return f"{digest}.{variant}"
+
+
+def sniff_content_type(head: bytes) -> str:
+    # Older uploads were stored byte-for-byte, so work the type out from the magic bytes
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return "application/octet-stream"
+
+
+class BlobBackend(ABC):
+    """
+    Storage interface used by BlobStore. Blobs are addressed by their sha256 hex
+    digest, variants by variant_key(); backends treat both as opaque keys.
+    """
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, digest: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def size(self, digest: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = CHUNK_SIZE):
+        """Yield bytes start..end (inclusive) of a blob."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, digest: str) -> None:
+        raise NotImplementedError
+
+
+class LocalFSBackend(BlobBackend):
+    """Blobs live under root/ab/cd/<digest> so no directory grows too large."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def write(self, digest: str, data: bytes) -> None:
+        target = self.path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # write to a temp file and rename so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self.path(digest))
+
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = CHUNK_SIZE):
+        remaining = end - start + 1
+        with open(self.path(digest), "rb") as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, digest: str) -> None:
+        if self.exists(digest):
+            os.remove(self.path(digest))
+
+
+class BlobStore:
+    def __init__(self, backend: BlobBackend):
+        self.backend = backend
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        # identical uploads share one blob
+        if not self.backend.exists(digest):
+            self.backend.write(digest, data)
+        return digest
+
+    def put_with_variants(self, data: bytes, variants: dict) -> str:
+        """Store data and its variants ({name: bytes}); returns the digest of data."""
+        digest = hashlib.sha256(data).hexdigest()
+        for name, variant_data in variants.items():
+            key = variant_key(digest, name)
+            if not self.backend.exists(key):
+                self.backend.write(key, variant_data)
+        # the main blob goes last, so once it exists its variants do too
+        if not self.backend.exists(digest):
+            self.backend.write(digest, data)
+        return digest
+
+    def exists(self, digest: str) -> bool:
+        return is_digest(digest) and self.backend.exists(digest)
+
+    def variant_exists(self, digest: str, variant: str) -> bool:
+        return self.backend.exists(variant_key(digest, variant))
+
+    def read(self, key: str) -> bytes:
+        return b"".join(self.backend.iter_range(key, 0, self.backend.size(key) - 1))
+
+    # size/content_type/iter_range take a digest or a variant_key()
+    def size(self, key: str) -> int:
+        return self.backend.size(key)
+
+    def content_type(self, key: str) -> str:
+        head = b"".join(self.backend.iter_range(key, 0, 15))
+        return sniff_content_type(head)
+
+    def iter_range(self, key: str, start: int, end: int):
+        return self.backend.iter_range(key, start, end)
+
+
+_store = None
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+    if _store is None:
+        _store = BlobStore(LocalFSBackend(os.getenv("BLOB_STORE_DIR", DEFAULT_BLOB_DIR)))
+    return _store
+
+
+def set_blob_store(store: BlobStore) -> None:
+    """Swap in a different backend (e.g. object storage) at startup."""
+    global _store
+    _store = store
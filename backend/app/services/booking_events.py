@@ -0,0 +1,150 @@
+"""
+In-process pub/sub for incoming booking requests.
+
+The booking request CRUD functions publish an event after each commit:
+"added" carries a full incoming-request row, "removed" the id of a request
+that left the owner's pending list (approved, rejected or deleted). Events
+are numbered from one process-wide sequence and the last few per owner are
+kept, so a client reconnecting with Last-Event-ID gets only what it missed;
+if that is no longer possible (gap, other process) it gets a new snapshot.
+Subscribers wait on an asyncio queue, so an idle lister costs no queries.
+Deltas are idempotent (upsert / delete by request id).
+"""
+import asyncio
+import os
+import threading
+from collections import OrderedDict, deque
+
+from dotenv import load_dotenv
+
+from app.services.change_tracking import PROCESS_EPOCH
+
+load_dotenv()
+
+
+class _Channel:
+    def __init__(self, history: int, dropped_through: int):
+        self.events = deque(maxlen=history)  # (seq, event, data)
+        # every event for this owner with seq <= dropped_through may be gone
+        self.dropped_through = dropped_through
+        self.subscribers = set()
+
+
+class Subscription:
+    def __init__(self, owner_id: int, queue_size: int):
+        self.owner_id = owner_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def _deliver(self, item) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # too slow to keep up; the stream ends and the client resumes from its last id
+            self.overflowed = True
+
+    async def next(self, timeout: float):
+        """(seq, event, data), or None after `timeout` seconds without events."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BookingEventBroker:
+    def __init__(self, history: int = 200, max_owners: int = 10000, queue_size: int = 1000):
+        self.history = history
+        self.max_owners = max_owners
+        self.queue_size = queue_size
+        self.seq = 0
+        self.evicted_through = 0
+        self.channels = OrderedDict()  # owner_id -> _Channel, least recently used first
+        self.published = 0
+        self.lock = threading.Lock()
+
+    def _channel(self, owner_id: int) -> _Channel:
+        channel = self.channels.get(owner_id)
+        if channel is None:
+            channel = self.channels[owner_id] = _Channel(self.history, self.evicted_through)
+            while len(self.channels) > self.max_owners:
+                old_id, old = next(iter(self.channels.items()))
+                if old.subscribers:
+                    self.channels.move_to_end(old_id)
+                    break
+                del self.channels[old_id]
+                self.evicted_through = self.seq
+        else:
+            self.channels.move_to_end(owner_id)
+        return channel
+
+    def publish(self, owner_id: int, event: str, data: dict) -> int:
+        """Record an event for owner_id and hand it to their subscribers; safe from any thread."""
+        with self.lock:
+            self.seq += 1
+            self.published += 1
+            item = (self.seq, event, data)
+            channel = self._channel(owner_id)
+            if len(channel.events) == channel.events.maxlen:
+                channel.dropped_through = channel.events[0][0]
+            channel.events.append(item)
+            subscribers = list(channel.subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, item)
+            except RuntimeError:
+                pass  # its event loop is gone
+        return item[0]
+
+    def subscribe(self, owner_id: int, last_event_id=None):
+        """
+        Register a subscriber; returns (subscription, missed, seq).
+
+        `missed` lists the events after last_event_id, or is None when the
+        client has to start over from a snapshot taken at `seq`.
+        """
+        sub = Subscription(owner_id, self.queue_size)
+        with self.lock:
+            channel = self._channel(owner_id)
+            channel.subscribers.add(sub)
+            after = parse_event_id(last_event_id)
+            if after is None or after < channel.dropped_through or after > self.seq:
+                missed = None
+            else:
+                missed = [item for item in channel.events if item[0] > after]
+            return sub, missed, self.seq
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self.lock:
+            channel = self.channels.get(sub.owner_id)
+            if channel is not None:
+                channel.subscribers.discard(sub)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "seq": self.seq,
+                "published": self.published,
+                "owners": len(self.channels),
+                "subscribers": sum(len(c.subscribers) for c in self.channels.values()),
+            }
+
+
+def event_id(seq: int) -> str:
+    return f"{PROCESS_EPOCH}-{seq}"
+
+
+def parse_event_id(value):
+    """The sequence number from an id this process issued, else None."""
+    if not value:
+        return None
+    epoch, _, seq = value.rpartition("-")
+    if epoch != str(PROCESS_EPOCH) or not seq.isdigit():
+        return None
+    return int(seq)
+
+
+broker = BookingEventBroker(
+    history=int(os.getenv("BOOKING_EVENTS_HISTORY", "200")),
+    max_owners=int(os.getenv("BOOKING_EVENTS_MAX_OWNERS", "10000")),
+)
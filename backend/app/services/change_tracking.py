@@ -0,0 +1,165 @@
+"""
+Per-table change counters.
+
+Every committed ORM write bumps the counter of the tables it touched, so
+callers can tell whether a table changed without querying it (ETags,
+caches). Tables registered with track_rows() also get a counter per row,
+so one listing can change without invalidating every other one; bulk
+update()/delete() statements, whose rows aren't known, move every row of
+the table forward. Counters live in this process; PROCESS_EPOCH is mixed
+into anything derived from them so values never collide across restarts.
+
+Tables in STORED_TABLES also keep a counter in the table_versions table,
+bumped inside the writing transaction, so every worker and the CLI
+scripts see the same value: stored_version() reads it with one
+primary-key lookup. Concurrent writers to such a table queue on its
+counter row until commit.
+"""
+import calendar
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+PROCESS_EPOCH = uuid.uuid4().hex[:8]
+PROCESS_START = time.time()
+
+_versions = defaultdict(int)
+_changed_at = {}
+_tracked = set()
+_rows = {}  # (table, pk) -> (version, changed_at), for rows written since start
+_bulk = {}  # table -> (version, changed_at) of bulk statements
+_lock = threading.Lock()
+
+# tables with a row in table_versions (created by migration 7)
+STORED_TABLES = frozenset({"listings"})
+
+
+def table_version(name: str) -> int:
+    return _versions[name]
+
+
+def table_changed_at(name: str) -> float:
+    """Unix time of the last committed write, or of process start."""
+    return _changed_at.get(name, PROCESS_START)
+
+
+def track_rows(*names: str) -> None:
+    _tracked.update(names)
+
+
+def row_version(name: str, pk) -> tuple:
+    """(version, changed_at) of one row of a track_rows() table."""
+    version, changed_at = _rows.get((name, pk), (0, PROCESS_START))
+    bulk_version, bulk_changed_at = _bulk.get(name, (0, PROCESS_START))
+    # both only grow, so the sum moves whenever either does
+    return version + bulk_version, max(changed_at, bulk_changed_at)
+
+
+def stored_version(session, name: str) -> tuple:
+    """(version, changed_at unix time) of a STORED_TABLES table, as committed by any process."""
+    from app.models.table_version import TableVersion
+
+    row = session.execute(
+        select(TableVersion.version, TableVersion.changed_at).where(TableVersion.name == name)
+    ).first()
+    if row is None:
+        return 0, PROCESS_START
+    return row.version, calendar.timegm(row.changed_at.utctimetuple()) + row.changed_at.microsecond / 1e6
+
+
+def bump_stored(conn, *names: str) -> None:
+    """Move the stored counters of `names` forward inside conn's transaction (Core writes call this)."""
+    from app.models.table_version import TableVersion
+
+    table = TableVersion.__table__
+    now = datetime.utcnow()
+    for name in sorted(set(names) & STORED_TABLES):
+        conn.execute(update(table).where(table.c.name == name).values(version=table.c.version + 1, changed_at=now))
+
+
+def _bump_stored_once(session, names) -> None:
+    # once per transaction is enough: other processes only ever see the committed state
+    done = session.info.setdefault("stored_bumped", set())
+    todo = (set(names) & STORED_TABLES) - done
+    if todo:
+        done.update(todo)
+        bump_stored(session.connection(), *todo)
+
+
+def bump(*names: str) -> None:
+    now = time.time()
+    with _lock:
+        for name in names:
+            _versions[name] += 1
+            _changed_at[name] = now
+
+
+def _bump_rows(keys, bulk_tables) -> None:
+    now = time.time()
+    with _lock:
+        for key in keys:
+            _rows[key] = (_rows.get(key, (0,))[0] + 1, now)
+        for name in bulk_tables:
+            _bulk[name] = (_bulk.get(name, (0,))[0] + 1, now)
+
+
+def _pending(session) -> set:
+    return session.info.setdefault("changed_tables", set())
+
+
+def _pending_rows(session) -> set:
+    return session.info.setdefault("changed_rows", set())
+
+
+def _pending_bulk(session) -> set:
+    return session.info.setdefault("changed_bulk", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            tables.add(table)
+            _pending(session).add(table)
+            if table in _tracked:
+                pk = inspect(obj).mapper.primary_key_from_instance(obj)
+                _pending_rows(session).add((table, pk[0] if len(pk) == 1 else tuple(pk)))
+    _bump_stored_once(session, tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    # update()/delete() statements skip the flush, so catch them here
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _pending(orm_execute_state.session).add(table.name)
+            _bump_stored_once(orm_execute_state.session, (table.name,))
+            # inserted rows are new, so only updates and deletes can stale a cached row
+            if table.name in _tracked and not orm_execute_state.is_insert:
+                _pending_bulk(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish(session):
+    session.info.pop("stored_bumped", None)
+    changed = session.info.pop("changed_tables", None)
+    if changed:
+        bump(*changed)
+    rows = session.info.pop("changed_rows", None)
+    bulk = session.info.pop("changed_bulk", None)
+    if rows or bulk:
+        _bump_rows(rows or (), bulk or ())
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    for key in ("changed_tables", "changed_rows", "changed_bulk", "stored_bumped"):
+        session.info.pop(key, None)
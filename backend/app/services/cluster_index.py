@@ -0,0 +1,293 @@
+"""
+Map marker clusters over active listings, precomputed for every zoom level.
+
+Points are projected to Web Mercator once and binned into square cells of
+CELL_PX screen pixels at each zoom from 0 to CLUSTER_MAX_ZOOM. Cells nest: a
+cell at zoom z is exactly the four cells under it at z + 1, so a point's
+cell at any zoom is its deepest cell shifted right. Each cell keeps its
+count, the sum of its points' positions (for the centroid) and its min and
+max price, so a viewport query is a walk over the cells it covers at that
+zoom.
+
+Like supercluster every level is built up front, but with fixed cells
+instead of a radius search around each point, which means a listing
+being added, removed or toggled touches one cell per zoom level and the
+index is kept current by the listing CRUD functions, like the grid index.
+"""
+import math
+import os
+import threading
+
+from sqlalchemy import select
+
+from app.services.index_loader import IndexLoader
+
+CELL_PX = 64
+TILE_PX = 256
+CELL_SHIFT = int(math.log2(TILE_PX // CELL_PX))  # cells per tile side = 2 ** CELL_SHIFT
+CLUSTER_MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", "16"))
+# a 4096 x 4096 px viewport; bigger boxes are refused rather than walked
+MAX_QUERY_CELLS = (4096 // CELL_PX) ** 2
+MAX_LAT = 85.05112878  # where Web Mercator is square
+
+# cell fields
+COUNT, SUM_X, SUM_Y, MIN_PRICE, MAX_PRICE = range(5)
+
+
+def project(lat: float, lng: float):
+    """Degrees -> Web Mercator x, y in [0, 1), y growing southwards."""
+    s = math.sin(math.radians(max(-MAX_LAT, min(MAX_LAT, lat))))
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return (lng + 180.0) / 360.0 % 1.0, min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def unproject(x: float, y: float):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y)))), x * 360.0 - 180.0
+
+
+def _merge_price(cell, price) -> None:
+    if price is None:
+        return
+    if cell[MIN_PRICE] is None or price < cell[MIN_PRICE]:
+        cell[MIN_PRICE] = price
+    if cell[MAX_PRICE] is None or price > cell[MAX_PRICE]:
+        cell[MAX_PRICE] = price
+
+
+class ClusterIndex:
+    def __init__(self, max_zoom: int = CLUSTER_MAX_ZOOM):
+        self.max_zoom = max_zoom
+        self.resolution = 2 ** (max_zoom + CELL_SHIFT)  # deepest cells per world side
+        self.points = {}  # id -> (x, y, ix, iy, price)
+        self.levels = [{} for _ in range(max_zoom + 1)]  # zoom -> {(cx, cy): cell}
+        self.members = {}  # deepest cell -> {ids}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.points)
+
+    def _point(self, lat, lng, price):
+        x, y = project(lat, lng)
+        return x, y, int(x * self.resolution), int(y * self.resolution), price
+
+    def insert(self, listing_id: int, lat: float, lng: float, price=None) -> None:
+        point = self._point(lat, lng, price)
+        x, y, ix, iy, _ = point
+        with self.lock:
+            self.remove(listing_id)
+            self.points[listing_id] = point
+            self.members.setdefault((ix, iy), set()).add(listing_id)
+            for z, level in enumerate(self.levels):
+                shift = self.max_zoom - z
+                key = (ix >> shift, iy >> shift)
+                cell = level.get(key)
+                if cell is None:
+                    level[key] = [1, x, y, price, price]
+                else:
+                    cell[COUNT] += 1
+                    cell[SUM_X] += x
+                    cell[SUM_Y] += y
+                    _merge_price(cell, price)
+
+    def remove(self, listing_id: int) -> None:
+        with self.lock:
+            point = self.points.pop(listing_id, None)
+            if point is None:
+                return
+            x, y, ix, iy, price = point
+            members = self.members[(ix, iy)]
+            members.discard(listing_id)
+            if not members:
+                del self.members[(ix, iy)]
+            # deepest level first, so a cell's min/max can be redone from its children
+            for z in range(self.max_zoom, -1, -1):
+                shift = self.max_zoom - z
+                key = (ix >> shift, iy >> shift)
+                level = self.levels[z]
+                cell = level[key]
+                cell[COUNT] -= 1
+                if not cell[COUNT]:
+                    del level[key]
+                    continue
+                cell[SUM_X] -= x
+                cell[SUM_Y] -= y
+                if price is not None and price in (cell[MIN_PRICE], cell[MAX_PRICE]):
+                    cell[MIN_PRICE] = cell[MAX_PRICE] = None
+                    if z == self.max_zoom:
+                        for member in members:
+                            _merge_price(cell, self.points[member][4])
+                    else:
+                        for child in self._children(z, key):
+                            _merge_price(cell, child[MIN_PRICE])
+                            _merge_price(cell, child[MAX_PRICE])
+
+    def _children(self, z: int, key) -> list:
+        below = self.levels[z + 1]
+        cx, cy = key[0] * 2, key[1] * 2
+        return [c for c in (below.get((cx, cy)), below.get((cx + 1, cy)), below.get((cx, cy + 1)), below.get((cx + 1, cy + 1))) if c is not None]
+
+    def _child_keys(self, z: int, key) -> list:
+        below = self.levels[z + 1]
+        cx, cy = key[0] * 2, key[1] * 2
+        return [k for k in ((cx, cy), (cx + 1, cy), (cx, cy + 1), (cx + 1, cy + 1)) if k in below]
+
+    def _only_member(self, z: int, key) -> int:
+        """Id of the single point in a cell whose count is 1."""
+        while z < self.max_zoom:
+            key = self._child_keys(z, key)[0]
+            z += 1
+        return next(iter(self.members[key]))
+
+    def _expansion_zoom(self, z: int, key) -> int:
+        """First zoom at which the cell's points no longer share one cell."""
+        while z < self.max_zoom:
+            keys = self._child_keys(z, key)
+            z += 1
+            if len(keys) > 1:
+                return z
+            key = keys[0]
+        return self.max_zoom + 1
+
+    def _ranges(self, zoom: int, west, south, east, north):
+        """Cell x ranges (one, or two across the antimeridian) and the y range covering the box."""
+        side = 2 ** (zoom + CELL_SHIFT)
+
+        def cell_x(lng):
+            return int(min(max((lng + 180.0) / 360.0, 0.0), 1.0 - 1e-12) * side)
+
+        y1, y2 = project(north, 0.0)[1], project(south, 0.0)[1]
+        if east - west >= 360.0:
+            x_ranges = [(0, side - 1)]
+        elif west <= east:
+            x_ranges = [(cell_x(west), cell_x(east))]
+        else:
+            x_ranges = [(cell_x(west), side - 1), (0, cell_x(east))]
+        return x_ranges, (int(y1 * side), int(y2 * side))
+
+    def _cells(self, level: dict, x_ranges, y_range):
+        lo_y, hi_y = y_range
+        covered = sum(hi_x - lo_x + 1 for lo_x, hi_x in x_ranges) * (hi_y - lo_y + 1)
+        if covered > len(level):
+            # walking the occupied cells is cheaper than the covered ones
+            for (cx, cy), cell in level.items():
+                if lo_y <= cy <= hi_y and any(lo_x <= cx <= hi_x for lo_x, hi_x in x_ranges):
+                    yield (cx, cy), cell
+            return
+        for lo_x, hi_x in x_ranges:
+            for cy in range(lo_y, hi_y + 1):
+                for cx in range(lo_x, hi_x + 1):
+                    cell = level.get((cx, cy))
+                    if cell is not None:
+                        yield (cx, cy), cell
+
+    def _point_item(self, listing_id: int, lat=None, lng=None) -> dict:
+        x, y, _, _, price = self.points[listing_id]
+        if lat is None:
+            lat, lng = unproject(x, y)
+        return {"id": listing_id, "count": 1, "lat": round(lat, 6), "lng": round(lng, 6), "price": price}
+
+    def clusters(self, zoom: int, west: float, south: float, east: float, north: float) -> list:
+        """
+        Clusters and single listings in the box at `zoom`. A cluster has its
+        count, centroid, price range and the zoom at which it splits up; a
+        single listing has its id and price instead. Above the deepest
+        cluster level every listing comes back on its own.
+        """
+        if south > north:
+            raise ValueError("bbox south must not be above north")
+        x_ranges, y_range = self._ranges(zoom, west, south, east, north)
+        covered = sum(hi - lo + 1 for lo, hi in x_ranges) * (y_range[1] - y_range[0] + 1)
+        if covered > MAX_QUERY_CELLS:
+            raise ValueError(f"bbox is too large for zoom {zoom}")
+
+        out = []
+        with self.lock:
+            if zoom > self.max_zoom:
+                shift = zoom - self.max_zoom
+                x_ranges = [(lo >> shift, hi >> shift) for lo, hi in x_ranges]
+                y_range = (y_range[0] >> shift, y_range[1] >> shift)
+                for key, _ in self._cells(self.levels[self.max_zoom], x_ranges, y_range):
+                    for listing_id in self.members[key]:
+                        x, y = self.points[listing_id][:2]
+                        lat, lng = unproject(x, y)
+                        inside_lng = west <= lng <= east if west <= east else (lng >= west or lng <= east)
+                        if south <= lat <= north and inside_lng:
+                            out.append(self._point_item(listing_id, lat, lng))
+                return out
+            for key, cell in self._cells(self.levels[zoom], x_ranges, y_range):
+                count = cell[COUNT]
+                if count == 1:
+                    out.append(self._point_item(self._only_member(zoom, key)))
+                    continue
+                lat, lng = unproject(cell[SUM_X] / count, cell[SUM_Y] / count)
+                out.append({
+                    "count": count,
+                    "lat": round(lat, 6),
+                    "lng": round(lng, 6),
+                    "min_price": cell[MIN_PRICE],
+                    "max_price": cell[MAX_PRICE],
+                    "expansion_zoom": self._expansion_zoom(zoom, key),
+                })
+        return out
+
+    @classmethod
+    def build(cls, rows, max_zoom: int = CLUSTER_MAX_ZOOM) -> "ClusterIndex":
+        """Bulk load from (id, lat, lng, price) rows: the deepest level first, then each coarser one from it."""
+        index = cls(max_zoom)
+        deepest = index.levels[max_zoom]
+        for listing_id, lat, lng, price in rows:
+            point = index._point(lat, lng, price)
+            x, y, ix, iy, _ = point
+            index.points[listing_id] = point
+            index.members.setdefault((ix, iy), set()).add(listing_id)
+            cell = deepest.get((ix, iy))
+            if cell is None:
+                deepest[(ix, iy)] = [1, x, y, price, price]
+            else:
+                cell[COUNT] += 1
+                cell[SUM_X] += x
+                cell[SUM_Y] += y
+                _merge_price(cell, price)
+        for z in range(max_zoom - 1, -1, -1):
+            level = index.levels[z]
+            for (cx, cy), child in index.levels[z + 1].items():
+                key = (cx >> 1, cy >> 1)
+                cell = level.get(key)
+                if cell is None:
+                    level[key] = list(child)
+                else:
+                    cell[COUNT] += child[COUNT]
+                    cell[SUM_X] += child[SUM_X]
+                    cell[SUM_Y] += child[SUM_Y]
+                    _merge_price(cell, child[MIN_PRICE])
+                    _merge_price(cell, child[MAX_PRICE])
+        return index
+
+
+def build_index(session) -> ClusterIndex:
+    from app.models.listing import Listing
+
+    rows = session.execute(
+        select(Listing.id, Listing.latitude, Listing.longitude, Listing.cost_per_month).where(
+            Listing.is_active == True, Listing.latitude.isnot(None), Listing.longitude.isnot(None)
+        )
+    )
+    return ClusterIndex.build(rows)
+
+
+_loader = IndexLoader(build_index)
+
+
+def get_cluster_index() -> ClusterIndex:
+    return _loader.get()
+
+
+def index_listing(listing_id: int, lat, lng, price, is_active: bool) -> None:
+    if is_active and lat is not None and lng is not None:
+        _loader.update(lambda index: index.insert(listing_id, lat, lng, price))
+    else:
+        unindex_listing(listing_id)
+
+
+def unindex_listing(listing_id: int) -> None:
+    _loader.update(lambda index: index.remove(listing_id))
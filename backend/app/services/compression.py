@@ -0,0 +1,154 @@
+"""
+Response compression: brotli or gzip, whichever the client prefers.
+
+The encoding is picked from Accept-Encoding (q-values honoured; brotli wins
+ties, and is only offered when the `brotli` package is installed). Only
+text-like content types are compressed, only when the body is at least
+COMPRESS_MIN_BYTES, and never when the response already has a
+Content-Encoding, is a partial (206) response or is an event stream, whose
+events have to reach the client as they are sent.
+
+A body sent in several parts (StreamingResponse) is compressed as it goes,
+each part flushed so the client isn't kept waiting for the next one.
+"""
+import os
+import zlib
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 4-5 is about gzip 6's speed, a bit smaller
+
+COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"application/javascript", b"text/", b"image/svg+xml")
+
+_brotli = None
+
+
+def _brotli_module():
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+
+def choose_encoding(accept_encoding: str):
+    """"br", "gzip" or None for an Accept-Encoding header value."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    star = offered.get("*", 0.0)
+    candidates = [("br", offered.get("br", star)), ("gzip", offered.get("gzip", star))]
+    if not _brotli_module():
+        candidates = candidates[1:]
+    name, q = max(candidates, key=lambda c: c[1])  # max() keeps the first of equals, so br wins ties
+    return name if q > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            brotli = _brotli_module()
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._flush = self._c.flush
+            self._finish = self._c.finish
+            self._process = self._c.process
+        else:
+            # wbits 31: gzip container
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._flush = lambda: self._c.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._c.flush
+            self._process = self._c.compress
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._process(data)
+        return out + (self._finish() if final else self._flush())
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    return _Compressor(encoding).compress(data, final=True)
+
+
+class CompressionMiddleware:
+    """Pure ASGI, so streamed bodies are compressed part by part instead of buffered."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = choose_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = b""
+                skip = message["status"] in (204, 206, 304)
+                for name, value in headers:
+                    if name == b"content-type":
+                        content_type = value
+                    elif name == b"content-encoding":
+                        skip = True
+                if skip or content_type.startswith(b"text/event-stream") or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    state["passthrough"] = True
+                    await send(message)
+                else:
+                    state["start"] = message  # held until we know how big the body is
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                if not more and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers = [(n, v) for n, v in start.get("headers", []) if n != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode()))
+                vary = [v for n, v in headers if n == b"vary"]
+                if not vary:
+                    headers.append((b"vary", b"Accept-Encoding"))
+                elif b"accept-encoding" not in vary[0].lower():
+                    headers = [(n, v + b", Accept-Encoding" if n == b"vary" else v) for n, v in headers]
+                state["compressor"] = _Compressor(encoding)
+                if not more:
+                    body = state["compressor"].compress(body, final=True)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": state["compressor"].compress(body, final=not more), "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,54 @@
+"""
+ETag / Last-Modified validators and 304 handling for rendered pages.
+
+A page's ETag is a digest of whatever it was rendered from: change_tracking
+versions of the rows and tables it shows, plus the viewer. Handlers build
+the validators before touching the database, so a revalidation that
+matches costs no queries and no rendering. If-None-Match takes precedence
+over If-Modified-Since, as RFC 9110 asks.
+"""
+import hashlib
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from app.services.change_tracking import PROCESS_EPOCH
+
+
+def page_validators(kind: str, parts: tuple, changed_at: float) -> dict:
+    """Response headers for a page rendered from `parts`, last changed at `changed_at` (unix time)."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+    return {
+        "ETag": f'"{kind}-{PROCESS_EPOCH}-{digest}"',
+        "Last-Modified": formatdate(int(changed_at), usegmt=True),
+        # pages carry the viewer's name, so only the browser may keep them, and must revalidate
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # weak comparison: a compressing proxy may have marked our tag W/
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def is_not_modified(request: Request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, headers["ETag"])
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
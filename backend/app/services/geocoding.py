@@ -0,0 +1,283 @@
+"""
+Address geocoding.
+
+Geocoder puts a provider behind a persistent cache (the geocode_cache
+table), a concurrency limit and retries with backoff. Providers are async,
+so geocoding never blocks the event loop; cache reads and writes run in
+the threadpool. Pick the provider with GEOCODER=google (default) or
+GEOCODER=offline for a deterministic, network-free stand-in.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models.geocode_cache import GeocodeCache
+
+load_dotenv()
+
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+logger = logging.getLogger("app.geocoding")
+
+
+class GeocodeError(Exception):
+    """The provider refused the request (bad key, malformed request, ...)."""
+
+
+class TransientGeocodeError(GeocodeError):
+    """Timeouts, rate limits and 5xx responses; worth retrying."""
+
+
+def normalize_address(address: str) -> str:
+    cleaned = re.sub(r"[^\w\s]", " ", address.lower())
+    return " ".join(cleaned.split())
+
+
+class GeocodeProvider:
+    name = "base"
+
+    async def geocode(self, address: str):
+        """Return (lat, lng), or None if the address doesn't resolve."""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Release connections; the provider can still be used afterwards."""
+
+
+class GoogleGeocodeProvider(GeocodeProvider):
+    name = "google"
+
+    def __init__(self, api_key: str, timeout: float = 5.0):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+        self._client_loop = None
+
+    def client(self):
+        """One pooled AsyncClient, so a batch reuses its connections; rebuilt if the event loop changes."""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = self._client_loop = None
+
+    async def geocode(self, address: str):
+        import httpx
+
+        try:
+            resp = await self.client().get(GOOGLE_GEOCODE_URL, params={"address": address, "key": self.api_key})
+        except httpx.HTTPError as e:
+            raise TransientGeocodeError(str(e)) from e
+        if resp.status_code >= 500 or resp.status_code == 429:
+            raise TransientGeocodeError(f"HTTP {resp.status_code}")
+        try:
+            body = resp.json()
+        except ValueError as e:
+            raise GeocodeError(f"unreadable response (HTTP {resp.status_code})") from e
+        status = body.get("status")
+        if status == "OK":
+            location = body["results"][0]["geometry"]["location"]
+            return location["lat"], location["lng"]
+        if status == "ZERO_RESULTS":
+            return None
+        if status in ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR"):
+            raise TransientGeocodeError(status)
+        raise GeocodeError(body.get("error_message") or status)
+
+
+class OfflineGeocodeProvider(GeocodeProvider):
+    """
+    Network-free provider for tests and local development. Known addresses
+    resolve exactly; anything else lands on a stable point inside `bounds`
+    derived from a hash of the address.
+    """
+    name = "offline"
+
+    def __init__(self, known: dict | None = None, bounds=(40.70, -74.02, 40.80, -73.90)):
+        self.known = {normalize_address(k): v for k, v in (known or {}).items()}
+        self.bounds = bounds
+
+    async def geocode(self, address: str):
+        key = normalize_address(address)
+        if not key:
+            return None
+        if key in self.known:
+            return self.known[key]
+        digest = hashlib.sha256(key.encode()).digest()
+        fx = int.from_bytes(digest[:4], "big") / 0xFFFFFFFF
+        fy = int.from_bytes(digest[4:8], "big") / 0xFFFFFFFF
+        south, west, north, east = self.bounds
+        return south + (north - south) * fx, west + (east - west) * fy
+
+
+class GeocodeCacheStore:
+    """
+    Persistent address -> coordinates cache. Entries expire after `ttl` and
+    the least recently used ones are evicted beyond `max_entries`.
+    last_used_at is only refreshed once per `touch_interval` so hits stay reads.
+    """
+
+    def __init__(self, ttl=timedelta(days=90), max_entries=50_000, touch_interval=timedelta(days=1)):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+
+    def get_many(self, keys: list) -> dict:
+        if not keys:
+            return {}
+        now = datetime.utcnow()
+        session = SessionLocal()
+        try:
+            rows = session.execute(select(GeocodeCache).where(GeocodeCache.address_key.in_(keys))).scalars().all()
+            out, stale = {}, []
+            for row in rows:
+                if row.created_at and now - row.created_at > self.ttl:
+                    continue
+                out[row.address_key] = (row.latitude, row.longitude)
+                if not row.last_used_at or now - row.last_used_at > self.touch_interval:
+                    stale.append(row.id)
+            if stale:
+                session.execute(update(GeocodeCache).where(GeocodeCache.id.in_(stale)).values(last_used_at=now))
+                session.commit()
+            return out
+        finally:
+            session.close()
+
+    def put_many(self, entries: dict, provider: str) -> None:
+        if not entries:
+            return
+        now = datetime.utcnow()
+        session = SessionLocal()
+        try:
+            existing = {
+                row.address_key: row
+                for row in session.execute(
+                    select(GeocodeCache).where(GeocodeCache.address_key.in_(list(entries)))
+                ).scalars()
+            }
+            for key, (lat, lng) in entries.items():
+                row = existing.get(key)
+                if row is None:
+                    session.add(GeocodeCache(address_key=key, latitude=lat, longitude=lng, provider=provider, created_at=now, last_used_at=now))
+                else:
+                    row.latitude, row.longitude, row.provider = lat, lng, provider
+                    row.created_at = row.last_used_at = now
+            try:
+                session.commit()
+            except IntegrityError:
+                # another request cached some of these addresses first; its rows will do
+                session.rollback()
+                return
+            self._evict(session)
+        finally:
+            session.close()
+
+    def _evict(self, session) -> None:
+        session.execute(delete(GeocodeCache).where(GeocodeCache.created_at < datetime.utcnow() - self.ttl))
+        overflow = session.scalar(select(func.count(GeocodeCache.id))) - self.max_entries
+        if overflow > 0:
+            oldest = select(GeocodeCache.id).order_by(GeocodeCache.last_used_at).limit(overflow)
+            session.execute(delete(GeocodeCache).where(GeocodeCache.id.in_(oldest)))
+        session.commit()
+
+
+class Geocoder:
+    def __init__(self, provider: GeocodeProvider, cache: GeocodeCacheStore | None = None,
+                 max_concurrency: int = 8, retries: int = 3, backoff: float = 0.2):
+        self.provider = provider
+        self.cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    def _limit(self):
+        # created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _lookup(self, address: str):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._limit():
+                    return await self.provider.geocode(address)
+            except TransientGeocodeError:
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+    async def geocode(self, address: str):
+        """(lat, lng) for one address, or None if it doesn't resolve."""
+        return (await self.geocode_many([address]))[address]
+
+    async def geocode_many(self, addresses: list) -> dict:
+        """
+        Geocode a batch (e.g. a bulk import). Duplicates and cached addresses
+        cost nothing; the rest go to the provider concurrently.
+        Returns {address: (lat, lng) or None}.
+        """
+        keys = {address: normalize_address(address) for address in addresses}
+        # the provider gets the address as written (first spelling of each key); the key is only for caching
+        originals = {}
+        for address, key in keys.items():
+            if key:
+                originals.setdefault(key, address)
+        unique = list(originals)
+        found = await run_in_threadpool(self.cache.get_many, unique) if self.cache else {}
+
+        missing = [k for k in unique if k not in found]
+        if missing:
+            results = await asyncio.gather(*(self._lookup(originals[k]) for k in missing))
+            fresh = {k: r for k, r in zip(missing, results) if r is not None}
+            if self.cache and fresh:
+                try:
+                    await run_in_threadpool(self.cache.put_many, fresh, self.provider.name)
+                except SQLAlchemyError:
+                    # the coordinates are good either way; the next lookup just pays again
+                    logger.warning("could not cache %d geocoded addresses", len(fresh), exc_info=True)
+            found.update(fresh)
+
+        return {address: found.get(key) for address, key in keys.items()}
+
+
+_geocoder = None
+
+
+def get_geocoder() -> Geocoder:
+    global _geocoder
+    if _geocoder is None:
+        if os.getenv("GEOCODER", "google") == "offline":
+            provider = OfflineGeocodeProvider()
+        else:
+            provider = GoogleGeocodeProvider(os.getenv("GOOGLE_MAP_KEY", ""), timeout=float(os.getenv("GEOCODE_TIMEOUT", "5")))
+        cache = GeocodeCacheStore(
+            ttl=timedelta(days=int(os.getenv("GEOCODE_CACHE_TTL_DAYS", "90"))),
+            max_entries=int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "50000")),
+        )
+        _geocoder = Geocoder(provider, cache, max_concurrency=int(os.getenv("GEOCODE_CONCURRENCY", "8")))
+    return _geocoder
+
+
+def set_geocoder(geocoder: Geocoder) -> None:
+    global _geocoder
+    _geocoder = geocoder
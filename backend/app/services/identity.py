@@ -0,0 +1,52 @@
+"""
+The signed-in user, without a users query on every page.
+
+The session cookie only carries the user id. The id, name and email that
+pages show are cached in identity_cache under the users row's
+change_tracking version, so any committed write to the row (or a bulk
+update of the table) makes the next lookup miss and read it again; the
+cache TTL bounds how long another worker's write can go unnoticed.
+
+current_user is the FastAPI dependency for the session's user; FastAPI
+resolves it once per request however many dependants ask for it, and a
+cache hit doesn't touch the database or the threadpool.
+"""
+from fastapi import Depends, Request
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import get_db
+from app.models.user import User
+from app.services.change_tracking import row_version
+from app.services.result_cache import identity_cache
+
+
+def _key(user_id: int):
+    version, _ = row_version(User.__tablename__, user_id)
+    return ("user", user_id, version)
+
+
+def _load(db: Session, user_id: int, key) -> dict | None:
+    generation = identity_cache.generation
+    row = db.execute(select(User.id, User.name, User.email).where(User.id == user_id)).first()
+    if row is None:
+        return None  # not cached: a missing user is rare and may be about to sign up
+    identity = {"id": row.id, "name": row.name, "email": row.email}
+    identity_cache.put(key, identity, generation)
+    return identity
+
+
+def get_identity(db: Session, user_id: int) -> dict | None:
+    """{"id", "name", "email"} for a user id, or None if there's no such user."""
+    key = _key(user_id)
+    return identity_cache.get(key) or _load(db, user_id, key)
+
+
+async def current_user(request: Request, db: Session = Depends(get_db)) -> dict | None:
+    """The session's user, or None when signed out or the user no longer exists."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return None
+    key = _key(user_id)
+    return identity_cache.get(key) or await run_in_threadpool(_load, db, user_id, key)
@@ -0,0 +1,186 @@
+"""
+Listing photo pipeline: validate, strip metadata, downscale, re-encode.
+
+Decoding and encoding a phone photo takes a core for a good fraction of a
+second, so it runs on a process pool (IMAGE_WORKERS processes) rather than
+in the event loop or the AnyIO threadpool. As with the bcrypt pool, once
+IMAGE_MAX_PENDING jobs are waiting new ones are refused with
+ImagePipelineBusy instead of queueing without bound. If a worker process
+dies (killed for memory, say) the pool is broken: the jobs it held fail
+with ImagePipelineBusy too and the next upload gets a fresh pool.
+
+Each upload becomes one WebP per entry of VARIANTS, widest first. The
+"full" one is stored as the listing's photo and the smaller ones as its
+blob store variants, served at /images/{digest}/{variant}. Only pixels are
+re-encoded: EXIF (GPS included), ICC profiles and comments are dropped,
+after the EXIF orientation has been applied to the pixels.
+
+Needs Pillow (with WebP support) in the environment.
+"""
+import asyncio
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from app.services.blob_store import get_blob_store
+
+load_dotenv()
+
+# (name, max width in px), widest first; each is resized from the one before
+VARIANTS = (("full", 1600), ("card", 640), ("thumb", 320))
+ACCEPTED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "GIF"}
+ORIENTATION_TAG = 0x0112
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+
+
+class ImageRejected(Exception):
+    """The upload isn't an image we accept; the message is safe to show the user."""
+
+
+class ImagePipelineBusy(Exception):
+    pass
+
+
+def process_image(data: bytes, variants=VARIANTS, quality: int = IMAGE_WEBP_QUALITY,
+                  max_pixels: int = IMAGE_MAX_PIXELS) -> dict:
+    """Raw upload -> {variant name: WebP bytes}. Runs in a pool process."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        im = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError:
+        # Pillow's own limit (twice Image.MAX_IMAGE_PIXELS), hit before ours is checked
+        raise ImageRejected("Image is too large")
+    except (UnidentifiedImageError, OSError):
+        raise ImageRejected("Not a supported image file")
+    if im.format not in ACCEPTED_FORMATS:
+        raise ImageRejected(f"Unsupported image format {im.format}; use JPEG, PNG, WebP or GIF")
+    # checked from the header, before anything is decoded
+    if im.width * im.height > max_pixels:
+        raise ImageRejected(f"Image is too large ({im.width}x{im.height})")
+
+    widest = variants[0][1]
+    if im.format in ("JPEG", "MPO"):
+        # let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding, keeping
+        # the side that ends up horizontal at least `widest` pixels
+        rotated = im.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8)
+        im.draft("RGB", (1, widest) if rotated else (widest, 1))
+    try:
+        im.load()
+    except Image.DecompressionBombError:
+        raise ImageRejected("Image is too large")
+    except (OSError, SyntaxError, ValueError):
+        raise ImageRejected("Image file is truncated or corrupt")
+
+    im = ImageOps.exif_transpose(im)
+    has_alpha = "A" in im.getbands() or "transparency" in im.info
+    im = im.convert("RGBA" if has_alpha else "RGB")
+
+    out = {}
+    for name, width in variants:
+        if im.width > width:
+            height = max(1, round(im.height * width / im.width))
+            im = im.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        buf = io.BytesIO()
+        # nothing but pixels is passed to the encoder, so no metadata survives
+        im.save(buf, "WEBP", quality=quality, method=4)
+        out[name] = buf.getvalue()
+    return out
+
+
+class ImagePipeline:
+    def __init__(self, workers: int = 2, max_pending: int = 16):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.completed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.total_seconds = 0.0
+        self.broken_pools = 0
+
+    async def process(self, data: bytes) -> dict:
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise ImagePipelineBusy()
+            self.in_flight += 1
+        start = time.perf_counter()
+        executor = self.executor
+        try:
+            variants = await asyncio.wrap_future(executor.submit(process_image, data))
+        except ImageRejected:
+            with self._lock:
+                self.invalid += 1
+            raise
+        except BrokenProcessPool:
+            self._replace_pool(executor)
+            raise ImagePipelineBusy()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        with self._lock:
+            self.completed += 1
+            self.bytes_in += len(data)
+            self.bytes_out += sum(len(v) for v in variants.values())
+            self.total_seconds += time.perf_counter() - start
+        return variants
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            # every job of the broken pool lands here; only the first one replaces it
+            if self.executor is not broken:
+                return
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.broken_pools += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queue_depth": max(self.in_flight - self.workers, 0),
+                "rejected": self.rejected,
+                "invalid": self.invalid,
+                "completed": self.completed,
+                "avg_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else None,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "broken_pools": self.broken_pools,
+            }
+
+
+_pipeline = None
+
+
+def get_image_pipeline() -> ImagePipeline:
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = ImagePipeline(
+            workers=int(os.getenv("IMAGE_WORKERS", "2")),
+            max_pending=int(os.getenv("IMAGE_MAX_PENDING", "16")),
+        )
+    return _pipeline
+
+
+async def store_photo(data: bytes) -> str:
+    """Process an upload and store its variants; returns the digest of the "full" WebP."""
+    if len(data) > IMAGE_MAX_BYTES:
+        raise ImageRejected(f"Image is larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+    variants = await get_image_pipeline().process(data)
+    full = variants.pop(VARIANTS[0][0])
+    return await run_in_threadpool(get_blob_store().put_with_variants, full, variants)
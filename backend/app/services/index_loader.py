@@ -0,0 +1,93 @@
+"""
+Loading for the in-memory listing indexes (spatial, clusters, text search,
+availability, amenities, similar listings).
+
+Each index is built from the database the first time it is asked for and
+then kept current by the write paths, which call update() after their
+commit. Until the first request no index exists and updates are dropped:
+the build will read the committed rows. An update that arrives while a
+build is running is queued and replayed on the new index before anyone can
+see it, so a row committed after the build's SELECT is not lost. Updates
+must be idempotent (set or remove a listing), since the build may already
+have read the row they describe.
+
+Updates never wait for a build: they run on the event loop in the async
+write paths.
+"""
+import logging
+import threading
+
+logger = logging.getLogger("app.indexes")
+
+_numpy = None
+
+
+def numpy_module():
+    """NumPy (2.0 or later, for bitwise_count), or None when it isn't installed."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            numpy.bitwise_count  # NumPy 2.0+
+            _numpy = numpy
+        except (ImportError, AttributeError):
+            logger.warning("NumPy 2 is not installed; similar listings and the amenity index are disabled")
+            _numpy = False
+    return _numpy or None
+
+
+class IndexLoader:
+    def __init__(self, build):
+        self._build = build  # session -> index
+        self._index = None
+        self._pending = None  # list of updates while a build is running, else None
+        self._lock = threading.Lock()  # guards _index and _pending
+        self._build_lock = threading.Lock()  # one build at a time
+
+    @property
+    def idle(self) -> bool:
+        """True while nothing has asked for the index, so writes can skip computing their update."""
+        return self._index is None and self._pending is None
+
+    def get(self):
+        index = self._index
+        if index is not None:
+            return index
+        with self._build_lock:
+            if self._index is not None:
+                return self._index
+            with self._lock:
+                self._pending = []
+            try:
+                from app.database import SessionLocal
+
+                session = SessionLocal()
+                try:
+                    index = self._build(session)
+                finally:
+                    session.close()
+            except BaseException:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                for update in self._pending:
+                    update(index)
+                self._pending = None
+                self._index = index
+            return index
+
+    def update(self, update) -> None:
+        """Apply update(index) now, after the running build, or not at all if nothing has been built."""
+        with self._lock:
+            index = self._index
+            if index is None:
+                if self._pending is not None:
+                    self._pending.append(update)
+                return
+        update(index)
+
+    def reset(self) -> None:
+        """Forget the index; the next get() builds it again."""
+        with self._build_lock, self._lock:
+            self._index = None
@@ -0,0 +1,145 @@
+"""
+Fan-out for chat messages.
+
+Every open /ws/messages socket registers a Connection under its user id.
+A stored message is published once for its participants; the backend
+decides who hears about it. LocalBackend hands it straight to this
+process's connections, which is all a single worker needs. With several
+workers, set MESSAGE_BROKER_URL=redis://... and RedisBackend relays every
+message through one pub/sub channel so each worker delivers to the sockets
+it holds (needs the `redis` package). Payloads are encoded once per message
+and each connection gets the same string on a bounded queue; a connection
+that falls that far behind is closed and reloads history when it reconnects.
+
+All methods run on the event loop thread.
+"""
+import asyncio
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Connection:
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def push(self, text: str) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # wake the writer so it notices and closes the socket
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class LocalBackend:
+    """Delivers within this process only."""
+
+    async def start(self, deliver) -> None:
+        self.deliver = deliver
+
+    async def publish(self, user_ids, text: str) -> None:
+        self.deliver(user_ids, text)
+
+
+class RedisBackend:
+    """Relays messages between workers over one Redis pub/sub channel."""
+
+    def __init__(self, url: str, channel: str = "sublet_scout:messages"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.channel = channel
+        self.listener = None
+
+    async def start(self, deliver) -> None:
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        self.listener = asyncio.create_task(self._listen(deliver))
+
+    async def _listen(self, deliver) -> None:
+        async for item in self.pubsub.listen():
+            if item["type"] != "message":
+                continue
+            envelope = json.loads(item["data"])
+            deliver(envelope["users"], envelope["text"])
+
+    async def publish(self, user_ids, text: str) -> None:
+        await self.redis.publish(self.channel, json.dumps({"users": list(user_ids), "text": text}))
+
+
+class MessageBroker:
+    def __init__(self, backend=None, queue_size: int = 256):
+        self.backend = backend or LocalBackend()
+        self.queue_size = queue_size
+        self.connections = {}  # user_id -> set of Connection
+        self.started = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def _ensure_started(self) -> None:
+        if self.started is None:
+            self.started = asyncio.ensure_future(self.backend.start(self._deliver))
+        await self.started
+
+    async def connect(self, user_id: int) -> Connection:
+        await self._ensure_started()
+        conn = Connection(user_id, self.queue_size)
+        self.connections.setdefault(user_id, set()).add(conn)
+        return conn
+
+    def disconnect(self, conn: Connection) -> None:
+        conns = self.connections.get(conn.user_id)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del self.connections[conn.user_id]
+
+    async def publish(self, user_ids, payload: dict) -> None:
+        await self._ensure_started()
+        self.published += 1
+        await self.backend.publish(user_ids, json.dumps(payload))
+
+    def _deliver(self, user_ids, text: str) -> None:
+        for user_id in user_ids:
+            for conn in self.connections.get(user_id, ()):
+                conn.push(text)
+                if conn.overflowed:
+                    self.dropped += 1
+                else:
+                    self.delivered += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "users": len(self.connections),
+            "connections": sum(len(c) for c in self.connections.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+_broker = None
+
+
+def get_message_broker() -> MessageBroker:
+    global _broker
+    if _broker is None:
+        url = os.getenv("MESSAGE_BROKER_URL", "")
+        _broker = MessageBroker(RedisBackend(url) if url else LocalBackend())
+    return _broker
+
+
+def set_message_broker(broker: MessageBroker) -> None:
+    global _broker
+    _broker = broker
@@ -0,0 +1,207 @@
+"""
+Per-request timing and SQL accounting, exported in Prometheus text format.
+
+MetricsMiddleware times every HTTP request by route template and, through
+engine-wide SQLAlchemy cursor events, counts and times the statements run
+on the request's behalf (a context variable follows the request into the
+threadpool and into async sessions). Requests over REQUEST_TIME_BUDGET_MS
+or REQUEST_QUERY_BUDGET are logged with their numbers. Long-lived responses
+(server-sent events, WebSockets) are left out.
+
+With METRICS_ENABLED=false neither the middleware nor the engine listeners
+are installed, so the cost is zero.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+logger = logging.getLogger("app.metrics")
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+REQUEST_TIME_BUDGET_MS = float(os.getenv("REQUEST_TIME_BUDGET_MS", "500"))
+REQUEST_QUERY_BUDGET = int(os.getenv("REQUEST_QUERY_BUDGET", "20"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.series.get(label_values)
+            if row is None:
+                row = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {k: list(v) for k, v in self.series.items()}
+        for label_values, row in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {row[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {row[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {row[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label_values: tuple, amount: float = 1) -> None:
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            series = dict(self.series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request to end of response.", ("method", "route"), LATENCY_BUCKETS
+)
+requests_total = Counter("http_requests_total", "Requests handled.", ("method", "route", "status"))
+request_queries = Histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("method", "route"), QUERY_COUNT_BUCKETS
+)
+request_sql_seconds = Histogram(
+    "db_query_seconds_per_request", "Time spent in SQL per request.", ("method", "route"), LATENCY_BUCKETS
+)
+over_budget = Counter("http_requests_over_budget_total", "Requests over the time or query budget.", ("method", "route", "budget"))
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+_current = ContextVar("request_sql_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        starts = conn.info.get("query_start")
+        if starts:
+            stats.sql_seconds += time.perf_counter() - starts.pop()
+        stats.queries += 1
+
+
+def install_sql_hooks() -> None:
+    # On the Engine class, so it covers the sync engine and the async engine's sync core
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Pure ASGI so streaming responses pass through untouched."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = {"code": 500, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        status["streaming"] = True
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if not status["streaming"]:
+                self.record(scope, status["code"], time.perf_counter() - start, stats)
+
+    @staticmethod
+    def record(scope, status_code: int, seconds: float, stats: RequestStats) -> None:
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        key = (scope["method"], route)
+        request_duration.observe(key, seconds)
+        requests_total.inc((scope["method"], route, status_code))
+        request_queries.observe(key, stats.queries)
+        request_sql_seconds.observe(key, stats.sql_seconds)
+
+        ms = seconds * 1000
+        over_time = ms > REQUEST_TIME_BUDGET_MS
+        over_queries = stats.queries > REQUEST_QUERY_BUDGET
+        if over_time:
+            over_budget.inc(key + ("time",))
+        if over_queries:
+            over_budget.inc(key + ("queries",))
+        if over_time or over_queries:
+            logger.warning(
+                "over budget: %s %s took %.1f ms with %d queries (%.1f ms in SQL)",
+                scope["method"], scope.get("path"), ms, stats.queries, stats.sql_seconds * 1000,
+            )
+
+
+def render(extra_gauges=()) -> str:
+    """Everything in Prometheus text format; extra_gauges is [(name, help, value)]."""
+    lines = []
+    for metric in (request_duration, requests_total, request_queries, request_sql_seconds, over_budget):
+        lines.extend(metric.render())
+    for name, help_text, value in extra_gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
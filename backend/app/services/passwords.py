@@ -0,0 +1,121 @@
+"""
+Password hashing on a dedicated, bounded bcrypt pool.
+
+bcrypt is deliberately slow, so it runs on its own executor instead of the
+AnyIO threadpool that serves the sync endpoints: a burst of logins can only
+ever occupy BCRYPT_WORKERS threads (or processes, with
+BCRYPT_POOL=process), and once BCRYPT_MAX_PENDING jobs are waiting new ones
+are refused with PasswordPoolBusy rather than queued without bound.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(plain: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
+    except Exception:
+        return False
+
+
+def hash_rounds(hashed: str):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    return hash_rounds(hashed) != rounds
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = 2, max_pending: int = 32, use_processes: bool = False):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor = pool_cls(max_workers=workers)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy()
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(self.executor.submit(fn, *args))
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def check(self, plain: str, hashed: str) -> bool:
+        return await self._run(_check, plain, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return needs_rehash(hashed, self.rounds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "avg_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else None,
+                "max_ms": round(self.max_seconds * 1000, 2),
+            }
+
+
+_hasher = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(
+            rounds=BCRYPT_ROUNDS,
+            workers=int(os.getenv("BCRYPT_WORKERS", "2")),
+            max_pending=int(os.getenv("BCRYPT_MAX_PENDING", "32")),
+            use_processes=os.getenv("BCRYPT_POOL", "thread") == "process",
+        )
+    return _hasher
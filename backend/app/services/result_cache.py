@@ -0,0 +1,124 @@
+"""
+LRU/TTL cache for search results.
+
+Entries are stamped with the cache generation at the time they were
+computed. create_listing, delete_listing and set_listing_active_state
+call invalidate() after their commit (and after the in-memory indexes are
+updated), which bumps the generation and makes every older entry a miss,
+so a cached page never outlives the write that changed it. Those calls
+only happen in the writing process, so callers also put the stored
+listings version (change_tracking.stored_version) in the key: a write
+from another worker or a script makes new keys. Memory is capped by the
+JSON size of the cached values.
+
+fragment_cache holds rendered template fragments and the rows behind them.
+Its keys carry the stored listings version (change_tracking.stored_version),
+so a write from any worker or script just makes new keys and the old
+entries age out; it is never invalidated wholesale.
+
+identity_cache holds the name and email of signed-in users the same way,
+keyed by their users row version (see app.services.identity).
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generation = 0
+        self.entries = OrderedDict()  # key -> (generation, expires_at, size, value)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def _drop(self, key) -> None:
+        _, _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        """Cached value for key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                generation, expires_at, _, value = entry
+                if generation == self.generation and expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation: int) -> None:
+        """Store value computed while the cache was at `generation`."""
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return  # a write landed while this was being computed
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (generation, time.monotonic() + self.ttl, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            generation = self.generation
+            value = compute()
+            self.put(key, value, generation)
+        return value
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation": self.generation,
+            }
+
+
+search_cache = ResultCache(
+    max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+)
+
+fragment_cache = ResultCache(
+    max_bytes=int(os.getenv("FRAGMENT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    ttl=float(os.getenv("FRAGMENT_CACHE_TTL", "60")),
+)
+
+identity_cache = ResultCache(
+    max_bytes=int(os.getenv("IDENTITY_CACHE_MAX_BYTES", str(1024 * 1024))),
+    ttl=float(os.getenv("IDENTITY_CACHE_TTL", "60")),
+)
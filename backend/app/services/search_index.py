@@ -0,0 +1,145 @@
+"""
+In-memory inverted index for listing text search.
+
+Title, city, address and amenities of active listings are tokenized into
+per-term postings. Queries match every query word as a prefix (so "bost"
+still finds "Boston", as the old ILIKE search did) and rank hits with
+BM25, weighting title and city matches above address and amenities. Like
+the spatial index, it is loaded on first use and then maintained by the
+listing CRUD functions.
+"""
+import bisect
+import math
+import re
+import threading
+from collections import Counter
+
+from sqlalchemy import select
+
+from app.services.index_loader import IndexLoader
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+FIELD_WEIGHTS = {"title": 3.0, "city": 2.0, "address": 1.0, "amenities": 1.0}
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text) -> list:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings = {}  # term -> {listing_id: weighted term frequency}
+        self.terms = []  # sorted vocabulary, for prefix lookups
+        self.doc_terms = {}  # listing_id -> terms, so removal doesn't need the old text
+        self.doc_len = {}
+        self.total_len = 0.0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, listing_id: int, fields: dict) -> None:
+        tf = Counter()
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                tf[token] += weight
+                length += weight
+        with self.lock:
+            self.remove(listing_id)
+            for term, freq in tf.items():
+                bucket = self.postings.get(term)
+                if bucket is None:
+                    bucket = self.postings[term] = {}
+                    bisect.insort(self.terms, term)
+                bucket[listing_id] = freq
+            self.doc_terms[listing_id] = tuple(tf)
+            self.doc_len[listing_id] = length
+            self.total_len += length
+
+    def remove(self, listing_id: int) -> None:
+        with self.lock:
+            terms = self.doc_terms.pop(listing_id, None)
+            if terms is None:
+                return
+            self.total_len -= self.doc_len.pop(listing_id)
+            for term in terms:
+                bucket = self.postings[term]
+                bucket.pop(listing_id, None)
+                if not bucket:
+                    del self.postings[term]
+                    del self.terms[bisect.bisect_left(self.terms, term)]
+
+    def _expand(self, prefix: str) -> list:
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + "\uffff")
+        return self.terms[start:end]
+
+    def search(self, query: str, limit: int | None = None) -> list:
+        """[(listing_id, score)] of listings matching every query word, best first."""
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return []
+        with self.lock:
+            n_docs = len(self.doc_len)
+            avg_len = self.total_len / n_docs if n_docs else 1.0
+            scores = None
+            for word in words:
+                word_scores = {}
+                for term in self._expand(word):
+                    bucket = self.postings[term]
+                    idf = math.log(1 + (n_docs - len(bucket) + 0.5) / (len(bucket) + 0.5))
+                    # exact word matches outrank prefix-only matches
+                    boost = 1.0 if term == word else 0.5
+                    for listing_id, freq in bucket.items():
+                        norm = K1 * (1 - B + B * self.doc_len[listing_id] / avg_len)
+                        s = boost * idf * freq * (K1 + 1) / (freq + norm)
+                        if s > word_scores.get(listing_id, 0.0):
+                            word_scores[listing_id] = s
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {i: scores[i] + s for i, s in word_scores.items() if i in scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+
+def listing_text(listing) -> dict:
+    return {field: getattr(listing, field) for field in FIELD_WEIGHTS}
+
+
+def build_index(session) -> InvertedIndex:
+    from app.models.listing import Listing
+
+    index = InvertedIndex()
+    rows = session.execute(
+        select(Listing.id, Listing.title, Listing.city, Listing.address, Listing.amenities)
+        .where(Listing.is_active == True)
+    )
+    for row in rows:
+        index.add(row.id, listing_text(row))
+    return index
+
+
+_loader = IndexLoader(build_index)
+
+
+def get_search_index() -> InvertedIndex:
+    return _loader.get()
+
+
+def index_listing(listing) -> None:
+    listing_id = listing.id
+    if listing.is_active:
+        fields = listing_text(listing)
+        _loader.update(lambda index: index.add(listing_id, fields))
+    else:
+        unindex_listing(listing_id)
+
+
+def unindex_listing(listing_id: int) -> None:
+    _loader.update(lambda index: index.remove(listing_id))
@@ -0,0 +1,225 @@
+"""
+"Similar listings": nearest neighbours in a feature matrix of active listings.
+
+Each active, geocoded listing has a slot (a column) in a float32 NumPy
+matrix with one row per feature: log price, bedrooms, bathrooms, position
+(on the unit sphere, scaled to km) and the start and end of the
+availability window. Every feature is divided by a fixed scale (one unit
+is "noticeably different": ~30% in price, a bedroom, 2 km, a month), so
+nothing is fitted to the data and a listing can be added or replaced at
+any time. Amenities sit beside the matrix as each listing's amenity_mask
+(app/services/amenities.py); each amenity only one of two listings has
+adds AMENITY_WEIGHT² to their squared distance.
+
+A query sweeps the features one contiguous row at a time, in place, rather
+than building a listings x features difference matrix, then takes the top
+k with an argpartition.
+
+The index is loaded from the database on first use and then kept current
+by the listing CRUD functions; slots freed by deactivated or deleted
+listings are reused. Needs NumPy (2.0 or later) in the environment; without
+it there are no suggestions (similar_to() returns an empty list).
+"""
+import math
+import os
+import threading
+from datetime import date
+
+from sqlalchemy import select
+
+from app.services.index_loader import IndexLoader, numpy_module
+
+SIMILAR_K = int(os.getenv("SIMILAR_K", "6"))
+MAX_SIMILAR_K = 50
+
+PRICE_SCALE = math.log(1.3)
+ROOM_SCALE = 1.0
+DISTANCE_SCALE_KM = 2.0
+DATE_SCALE_DAYS = 30.0
+DATE_ORIGIN = date(2024, 1, 1).toordinal()
+AMENITY_WEIGHT = 0.5
+EARTH_RADIUS_KM = 6371.0088
+
+# price, bedrooms, bathrooms, x, y, z, start, end
+DIMENSIONS = 8
+
+def feature_vector(price, bedrooms, bathrooms, lat, lng, start, end) -> list:
+    """Scaled features of one listing; missing numbers count as 0."""
+    p, l = math.radians(lat), math.radians(lng)
+    radius = EARTH_RADIUS_KM / DISTANCE_SCALE_KM
+    return [
+        math.log(price) / PRICE_SCALE if price and price > 0 else 0.0,
+        (bedrooms or 0) / ROOM_SCALE,
+        (bathrooms or 0) / ROOM_SCALE,
+        radius * math.cos(p) * math.cos(l),
+        radius * math.cos(p) * math.sin(l),
+        radius * math.sin(p),
+        (start.toordinal() - DATE_ORIGIN) / DATE_SCALE_DAYS if start else 0.0,
+        (end.toordinal() - DATE_ORIGIN) / DATE_SCALE_DAYS if end else 0.0,
+    ]
+
+
+def features(listing) -> tuple:
+    """(vector, amenity mask) for a Listing."""
+    vector = feature_vector(
+        listing.cost_per_month, listing.bedrooms_available, listing.bathrooms, listing.latitude,
+        listing.longitude, listing.available_start_date, listing.available_end_date,
+    )
+    return vector, listing.amenity_mask or 0
+
+
+class SimilarIndex:
+    def __init__(self, capacity: int = 1024):
+        np = numpy_module()
+        self.np = np
+        self.matrix = np.zeros((DIMENSIONS, capacity), dtype=np.float32)
+        self.masks = np.zeros(capacity, dtype=np.uint32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        # added to every distance: 0 for live slots, inf for free ones so they never win
+        self.penalty = np.full(capacity, np.inf, dtype=np.float32)
+        self.slot_of = {}
+        self.free = list(range(capacity - 1, -1, -1))  # popped from the end, lowest slot first
+        self.used = 0  # slots past this one have never been filled, so queries stop here
+        self.lock = threading.RLock()
+
+    @classmethod
+    def build(cls, rows) -> "SimilarIndex":
+        """Index (id, price, bedrooms, bathrooms, lat, lng, start, end, amenity_mask) rows in one go."""
+        n = len(rows)
+        index = cls(capacity=max(1024, n))
+        if n:
+            index.matrix[:, :n] = index.np.array([feature_vector(*row[1:8]) for row in rows], dtype=index.np.float32).T
+            index.masks[:n] = [row[8] or 0 for row in rows]
+            index.ids[:n] = [row[0] for row in rows]
+            index.penalty[:n] = 0.0
+        index.slot_of = {row[0]: i for i, row in enumerate(rows)}
+        index.free = list(range(len(index.ids) - 1, n - 1, -1))
+        index.used = n
+        return index
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def _grow(self) -> None:
+        np = self.np
+        old = len(self.ids)
+        self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)], axis=1)
+        self.masks = np.concatenate([self.masks, np.zeros_like(self.masks)])
+        self.ids = np.concatenate([self.ids, np.zeros_like(self.ids)])
+        self.penalty = np.concatenate([self.penalty, np.full(old, np.inf, dtype=np.float32)])
+        self.free = list(range(2 * old - 1, old - 1, -1)) + self.free
+
+    def upsert(self, listing_id: int, vector, mask: int) -> None:
+        with self.lock:
+            slot = self.slot_of.get(listing_id)
+            if slot is None:
+                if not self.free:
+                    self._grow()
+                slot = self.free.pop()
+                self.slot_of[listing_id] = slot
+                self.ids[slot] = listing_id
+                self.penalty[slot] = 0.0
+                self.used = max(self.used, slot + 1)
+            self.matrix[:, slot] = vector
+            self.masks[slot] = mask
+
+    def remove(self, listing_id: int) -> None:
+        with self.lock:
+            slot = self.slot_of.pop(listing_id, None)
+            if slot is not None:
+                self.penalty[slot] = self.np.inf
+                self.free.append(slot)
+
+    def features_of(self, listing_id: int):
+        """(vector, amenity mask) of an indexed listing, or None."""
+        with self.lock:
+            slot = self.slot_of.get(listing_id)
+            return None if slot is None else (self.matrix[:, slot].copy(), int(self.masks[slot]))
+
+    def nearest(self, vector, mask: int, k: int, exclude: int | None = None) -> list:
+        """[(listing id, distance)] of the k listings closest to (vector, mask), closest first."""
+        np = self.np
+        query = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            n = self.used
+            distances = np.bitwise_count(self.masks[:n] ^ np.uint32(mask)) * np.float32(AMENITY_WEIGHT * AMENITY_WEIGHT)
+            distances += self.penalty[:n]
+            scratch = np.empty(n, dtype=np.float32)
+            for feature, value in zip(self.matrix[:, :n], query):
+                np.subtract(feature, value, out=scratch)
+                np.multiply(scratch, scratch, out=scratch)
+                distances += scratch
+            slot = self.slot_of.get(exclude)
+            if slot is not None:
+                distances[slot] = np.inf
+            k = min(k, len(self.slot_of))
+            if k <= 0:
+                return []
+            if k < n:
+                top = np.argpartition(distances, k - 1)[:k]
+            else:
+                top = np.arange(n)
+            top = top[np.argsort(distances[top], kind="stable")]
+            return [(int(self.ids[i]), math.sqrt(float(distances[i]))) for i in top if np.isfinite(distances[i])]
+
+
+_COLUMNS = (
+    "id", "cost_per_month", "bedrooms_available", "bathrooms", "latitude", "longitude",
+    "available_start_date", "available_end_date", "amenity_mask",
+)
+
+
+def build_index(session) -> SimilarIndex:
+    from app.models.listing import Listing
+
+    rows = session.execute(
+        select(*[getattr(Listing, c) for c in _COLUMNS]).where(
+            Listing.is_active == True, Listing.latitude.isnot(None), Listing.longitude.isnot(None)
+        )
+    ).all()
+    return SimilarIndex.build(rows)
+
+
+_loader = IndexLoader(build_index)
+
+
+def get_similar_index() -> SimilarIndex | None:
+    """The index, loaded on first use; None without NumPy."""
+    return _loader.get() if numpy_module() else None
+
+
+def index_listing(listing) -> None:
+    # Nothing to do until the index is first used; the load will read current rows
+    if _loader.idle:
+        return
+    listing_id = listing.id
+    if listing.is_active and listing.latitude is not None and listing.longitude is not None:
+        vector, mask = features(listing)
+        _loader.update(lambda index: index.upsert(listing_id, vector, mask))
+    else:
+        unindex_listing(listing_id)
+
+
+def unindex_listing(listing_id: int) -> None:
+    _loader.update(lambda index: index.remove(listing_id))
+
+
+def similar_to(session, listing_id: int, k: int = SIMILAR_K) -> list | None:
+    """
+    Ids of the k active listings most like listing_id, closest first. None
+    if there's no such listing; [] if it has no position or NumPy is missing.
+    """
+    from app.models.listing import Listing
+
+    index = get_similar_index()
+    found = index.features_of(listing_id) if index is not None else None
+    if found is None:
+        # inactive, or not in the index: describe it from its row
+        listing = session.get(Listing, listing_id)
+        if listing is None:
+            return None
+        if index is None or listing.latitude is None or listing.longitude is None:
+            return []
+        found = features(listing)
+    vector, mask = found
+    return [i for i, _ in index.nearest(vector, mask, k, exclude=listing_id)]
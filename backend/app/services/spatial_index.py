@@ -0,0 +1,130 @@
+"""
+In-memory grid index over active listing coordinates.
+
+Points are bucketed into fixed-size lat/lng cells, so a viewport or radius
+query only looks at the cells it overlaps instead of every listing. The
+index is loaded from the database on first use and then kept in sync by
+the listing CRUD functions.
+"""
+import math
+import threading
+
+from sqlalchemy import select
+
+from app.services.index_loader import IndexLoader
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    def __init__(self, cell_deg: float = 0.01):
+        # 0.01 degrees is roughly 1.1 km of latitude: a few city blocks per cell
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.points = {}
+        self.lock = threading.RLock()
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def __len__(self):
+        return len(self.points)
+
+    def insert(self, listing_id: int, lat: float, lng: float) -> None:
+        with self.lock:
+            self.remove(listing_id)
+            self.points[listing_id] = (lat, lng)
+            self.cells.setdefault(self._cell(lat, lng), {})[listing_id] = (lat, lng)
+
+    def remove(self, listing_id: int) -> None:
+        with self.lock:
+            point = self.points.pop(listing_id, None)
+            if point is None:
+                return
+            key = self._cell(*point)
+            bucket = self.cells.get(key)
+            if bucket is not None:
+                bucket.pop(listing_id, None)
+                if not bucket:
+                    del self.cells[key]
+
+    def _candidate_cells(self, min_lat, min_lng, max_lat, max_lng):
+        lo_y, lo_x = self._cell(min_lat, min_lng)
+        hi_y, hi_x = self._cell(max_lat, max_lng)
+        span = (hi_y - lo_y + 1) * (hi_x - lo_x + 1)
+        if span > len(self.cells):
+            # huge viewport: walking the occupied cells is cheaper than the covered ones
+            return [b for (y, x), b in self.cells.items() if lo_y <= y <= hi_y and lo_x <= x <= hi_x]
+        buckets = []
+        for y in range(lo_y, hi_y + 1):
+            for x in range(lo_x, hi_x + 1):
+                bucket = self.cells.get((y, x))
+                if bucket:
+                    buckets.append(bucket)
+        return buckets
+
+    def bbox(self, min_lat, min_lng, max_lat, max_lng) -> list:
+        """Ids of points inside the box, sorted by id."""
+        with self.lock:
+            out = [
+                listing_id
+                for bucket in self._candidate_cells(min_lat, min_lng, max_lat, max_lng)
+                for listing_id, (lat, lng) in bucket.items()
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+            ]
+        out.sort()
+        return out
+
+    def near(self, lat, lng, radius_km) -> dict:
+        """{id: distance_km} for points within radius_km of (lat, lng)."""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        coslat = max(math.cos(math.radians(lat)), 1e-6)
+        dlng = min(math.degrees(radius_km / (EARTH_RADIUS_KM * coslat)), 180.0)
+        out = {}
+        with self.lock:
+            for bucket in self._candidate_cells(lat - dlat, lng - dlng, lat + dlat, lng + dlng):
+                for listing_id, (plat, plng) in bucket.items():
+                    d = haversine_km(lat, lng, plat, plng)
+                    if d <= radius_km:
+                        out[listing_id] = d
+        return out
+
+
+def build_index(session) -> GridIndex:
+    from app.models.listing import Listing
+
+    index = GridIndex()
+    rows = session.execute(
+        select(Listing.id, Listing.latitude, Listing.longitude).where(
+            Listing.is_active == True, Listing.latitude.isnot(None), Listing.longitude.isnot(None)
+        )
+    )
+    for listing_id, lat, lng in rows:
+        index.insert(listing_id, lat, lng)
+    return index
+
+
+_loader = IndexLoader(build_index)
+
+
+def get_spatial_index() -> GridIndex:
+    return _loader.get()
+
+
+def index_listing(listing_id: int, lat, lng, is_active: bool) -> None:
+    if is_active and lat is not None and lng is not None:
+        _loader.update(lambda index: index.insert(listing_id, lat, lng))
+    else:
+        unindex_listing(listing_id)
+
+
+def unindex_listing(listing_id: int) -> None:
+    _loader.update(lambda index: index.remove(listing_id))
@@ -0,0 +1,48 @@
+"""
+The one Jinja environment every page renders with.
+
+Compiled templates are kept in memory and their bytecode on disk
+(TEMPLATE_CACHE_DIR, by default a per-user directory under the system temp
+dir), so a fresh worker loads bytecode instead of parsing and compiling
+every template again. precompile() does that for every template at
+startup rather than on the first request for each page.
+
+TEMPLATE_AUTO_RELOAD=false skips the per-render check of the template
+file's mtime; leave it on while editing templates.
+"""
+import os
+
+import jinja2
+from dotenv import load_dotenv
+from fastapi.templating import Jinja2Templates
+from markupsafe import Markup
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # backend/
+FRONTEND_HTML = os.path.join(BASE_DIR, "..", "frontend", "html")
+
+_cache_dir = os.getenv("TEMPLATE_CACHE_DIR") or None
+if _cache_dir:
+    os.makedirs(_cache_dir, exist_ok=True)
+
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(FRONTEND_HTML),
+    autoescape=True,
+    bytecode_cache=jinja2.FileSystemBytecodeCache(_cache_dir),
+    auto_reload=os.getenv("TEMPLATE_AUTO_RELOAD", "true").strip().lower() in ("1", "true", "yes", "on"),
+)
+templates = Jinja2Templates(env=env)
+
+
+def precompile() -> int:
+    """Compile every template now; returns how many there are."""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def render_fragment(name: str, **context) -> Markup:
+    """Render a partial that doesn't depend on the request (no url_for), for caching."""
+    return Markup(env.get_template(name).render(**context))
@@ -0,0 +1,95 @@
+"""
+Amenity filters: free-text LIKE scans against the bitmask, in SQL and in memory.
+
+Seeds --listings listings, then for one, two and three required amenities
+times the count of active matches four ways: LIKE '%...%' on the amenities
+string (what a filter had to do before the mask existed, and wrong for
+"laundry" vs "in-unit laundry"), (amenity_mask & m) = m in SQL, the
+in-memory index over every active listing, and the in-memory index
+narrowing a ranked candidate list such as a text search returns. Ends with
+/search_results-style pages (search_listings) with and without the index.
+
+Run from backend/:  python -m benchmarks.bench_amenities [--listings 100000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from sqlalchemy import and_, func, select  # noqa: E402
+
+from app.crud import listing_crud  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.models.listing import Listing  # noqa: E402
+from app.schemas import SearchFilterStructure  # noqa: E402
+from app.services import amenities  # noqa: E402
+from scripts.seed_data import seed  # noqa: E402
+
+QUERIES = (
+    ("wifi",),
+    ("wifi", "furnished"),
+    ("in_unit_laundry", "furnished", "parking"),
+)
+
+
+def best_ms(fn, repeat: int) -> tuple:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(max(100, args.listings // 20), args.listings, 0, log=lambda *a: None)
+    session = SessionLocal()
+    get_amenity_index = amenities.get_amenity_index
+    index = get_amenity_index()
+    if index is None:
+        print("NumPy is not installed; only the SQL paths can be measured")
+    active = session.scalar(select(func.count()).where(Listing.is_active == True))
+    print(f"{args.listings} listings, {active} active")
+
+    rnd = random.Random(3)
+    candidates = rnd.sample(range(1, args.listings + 1), min(20_000, args.listings))
+
+    print(f"\n{'amenities':<38}{'LIKE ms':>9}{'mask SQL':>10}{'index':>8}{'20k ids':>9}{'matches':>9}")
+    for keys in QUERIES:
+        wanted = amenities.parse_filter(",".join(keys))
+        like = and_(*[Listing.amenities.like(f"%{amenities.LABELS[k]}%") for k in keys])
+        like_ms, like_n = best_ms(lambda: session.scalar(select(func.count()).where(Listing.is_active == True, like)), args.repeat)
+        sql_ms, sql_n = best_ms(lambda: session.scalar(
+            select(func.count()).where(Listing.is_active == True, listing_crud.has_amenities(wanted))), args.repeat)
+        if index is not None:
+            index_ms, ids = best_ms(lambda: index.matching(wanted), args.repeat)
+            filter_ms, _ = best_ms(lambda: index.filter(candidates, wanted), args.repeat)
+            assert len(ids) == sql_n
+        else:
+            index_ms = filter_ms = float("nan")
+        note = "" if like_n == sql_n else f"  (LIKE found {like_n})"
+        print(f"{' & '.join(keys):<38}{like_ms:>9.2f}{sql_ms:>10.2f}{index_ms:>8.2f}{filter_ms:>9.2f}{sql_n:>9}{note}")
+
+    print("\nsearch_listings, first page of 50:")
+    for keys in QUERIES:
+        filters = SearchFilterStructure(price=2500, amenities=",".join(keys))
+        with_index, _ = best_ms(lambda: listing_crud.search_listings(session, filters), args.repeat)
+        # as if NumPy were missing: the SQL mask condition alone
+        amenities.get_amenity_index = lambda: None
+        without, _ = best_ms(lambda: listing_crud.search_listings(session, filters), args.repeat)
+        amenities.get_amenity_index = get_amenity_index
+        print(f"  {' & '.join(keys):<36}{with_index:>8.2f} ms with the index, {without:.2f} ms SQL only")
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Date-range availability: AvailabilityIndex vs. a linear pass over every listing's free intervals.
+
+Run from backend/:  python -m benchmarks.bench_availability [--listings 300000] [--queries 200]
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from app.services.availability import AvailabilityIndex, free_intervals
+
+BASE = date(2025, 1, 1)
+
+
+def random_listing(rnd):
+    start = BASE + timedelta(days=rnd.randint(0, 540))
+    end = start + timedelta(days=rnd.randint(30, 300))
+    booked = []
+    for _ in range(rnd.choice((0, 0, 1, 2))):
+        b = start + timedelta(days=rnd.randint(0, 200))
+        booked.append((b, b + timedelta(days=rnd.randint(7, 90))))
+    return free_intervals(start, end, booked)
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<24} median {statistics.median(samples):9.3f} ms   p95 {p95:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=300_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    listings = {i: random_listing(rnd) for i in range(args.listings)}
+
+    index = AvailabilityIndex()
+    t = time.perf_counter()
+    for listing_id, intervals in listings.items():
+        index.set_listing(listing_id, intervals)
+    print(f"indexed {args.listings} listings in {time.perf_counter() - t:.2f}s")
+
+    queries = []
+    for _ in range(args.queries):
+        start = BASE + timedelta(days=rnd.randint(0, 700))
+        queries.append((start, start + timedelta(days=rnd.randint(7, 120))))
+
+    def linear(start, end):
+        return {i for i, iv in listings.items() if any(s <= start and e >= end for s, e in iv)}
+
+    index_ms, linear_ms, hits = [], [], []
+    for start, end in queries:
+        t = time.perf_counter()
+        found = index.available(start, end)
+        index_ms.append((time.perf_counter() - t) * 1000)
+        hits.append(len(found))
+    for start, end in queries[: max(1, args.queries // 10)]:
+        t = time.perf_counter()
+        expected = linear(start, end)
+        linear_ms.append((time.perf_counter() - t) * 1000)
+        assert expected == index.available(start, end)
+
+    report("linear scan", linear_ms)
+    report("availability index", index_ms)
+    print(f"average matches per query: {statistics.mean(hits):.0f}")
+
+    t = time.perf_counter()
+    for i in range(1000):
+        index.set_listing(i, random_listing(rnd))
+    print(f"incremental update: {(time.perf_counter() - t) * 1000 / 1000:.3f} ms per listing")
+
+
+if __name__ == "__main__":
+    main()
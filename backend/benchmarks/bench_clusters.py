@@ -0,0 +1,102 @@
+"""
+Map cluster index: build time, viewport query latency per zoom, update cost.
+
+Builds the index over --listings seeded listings (scattered around the
+college towns of scripts.seed_data) in bulk and one insert at a time, then
+asks for --queries random 1280x800 px viewports centred on those towns at
+each zoom and reports latency, how many items come back and how many
+markers the same viewport would have needed one per listing. Ends with the
+cost of the incremental updates the listing CRUD functions make.
+
+Run from backend/:  python -m benchmarks.bench_clusters [--listings 100000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"  # seed_data imports the engine
+
+from app.services.cluster_index import CELL_SHIFT, ClusterIndex, project, unproject  # noqa: E402
+from scripts.seed_data import TOWNS, listing_rows  # noqa: E402
+
+ZOOMS = (4, 8, 11, 13, 15, 17)
+VIEWPORT = (1280, 800)
+
+
+def viewport(rnd: random.Random, zoom: int):
+    _, _, _, lat, lng = rnd.choice(TOWNS)
+    x, y = project(lat + rnd.gauss(0, 0.02), lng + rnd.gauss(0, 0.02))
+    world_px = 256 * 2 ** zoom
+    half_w, half_h = VIEWPORT[0] / 2 / world_px, VIEWPORT[1] / 2 / world_px
+    north, west = unproject(x - half_w, y - half_h)
+    south, east = unproject(x + half_w, y + half_h)
+    return west, south, east, north
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = [(r["id"], r["latitude"], r["longitude"], r["cost_per_month"])
+            for r in listing_rows(random.Random(7), 1, args.listings, range(1, 2))]
+    print(f"{args.listings} listings, {256 >> CELL_SHIFT} px cells")
+
+    t = time.perf_counter()
+    index = ClusterIndex.build(rows)
+    bulk = time.perf_counter() - t
+    tracemalloc.start()
+    copy = ClusterIndex.build(rows)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del copy
+    t = time.perf_counter()
+    incremental = ClusterIndex()
+    for row in rows:
+        incremental.insert(*row)
+    one_by_one = time.perf_counter() - t
+    cells = sum(len(level) for level in index.levels)
+    print(f"bulk build {bulk:.2f} s, one insert at a time {one_by_one:.2f} s; "
+          f"{cells} cells over {len(index.levels)} zoom levels, {memory / 1e6:.0f} MB")
+
+    rnd = random.Random(1)
+    print(f"\n{'zoom':>5}{'p50 ms':>9}{'p95 ms':>9}{'items':>8}{'markers':>9}{'KB':>8}")
+    for zoom in ZOOMS:
+        timings, items, markers, sizes = [], [], [], []
+        for _ in range(args.queries):
+            box = viewport(rnd, zoom)
+            t = time.perf_counter()
+            out = index.clusters(zoom, *box)
+            timings.append(time.perf_counter() - t)
+            items.append(len(out))
+            markers.append(sum(item["count"] for item in out))
+            sizes.append(len(json.dumps({"zoom": zoom, "items": out})))
+        print(f"{zoom:>5}{statistics.median(timings) * 1000:>9.3f}{percentile(timings, 0.95) * 1000:>9.3f}"
+              f"{statistics.mean(items):>8.0f}{statistics.mean(markers):>9.0f}{statistics.mean(sizes) / 1024:>8.1f}")
+
+    moves = rows[: min(10_000, len(rows))]
+    t = time.perf_counter()
+    for listing_id, _, _, _ in moves:
+        index.remove(listing_id)
+    removed = time.perf_counter() - t
+    t = time.perf_counter()
+    for row in moves:
+        index.insert(*row)
+    inserted = time.perf_counter() - t
+    print(f"\nupdates: remove {removed / len(moves) * 1e6:.1f} us, insert {inserted / len(moves) * 1e6:.1f} us per listing")
+
+
+if __name__ == "__main__":
+    main()
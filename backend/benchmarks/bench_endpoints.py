@@ -0,0 +1,228 @@
+"""
+End-to-end latency for the hot endpoints, with a stored baseline.
+
+Seeds a throwaway SQLite database with scripts.seed_data, starts uvicorn on
+it (or uses --url for a server you already seeded), then drives each endpoint
+with --concurrency clients until --samples requests have completed, after a
+short warm-up that loads the in-memory indexes. Reports p50/p95/p99 and
+requests per second.
+
+  --save-baseline   write the results to --baseline
+  (default)         compare with --baseline if it exists; exit 1 when an
+                    endpoint's p95 is more than --threshold worse
+
+Baselines are machine-specific: record one on the machine that will run the
+comparison, with the same options.
+
+Run from backend/:  python -m benchmarks.bench_endpoints [--samples 300] [--save-baseline]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("BCRYPT_ROUNDS", "12")
+if "--url" not in sys.argv:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+    os.environ["BLOB_STORE_DIR"] = os.path.join(_tmp, "blobs")
+    os.environ["GEOCODER"] = "offline"
+else:
+    # only so the app modules import; the remote server has its own database
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'unused.db')}")
+
+import httpx  # noqa: E402
+
+from scripts.seed_data import TOWNS  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "endpoints.json")
+PASSWORD = "password123"
+WORDS = ["sunny", "cozy", "studio", "loft", "furnished", "quiet", "bedroom", "modern"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def endpoint_requests(rnd, users: int, listings: int) -> dict:
+    """Endpoint name -> function returning (method, path, form data) for one random request."""
+
+    def homepage():
+        return "GET", f"/homepage?q={rnd.choice(WORDS)}&price={rnd.randrange(1000, 4500, 250)}", None
+
+    def api_listings():
+        _, _, _, lat, lng = rnd.choice(TOWNS)
+        bbox = f"{lng - 0.02:.4f},{lat - 0.02:.4f},{lng + 0.02:.4f},{lat + 0.02:.4f}"
+        return "GET", f"/api/listings?limit=100&bbox={bbox}", None
+
+    def search_results():
+        start = f"2025-{rnd.randint(1, 12):02d}-01"
+        return "GET", (f"/search_results?price={rnd.randrange(800, 4500, 100)}&bedrooms={rnd.randint(1, 3)}"
+                       f"&start_date={start}&end_date={start[:5]}{int(start[5:7]):02d}-28"), None
+
+    def listing_page():
+        return "GET", f"/listings/{rnd.randint(1, listings)}", None
+
+    def incoming_requests():
+        return "GET", f"/incoming_requests/{rnd.randint(1, users)}", None
+
+    def login():
+        return "POST", "/login", {"email": f"user{rnd.randint(1, users)}@seed.edu", "password": PASSWORD}
+
+    return {
+        "/homepage": homepage,
+        "/api/listings": api_listings,
+        "/search_results": search_results,
+        "/listings/{id}": listing_page,
+        "/incoming_requests/{id}": incoming_requests,
+        "/login": login,
+    }
+
+
+async def drive(base: str, make_request, samples: int, concurrency: int, warmup: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = samples
+
+    async def one(client, record: bool):
+        nonlocal errors
+        method, path, data = make_request()
+        t = time.perf_counter()
+        r = await client.request(method, path, data=data)
+        elapsed = (time.perf_counter() - t) * 1000
+        if r.status_code >= 400:
+            errors += 1
+        if record:
+            latencies.append(elapsed)
+
+    async def worker(client):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await one(client, True)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        for _ in range(warmup):
+            await one(client, False)
+        errors = 0
+        t = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t
+    return {
+        "p50": round(percentile(latencies, 0.50), 2),
+        "p95": round(percentile(latencies, 0.95), 2),
+        "p99": round(percentile(latencies, 0.99), 2),
+        "rps": round(len(latencies) / elapsed, 1),
+        "errors": errors,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old and result["p95"] > old["p95"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {result['p95']} ms vs baseline {old['p95']} ms")
+    return regressions
+
+
+def start_server(port: int):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ),
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            httpx.get(base + "/health")
+            return server, base
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running, already seeded server instead")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--listings", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=200000, help="booking requests to seed")
+    parser.add_argument("--samples", type=int, default=300, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", help="comma-separated subset, e.g. /homepage,/login")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95 regression, as a fraction")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        from scripts.seed_data import seed
+
+        print(f"seeding {args.users} users, {args.listings} listings, {args.requests} booking requests")
+        seed(args.users, args.listings, args.requests, PASSWORD, rounds=int(os.environ["BCRYPT_ROUNDS"]))
+        server, base = start_server(free_port())
+
+    rnd = random.Random(42)
+    requests = endpoint_requests(rnd, args.users, args.listings)
+    if args.endpoints:
+        wanted = [e.strip() for e in args.endpoints.split(",")]
+        requests = {name: requests[name] for name in wanted}
+
+    results = {}
+    try:
+        print(f"\n{'endpoint':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}")
+        for name, make_request in requests.items():
+            result = asyncio.run(drive(base, make_request, args.samples, args.concurrency, args.warmup))
+            results[name] = result
+            print(f"{name:<26}{result['p50']:>9}{result['p95']:>9}{result['p99']:>9}{result['rps']:>9}{result['errors']:>8}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    options = {k: getattr(args, k) for k in ("users", "listings", "requests", "samples", "concurrency")}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("\nno baseline to compare with; run with --save-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("options") != options:
+        print(f"\nnote: baseline was recorded with {baseline.get('options')}")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\np95 regressions over {args.threshold:.0%}:")
+        for line in regressions:
+            print(f" - {line}")
+        return 1
+    print(f"\nno p95 regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
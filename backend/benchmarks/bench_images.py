@@ -0,0 +1,89 @@
+"""
+Photo pipeline throughput on a batch of large JPEGs.
+
+Generates --count phone-sized JPEGs (4032x3024, noisy enough to land in the
+usual 4-8 MB range), then times process_image one at a time in this
+process, and through ImagePipeline with 1, 2, 4, ... up to --workers
+processes, with the whole batch submitted at once like a burst of uploads.
+Also reports what a photo costs to send afterwards: bytes per variant
+against the original.
+
+Run from backend/:  python -m benchmarks.bench_images [--count 16] [--workers 4]
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["BLOB_STORE_DIR"] = os.path.join(_tmp, "blobs")
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from app.services.images import VARIANTS, ImagePipeline, process_image  # noqa: E402
+
+
+def make_photo(seed: int, size=(4032, 3024)) -> bytes:
+    noise = Image.effect_noise(size, 40 + seed % 20)
+    base = Image.linear_gradient("L").resize(size)
+    im = Image.merge("RGB", (noise, base, Image.blend(noise, base, 0.5)))
+    draw = ImageDraw.Draw(im)
+    for i in range(40):
+        x, y = (seed * 97 + i * 211) % size[0], (seed * 53 + i * 157) % size[1]
+        draw.rectangle((x, y, x + 300, y + 200), fill=(i * 6 % 256, 255 - i * 5, 90))
+    exif = im.getexif()
+    exif[0x0112] = 6 if seed % 3 == 0 else 1  # some portrait shots, as phones store them
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=95, exif=exif.tobytes())
+    return buf.getvalue()
+
+
+async def through_pool(photos, workers: int) -> float:
+    pipeline = ImagePipeline(workers=workers, max_pending=len(photos))
+    try:
+        await pipeline.process(photos[0])  # start the worker processes
+        t = time.perf_counter()
+        await asyncio.gather(*(pipeline.process(p) for p in photos))
+        return time.perf_counter() - t
+    finally:
+        pipeline.executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    photos = [make_photo(i) for i in range(args.count)]
+    total_mb = sum(len(p) for p in photos) / 1e6
+    print(f"{args.count} JPEGs, 4032x3024, {total_mb / args.count:.1f} MB average")
+
+    timings = []
+    outputs = []
+    for photo in photos:
+        t = time.perf_counter()
+        outputs.append(process_image(photo))
+        timings.append(time.perf_counter() - t)
+    print(f"\none at a time, in process: {statistics.median(timings) * 1000:.0f} ms median per photo, "
+          f"{args.count / sum(timings):.2f} photos/s")
+
+    print(f"\n{'workers':>8}{'seconds':>10}{'photos/s':>10}{'MB/s in':>10}")
+    workers = 1
+    while workers <= args.workers:
+        elapsed = asyncio.run(through_pool(photos, workers))
+        print(f"{workers:>8}{elapsed:>10.2f}{args.count / elapsed:>10.2f}{total_mb / elapsed:>10.1f}")
+        workers *= 2
+
+    original = statistics.mean(len(p) for p in photos)
+    print(f"\n{'variant':<8}{'width':>7}{'avg KB':>9}{'vs original':>13}")
+    for name, width in VARIANTS:
+        size = statistics.mean(len(o[name]) for o in outputs)
+        print(f"{name:<8}{width:>7}{size / 1024:>9.0f}{size / original:>12.2%}")
+
+
+if __name__ == "__main__":
+    main()
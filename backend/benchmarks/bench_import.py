@@ -0,0 +1,104 @@
+"""
+Bulk listing import and export.
+
+Import: --rows CSV rows without coordinates (so every chunk is geocoded by
+the offline geocoder) through import_listings at several chunk sizes.
+Chunk size 1 is one geocode, one INSERT and one commit per listing, which
+is what creating them one POST /listings at a time costs before the HTTP
+and multipart overhead.
+
+Export: the whole table through export_listings at growing table sizes,
+with the peak memory allocated while streaming (tracemalloc), which should
+stay flat as the table grows.
+
+Run from backend/:  python -m benchmarks.bench_import [--rows 5000]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["GEOCODER"] = "offline"
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from app.crud.listing_io import LISTING_FIELDS, export_listings, import_listings  # noqa: E402
+from app.database import AsyncSessionLocal, engine  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models.listing import Listing  # noqa: E402
+from app.models.user import User  # noqa: E402
+from scripts.seed_data import listing_rows  # noqa: E402
+
+CHUNK_SIZES = (1, 50, 500, 2000)
+EXPORT_SIZES = (10_000, 50_000, 200_000)
+
+
+def make_csv(rows: int) -> bytes:
+    fields = [f for f in LISTING_FIELDS if f not in ("latitude", "longitude") and not f.startswith("image")]
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fields, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(listing_rows(random.Random(1), 1, rows, range(1, 2)))
+    return buf.getvalue().encode()
+
+
+async def body(data: bytes, size: int = 64 * 1024):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def timed_import(data: bytes, chunk_size: int):
+    async with AsyncSessionLocal() as session:
+        t = time.perf_counter()
+        report = await import_listings(session, body(data), "csv", 1, chunk_size)
+        return time.perf_counter() - t, report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "lister", "email": "lister@b.edu", "password_hash": "x"}])
+
+    data = make_csv(args.rows)
+    print(f"import of {args.rows} CSV rows ({len(data) / 1e6:.1f} MB)")
+    print(f"{'chunk':>8}{'seconds':>10}{'rows/s':>10}")
+    for chunk_size in CHUNK_SIZES:
+        with engine.begin() as conn:
+            conn.execute(delete(Listing))
+        elapsed, report = asyncio.run(timed_import(data, chunk_size))
+        assert report["inserted"] == args.rows, report
+        print(f"{chunk_size:>8}{elapsed:>10.2f}{args.rows / elapsed:>10.0f}")
+
+    print(f"\nexport of the whole table\n{'rows':>8}{'format':>8}{'seconds':>10}{'MB out':>8}{'peak MB':>9}")
+    with engine.begin() as conn:
+        conn.execute(delete(Listing))
+    have = 0
+    for size in EXPORT_SIZES:
+        with engine.begin() as conn:
+            conn.execute(insert(Listing), list(listing_rows(random.Random(size), have + 1, size - have, range(1, 2))))
+        have = size
+        for fmt in ("csv", "ndjson"):
+            t = time.perf_counter()
+            out = sum(len(chunk) for chunk in export_listings(fmt))
+            elapsed = time.perf_counter() - t
+            tracemalloc.start()
+            for _ in export_listings(fmt):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{size:>8}{fmt:>8}{elapsed:>10.2f}{out / 1e6:>8.1f}{peak / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Event-loop latency under write load: sync session commits inside coroutines
+(what create_listing used to do) vs. the AsyncSession path.
+
+A ticker coroutine asks to wake every millisecond and records how late it
+actually runs; that lateness is what every other request on the worker waits.
+Meanwhile --writers coroutines each insert and commit --writes booking
+requests.
+
+Run from backend/:  python -m benchmarks.bench_loop_latency [--writers 20] [--writes 100]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import AsyncSessionLocal, SessionLocal, engine  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models.booking_request import BookingRequest  # noqa: E402
+from app.models.listing import Listing  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+TICK = 0.001
+
+
+def seed() -> None:
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": i, "name": f"u{i}", "email": f"u{i}@b.edu", "password_hash": "x"} for i in range(1, 101)])
+        conn.execute(insert(Listing), [{"id": i, "title": f"L{i}", "lister": i, "is_active": True} for i in range(1, 101)])
+
+
+async def sync_writer(n: int, worker: int) -> None:
+    for i in range(n):
+        session = SessionLocal()
+        try:
+            session.add(BookingRequest(listing_id=i % 100 + 1, subletter_id=worker % 100 + 1))
+            session.commit()  # blocks the event loop until SQLite is done
+        finally:
+            session.close()
+        await asyncio.sleep(0)
+
+
+async def async_writer(n: int, worker: int) -> None:
+    for i in range(n):
+        async with AsyncSessionLocal() as session:
+            session.add(BookingRequest(listing_id=i % 100 + 1, subletter_id=worker % 100 + 1))
+            await session.commit()
+
+
+async def measure(writer, writers: int, writes: int):
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            t = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append((time.perf_counter() - t - TICK) * 1000)
+
+    tick_task = asyncio.create_task(ticker())
+    t = time.perf_counter()
+    await asyncio.gather(*(writer(writes, w) for w in range(writers)))
+    elapsed = time.perf_counter() - t
+    done.set()
+    await tick_task
+    return lags, writers * writes / elapsed
+
+
+def report(name, lags, rate) -> None:
+    lags = sorted(lags)
+    p99 = lags[int(len(lags) * 0.99) - 1]
+    print(f"{name:<22} loop lag median {statistics.median(lags):7.2f} ms   p99 {p99:7.2f} ms   "
+          f"max {lags[-1]:7.2f} ms   {rate:7.0f} writes/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=100)
+    args = parser.parse_args()
+
+    seed()
+    idle, _ = asyncio.run(measure(lambda n, w: asyncio.sleep(1), 1, 0))
+    report("idle", idle, 0)
+    report("sync commits on loop", *asyncio.run(measure(sync_writer, args.writers, args.writes)))
+    report("AsyncSession", *asyncio.run(measure(async_writer, args.writers, args.writes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Cost of the request metrics: the same app with and without MetricsMiddleware
+and the SQL cursor hooks.
+
+Requests go in-process through httpx's ASGI transport, so only the app's own
+work is timed. The app is imported with METRICS_ENABLED=false and driven alternately bare
+and wrapped in the middleware; the SQL hooks stay installed for both, but
+they do nothing for requests the middleware isn't metering.
+
+Run from backend/:  python -m benchmarks.bench_metrics [--requests 3000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["METRICS_ENABLED"] = "false"
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models.listing import Listing  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services import metrics  # noqa: E402
+from scripts.seed_data import listing_rows, user_rows  # noqa: E402
+
+PATHS = ["/listings/1", "/api/listings?limit=50", "/health"]
+
+
+def seed() -> None:
+    run_migrations(engine)
+    rnd = random.Random(1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), list(user_rows(rnd, 1, 10, "x")))
+        conn.execute(insert(Listing), list(listing_rows(rnd, 1, 200, range(1, 11))))
+
+
+async def measure(plain_app, wrapped_app, path: str, n: int) -> tuple:
+    """Median microseconds per request without and with metrics, alternating so drift hits both."""
+    samples = ([], [])
+    clients = [
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=a), base_url="http://bench")
+        for a in (plain_app, wrapped_app)
+    ]
+    for client in clients:
+        for _ in range(50):
+            await client.get(path)
+    for _ in range(n):
+        for client, out in zip(clients, samples):
+            t = time.perf_counter()
+            await client.get(path)
+            out.append((time.perf_counter() - t) * 1e6)
+    for client in clients:
+        await client.aclose()
+    return statistics.median(samples[0]), statistics.median(samples[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    seed()
+    metrics.install_sql_hooks()  # the hooks return at once outside a metered request
+    wrapped = metrics.MetricsMiddleware(app)
+
+    print(f"{'path':<26}{'off us':>10}{'on us':>10}{'overhead':>10}")
+    for path in PATHS:
+        off, on = asyncio.run(measure(app, wrapped, path, args.requests))
+        print(f"{path:<26}{off:>10.0f}{on:>10.0f}{on - off:>+10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+JSON endpoint microbenchmarks: building and encoding the body the old way
+(ORM objects or per-value conversion into dicts, then the stdlib encoder in
+JSONResponse) against the current path (plain column rows, FastJSONResponse,
+and for the map feed the columnar layout), plus what compression does to
+the bytes sent.
+
+Covers the /api/listings page (--page rows), /incoming_requests for the
+owner with the most pending requests, and /users. Times are per response,
+best of --repeat runs, measured in process without HTTP.
+
+Run from backend/:  python -m benchmarks.bench_serialization [--page 500] [--repeat 20]
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy import func, select, update  # noqa: E402
+
+from app.crud.booking_request_crud import get_incoming_requests  # noqa: E402
+from app.crud.listing_crud import COLUMN_FIELDS, FEED_FIELDS, _feed_value, get_listing_feed, get_listing_feed_columns  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models.booking_request import BookingRequest  # noqa: E402
+from app.models.listing import Listing  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.responses import FastJSONResponse, dumps  # noqa: E402
+from app.services.compression import GZIP_LEVEL, _brotli_module, compress  # noqa: E402
+from scripts.seed_data import seed  # noqa: E402
+
+
+# The code paths these endpoints used before, kept here to compare against
+
+def old_listing_feed(session, limit, fields=FEED_FIELDS):
+    fields = ("id",) + tuple(f for f in fields if f != "id")
+    rows = session.execute(
+        select(*[getattr(Listing, f) for f in fields])
+        .where(Listing.latitude.isnot(None), Listing.longitude.isnot(None))
+        .order_by(Listing.id).limit(limit + 1)
+    ).all()[:limit]
+    return {"items": [{f: _feed_value(v) for f, v in zip(fields, row)} for row in rows], "next_cursor": None}
+
+
+def old_incoming_requests(session, owner_id):
+    rows = (
+        session.query(BookingRequest, Listing, User)
+        .join(Listing, BookingRequest.listing_id == Listing.id)
+        .join(User, BookingRequest.subletter_id == User.id)
+        .filter(BookingRequest.status == "pending", Listing.lister == owner_id)
+        .all()
+    )
+    out = []
+    for req, listing, user in rows:
+        out.append([
+            {"id": req.id, "listing_id": req.listing_id, "subletter_id": req.subletter_id, "status": req.status,
+             "created_at": req.created_at.isoformat() if getattr(req, "created_at", None) else None},
+            {"id": listing.id, "title": listing.title, "city": listing.city,
+             "cost_per_month": float(listing.cost_per_month) if listing.cost_per_month is not None else None},
+            {"id": user.id, "name": user.name, "email": user.email},
+        ])
+    return out
+
+
+def old_users(session):
+    return [{"id": u.id, "name": u.name, "email": u.email} for u in session.query(User).all()]
+
+
+def new_users(session):
+    rows = session.execute(select(User.id, User.name, User.email)).all()
+    return [{"id": user_id, "name": name, "email": email} for user_id, name, email in rows]
+
+
+def best_ms(fn, repeat: int) -> tuple:
+    best, body = float("inf"), None
+    for _ in range(repeat):
+        session = SessionLocal()
+        try:
+            t = time.perf_counter()
+            body = fn(session)
+            best = min(best, time.perf_counter() - t)
+        finally:
+            session.close()
+    return best * 1000, body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.users, 20_000, 60_000, log=lambda *a: None)
+    with engine.begin() as conn:
+        conn.execute(update(BookingRequest).values(status="pending"))
+        owner = conn.execute(
+            select(Listing.lister).join(BookingRequest, BookingRequest.listing_id == Listing.id)
+            .group_by(Listing.lister).order_by(func.count().desc()).limit(1)
+        ).scalar()
+
+    page = args.page
+    cases = [
+        ("/api/listings", [
+            ("old: dicts + JSONResponse", lambda s: JSONResponse(old_listing_feed(s, page)).body),
+            ("rows + FastJSONResponse", lambda s: FastJSONResponse({"items": get_listing_feed(s, 0, page)[0], "next_cursor": None}).body),
+            ("layout=columns (all fields)", lambda s: FastJSONResponse({"columns": get_listing_feed_columns(s, 0, page)[0], "next_cursor": None}).body),
+            ("old, map fields only", lambda s: JSONResponse(old_listing_feed(s, page, COLUMN_FIELDS)).body),
+            ("layout=columns (map fields)", lambda s: FastJSONResponse({"columns": get_listing_feed_columns(s, 0, page, COLUMN_FIELDS)[0], "next_cursor": None}).body),
+        ]),
+        (f"/incoming_requests/{owner}", [
+            ("old: ORM entities + JSONResponse", lambda s: JSONResponse(old_incoming_requests(s, owner)).body),
+            ("columns + FastJSONResponse", lambda s: FastJSONResponse(get_incoming_requests(s, owner)).body),
+        ]),
+        ("/users", [
+            ("old: ORM users + JSONResponse", lambda s: JSONResponse(old_users(s)).body),
+            ("columns + FastJSONResponse", lambda s: FastJSONResponse(new_users(s)).body),
+        ]),
+    ]
+
+    try:
+        import orjson  # noqa: F401
+        encoder = "orjson"
+    except ImportError:
+        encoder = "stdlib json (orjson not installed)"
+    brotli = _brotli_module()
+    print(f"FastJSONResponse encoder: {encoder}; brotli {'available' if brotli else 'not installed'}")
+    for endpoint, variants in cases:
+        print(f"\n{endpoint}")
+        print(f"  {'':<34}{'ms':>8}{'bytes':>10}{'gzip':>9}{'br':>9}")
+        for label, fn in variants:
+            ms, body = best_ms(fn, args.repeat)
+            gz = len(compress(body, "gzip"))
+            br = len(compress(body, "br")) if brotli else float("nan")
+            print(f"  {label:<34}{ms:>8.2f}{len(body):>10}{gz:>9}{br:>9}")
+
+    # what the compression itself costs, on the biggest body
+    session = SessionLocal()
+    body = dumps({"items": get_listing_feed(session, 0, page)[0]})
+    session.close()
+    print(f"\ncompressing a {len(body) // 1024} KB feed page:")
+    for name in ("gzip", "br") if brotli else ("gzip",):
+        t = time.perf_counter()
+        for _ in range(args.repeat):
+            out = compress(body, name)
+        print(f"  {name:<5}{(time.perf_counter() - t) / args.repeat * 1000:>7.2f} ms -> {len(out)} bytes")
+    t = time.perf_counter()
+    for _ in range(args.repeat):
+        gzip.compress(body, GZIP_LEVEL)
+    print(f"  (gzip.compress at level {GZIP_LEVEL}: {(time.perf_counter() - t) / args.repeat * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Per-request database overhead: the old engine setup (echo=True, default pool,
+no pragmas) vs. the engine profile in app.database.
+
+Each "request" opens a session, reads one user and one page of listings,
+writes nothing and closes, which is what a typical page view does.
+Echo output goes to /dev/null so only the logging cost is measured.
+
+Run from backend/:  python -m benchmarks.bench_session [--requests 5000]
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+DB_URL = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["DATABASE_URL"] = DB_URL
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base, configure_sqlite, engine_options  # noqa: E402
+from app.models.listing import Listing  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+def seed(engine) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"name": f"u{i}", "email": f"u{i}@b.edu", "password_hash": "x"} for i in range(1000)])
+        conn.execute(insert(Listing), [{"title": f"L{i}", "lister": i % 1000 + 1, "is_active": True, "cost_per_month": 1000} for i in range(5000)])
+
+
+def run(factory, n: int) -> list:
+    samples = []
+    for i in range(n):
+        t = time.perf_counter()
+        session = factory()
+        try:
+            session.get(User, i % 1000 + 1)
+            session.execute(select(Listing.id, Listing.title).where(Listing.is_active == True).limit(20)).all()
+        finally:
+            session.close()
+        samples.append((time.perf_counter() - t) * 1e6)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<28} median {statistics.median(samples):8.1f} us   p99 {p99:8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    tuned = create_engine(DB_URL, **engine_options(DB_URL))
+    configure_sqlite(tuned)
+    seed(tuned)
+
+    legacy = create_engine(DB_URL, echo=True, future=True)
+    # echo=True attaches a stdout handler; send it nowhere so we time the logging work, not the terminal
+    sql_logger = logging.getLogger("sqlalchemy.engine.Engine")
+    for handler in sql_logger.handlers:
+        handler.setStream(open(os.devnull, "w"))
+
+    legacy_factory = sessionmaker(bind=legacy, autoflush=False, autocommit=False)
+    tuned_factory = sessionmaker(bind=tuned, autoflush=False, autocommit=False)
+
+    # warm both pools
+    run(legacy_factory, 100)
+    run(tuned_factory, 100)
+
+    report("before (echo=True)", run(legacy_factory, args.requests))
+    report("after (engine profile)", run(tuned_factory, args.requests))
+
+
+if __name__ == "__main__":
+    main()
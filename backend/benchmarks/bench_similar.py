@@ -0,0 +1,124 @@
+"""
+Similar-listings index: build time and memory, top-k query latency, update cost.
+
+Builds the index over --listings seeded listings (scripts.seed_data rows,
+active or not, all indexed), then asks for the --k nearest neighbours of
+--queries random listings and reports latency and how far away, how much
+dearer and how many bedrooms off the suggestions are. A pure-Python scan
+over the same vectors shows what the vectorized pass saves. Ends with the
+cost of the incremental updates the listing CRUD functions make.
+
+Run from backend/:  python -m benchmarks.bench_similar [--listings 100000] [--queries 500] [--k 6]
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"  # seed_data imports the engine
+
+from app.services.similar import AMENITY_WEIGHT, DIMENSIONS, SimilarIndex, feature_vector  # noqa: E402
+from scripts.seed_data import listing_rows  # noqa: E402
+
+COLUMNS = ("id", "cost_per_month", "bedrooms_available", "bathrooms", "latitude", "longitude",
+           "available_start_date", "available_end_date", "amenity_mask")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def km(a, b):
+    p1, p2 = math.radians(a["latitude"]), math.radians(b["latitude"])
+    dp, dl = p2 - p1, math.radians(b["longitude"] - a["longitude"])
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(h))
+
+
+def python_scan(vectors, masks, ids, query, query_mask, k, exclude):
+    scored = []
+    for listing_id, vector, mask in zip(ids, vectors, masks):
+        if listing_id != exclude:
+            d = sum((a - b) * (a - b) for a, b in zip(vector, query))
+            d += bin(mask ^ query_mask).count("1") * AMENITY_WEIGHT * AMENITY_WEIGHT
+            scored.append((d, listing_id))
+    scored.sort()
+    return [listing_id for _, listing_id in scored[:k]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=6)
+    args = parser.parse_args()
+
+    listings = list(listing_rows(random.Random(7), 1, args.listings, range(1, 2)))
+    by_id = {r["id"]: r for r in listings}
+    rows = [tuple(r[c] for c in COLUMNS) for r in listings]
+    print(f"{args.listings} listings, {DIMENSIONS} features + amenity bitmask")
+
+    t = time.perf_counter()
+    index = SimilarIndex.build(rows)
+    bulk = time.perf_counter() - t
+    t = time.perf_counter()
+    incremental = SimilarIndex()
+    for row in rows:
+        incremental.upsert(row[0], feature_vector(*row[1:8]), row[8])
+    one_by_one = time.perf_counter() - t
+    del incremental
+    memory = index.matrix.nbytes + index.masks.nbytes + index.ids.nbytes + index.penalty.nbytes
+    print(f"bulk build {bulk:.2f} s, one upsert at a time {one_by_one:.2f} s; matrix {memory / 1e6:.1f} MB")
+
+    rnd = random.Random(1)
+    targets = [rnd.choice(listings)["id"] for _ in range(args.queries)]
+    timings, away, dearer, beds = [], [], [], []
+    for listing_id in targets:
+        t = time.perf_counter()
+        out = index.nearest(*index.features_of(listing_id), args.k, exclude=listing_id)
+        timings.append(time.perf_counter() - t)
+        me = by_id[listing_id]
+        for other_id, _ in out:
+            other = by_id[other_id]
+            away.append(km(me, other))
+            dearer.append(abs(other["cost_per_month"] / me["cost_per_month"] - 1))
+            beds.append(abs(other["bedrooms_available"] - me["bedrooms_available"]))
+    print(f"\ntop-{args.k}: p50 {statistics.median(timings) * 1000:.2f} ms, p95 {percentile(timings, 0.95) * 1000:.2f} ms, "
+          f"{args.queries / sum(timings):.0f} queries/s")
+    print(f"suggestions are a median {statistics.median(away):.2f} km away, "
+          f"{statistics.median(dearer) * 100:.1f}% off in price, {statistics.mean(beds):.2f} bedrooms off on average")
+
+    vectors = [feature_vector(*row[1:8]) for row in rows]
+    masks = [row[8] for row in rows]
+    ids = [row[0] for row in rows]
+    scans = min(5, len(targets))
+    t = time.perf_counter()
+    agree = 0
+    for listing_id in targets[:scans]:
+        query, query_mask = vectors[listing_id - 1], masks[listing_id - 1]
+        expected = python_scan(vectors, masks, ids, query, query_mask, args.k, listing_id)
+        got = [i for i, _ in index.nearest(query, query_mask, args.k, exclude=listing_id)]
+        agree += len(set(expected) & set(got))
+    scan = (time.perf_counter() - t) / scans
+    print(f"pure-Python scan: {scan * 1000:.0f} ms per query ({agree}/{scans * args.k} of the same neighbours; "
+          f"float32 rounding can swap ties)")
+
+    moves = rows[: min(10_000, len(rows))]
+    t = time.perf_counter()
+    for row in moves:
+        index.remove(row[0])
+    removed = time.perf_counter() - t
+    t = time.perf_counter()
+    for row in moves:
+        index.upsert(row[0], feature_vector(*row[1:8]), row[8])
+    inserted = time.perf_counter() - t
+    print(f"\nupdates: remove {removed / len(moves) * 1e6:.1f} us, upsert {inserted / len(moves) * 1e6:.1f} us per listing")
+
+
+if __name__ == "__main__":
+    main()
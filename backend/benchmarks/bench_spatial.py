@@ -0,0 +1,115 @@
+"""
+Viewport query benchmark: grid spatial index vs. the full table scan /api/listings used to do.
+
+Run from backend/:  python -m benchmarks.bench_spatial [--listings 100000] [--queries 200]
+
+Uses a throwaway SQLite database, so it never touches DATABASE_URL.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.listing import Listing  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.spatial_index import build_index  # noqa: E402
+
+# Roughly the Boston / Cambridge area
+LAT0, LAT1 = 42.20, 42.45
+LNG0, LNG1 = -71.25, -70.95
+
+
+def seed(n: int, rnd: random.Random) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "bench", "email": "bench@bench.edu", "password_hash": "x"}])
+        rows = [
+            {
+                "title": f"Listing {i}",
+                "lister": 1,
+                "is_active": True,
+                "cost_per_month": rnd.randint(700, 4000),
+                "latitude": rnd.uniform(LAT0, LAT1),
+                "longitude": rnd.uniform(LNG0, LNG1),
+            }
+            for i in range(n)
+        ]
+        conn.execute(insert(Listing), rows)
+
+
+def viewport(rnd: random.Random):
+    # a zoomed-in map window, about 2 x 2 km
+    lat = rnd.uniform(LAT0, LAT1 - 0.02)
+    lng = rnd.uniform(LNG0, LNG1 - 0.025)
+    return lat, lng, lat + 0.018, lng + 0.025
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        t = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<34} median {statistics.median(samples):9.3f} ms   p95 {p95:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    t = time.perf_counter()
+    seed(args.listings, rnd)
+    print(f"seeded {args.listings} listings in {time.perf_counter() - t:.1f}s")
+
+    session = SessionLocal()
+    t = time.perf_counter()
+    index = build_index(session)
+    print(f"built grid index over {len(index)} points in {(time.perf_counter() - t) * 1000:.0f} ms")
+
+    boxes = [viewport(rnd) for _ in range(args.queries)]
+    centers = [((b[0] + b[2]) / 2, (b[1] + b[3]) / 2, 1.5) for b in boxes]
+
+    def full_scan(min_lat, min_lng, max_lat, max_lng):
+        # what the map did before: pull every geocoded row, filter client-side
+        rows = session.execute(
+            select(Listing.id, Listing.latitude, Listing.longitude)
+            .where(Listing.latitude.isnot(None), Listing.longitude.isnot(None))
+        ).all()
+        return [r.id for r in rows if min_lat <= r.latitude <= max_lat and min_lng <= r.longitude <= max_lng]
+
+    def sql_scan(min_lat, min_lng, max_lat, max_lng):
+        # best case without an index: let SQLite filter, still a full scan
+        return session.execute(
+            select(Listing.id).where(Listing.latitude.between(min_lat, max_lat), Listing.longitude.between(min_lng, max_lng))
+        ).all()
+
+    scan_queries = boxes[: max(1, args.queries // 10)]
+    report("full scan + python filter", timed(full_scan, scan_queries))
+    report("SQL range scan (no index)", timed(sql_scan, scan_queries))
+    report("grid index bbox", timed(index.bbox, boxes))
+    report("grid index radius 1.5 km", timed(index.near, centers))
+
+    hits = statistics.mean(len(index.bbox(*b)) for b in boxes)
+    print(f"average listings per viewport: {hits:.1f}")
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Idle WebSocket load on one worker.
+
+Starts uvicorn on a throwaway SQLite database, logs two users in and opens
+--connections idle /ws/messages sockets for user 1 (think open browser tabs).
+Reports the server's memory per connection, /health latency while they are
+open (the event loop should not notice idle sockets) and how long one message
+from user 2 takes to reach every socket.
+
+Needs uvicorn and the `websockets` package.
+Run from backend/:  python -m benchmarks.bench_ws_idle [--connections 5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import bcrypt  # noqa: E402
+import httpx  # noqa: E402
+import websockets  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+PASSWORD = "benchmark1"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def seed() -> None:
+    run_migrations(engine)
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": 1, "name": "lister", "email": "lister@b.edu", "password_hash": password_hash},
+            {"id": 2, "name": "subletter", "email": "subletter@b.edu", "password_hash": password_hash},
+        ])
+
+
+async def health_ms(client, n: int = 50) -> list:
+    samples = []
+    for _ in range(n):
+        t = time.perf_counter()
+        await client.get("/health")
+        samples.append((time.perf_counter() - t) * 1000)
+    return samples
+
+
+def summary(samples) -> str:
+    samples = sorted(samples)
+    return f"median {statistics.median(samples):.2f} ms, p99 {samples[int(len(samples) * 0.99) - 1]:.2f} ms"
+
+
+async def run(base: str, pid: int, connections: int) -> None:
+    async with httpx.AsyncClient(base_url=base) as lister, httpx.AsyncClient(base_url=base) as subletter:
+        for client, email in ((lister, "lister@b.edu"), (subletter, "subletter@b.edu")):
+            r = await client.post("/login", data={"email": email, "password": PASSWORD})
+            r.raise_for_status()
+        conversation_id = (await subletter.post("/conversations", json={"user_id": 1})).json()["id"]
+
+        print(f"/health with no sockets:       {summary(await health_ms(lister))}")
+        before = rss_mb(pid)
+        cookie = "; ".join(f"{k}={v}" for k, v in lister.cookies.items())
+        url = base.replace("http", "ws") + "/ws/messages"
+
+        t = time.perf_counter()
+        sockets = []
+        for start in range(0, connections, 500):
+            batch = [websockets.connect(url, additional_headers={"Cookie": cookie}, max_queue=None)
+                     for _ in range(min(500, connections - start))]
+            sockets.extend(await asyncio.gather(*batch))
+        print(f"opened {len(sockets)} sockets in {time.perf_counter() - t:.1f}s")
+        await asyncio.sleep(2)
+        after = rss_mb(pid)
+        print(f"server RSS {before:.0f} MB -> {after:.0f} MB ({(after - before) * 1024 / connections:.1f} KB per socket)")
+        stats = (await lister.get("/health/messages")).json()
+        print(f"broker: {stats['connections']} connections for {stats['users']} user(s)")
+        print(f"/health with {connections} idle:     {summary(await health_ms(lister))}")
+
+        t = time.perf_counter()
+        r = await subletter.post(f"/conversations/{conversation_id}/messages", json={"body": "still available?"})
+        r.raise_for_status()
+        received = await asyncio.gather(*(ws.recv() for ws in sockets))
+        elapsed = (time.perf_counter() - t) * 1000
+        assert all(json.loads(m)["message"]["body"] == "still available?" for m in received)
+        print(f"fan-out of one message to {connections} sockets: {elapsed:.0f} ms")
+
+        await asyncio.gather(*(ws.close() for ws in sockets))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=5000)
+    args = parser.parse_args()
+
+    seed()
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ),
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(base + "/health")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        asyncio.run(run(base, server.pid, args.connections))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
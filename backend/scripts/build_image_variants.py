@@ -0,0 +1,93 @@
+"""
+Run listing photos stored before the image pipeline through it.
+
+Run from backend/:  python -m scripts.build_image_variants [--batch-size 100] [--workers 4]
+
+Each original is re-encoded to the WebP sizes of app.services.images; the
+listing columns are pointed at the new full-size blob and the original is
+left in the blob store. Safe to re-run: photos that already have their
+variants are skipped.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import or_, select, update
+
+from app.database import SessionLocal
+from app.models.listing import Listing
+from app.services.blob_store import get_blob_store
+from app.services.images import VARIANTS, ImageRejected, process_image
+
+IMAGE_COLUMNS = ("image1", "image2", "image3", "image4")
+
+
+def _process(digest: str):
+    try:
+        return digest, process_image(get_blob_store().read(digest)), None
+    except ImageRejected as e:
+        return digest, None, str(e)
+
+
+def build(batch_size: int = 100, workers: int = 4) -> dict:
+    store = get_blob_store()
+    smallest = VARIANTS[-1][0]
+    stats = {"listings": 0, "images": 0, "skipped": 0, "rejected": 0}
+    replaced = {}  # original digest -> full-size digest
+    last_id = 0
+    session = SessionLocal()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                rows = session.execute(
+                    select(Listing.id, *[getattr(Listing, c) for c in IMAGE_COLUMNS])
+                    .where(Listing.id > last_id, or_(*[getattr(Listing, c).isnot(None) for c in IMAGE_COLUMNS]))
+                    .order_by(Listing.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                todo = set()
+                for row in rows:
+                    for col in IMAGE_COLUMNS:
+                        digest = getattr(row, col)
+                        if not digest or digest in replaced:
+                            continue
+                        if not store.exists(digest) or store.variant_exists(digest, smallest):
+                            stats["skipped"] += 1
+                            replaced[digest] = digest
+                        else:
+                            todo.add(digest)
+
+                for digest, variants, error in pool.map(_process, sorted(todo)):
+                    if variants is None:
+                        print(f"{digest}: {error}")
+                        stats["rejected"] += 1
+                        replaced[digest] = digest
+                        continue
+                    full = variants.pop(VARIANTS[0][0])
+                    replaced[digest] = store.put_with_variants(full, variants)
+                    stats["images"] += 1
+
+                for row in rows:
+                    changes = {}
+                    for col in IMAGE_COLUMNS:
+                        digest = getattr(row, col)
+                        if digest and replaced.get(digest, digest) != digest:
+                            changes[col] = replaced[digest]
+                    if changes:
+                        session.execute(update(Listing).where(Listing.id == row.id).values(**changes))
+                        stats["listings"] += 1
+                session.commit()
+    finally:
+        session.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    print(build(args.batch_size, args.workers))
@@ -0,0 +1,31 @@
+"""
+Export listings as CSV or NDJSON, streamed so memory stays flat.
+
+Run from backend/:
+    python -m scripts.export_listings --format csv > listings.csv
+    python -m scripts.export_listings --format ndjson --lister 42 -o mine.ndjson
+"""
+import argparse
+import sys
+
+from app.crud.listing_io import export_listings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--lister", type=int, help="only this user's listings")
+    parser.add_argument("-o", "--output", help="default: stdout")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in export_listings(args.format, args.lister):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
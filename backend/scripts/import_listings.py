@@ -0,0 +1,63 @@
+"""
+Bulk-import listings from a CSV or NDJSON file.
+
+Run from backend/:
+    python -m scripts.import_listings units.csv --lister 42
+    cat units.ndjson | python -m scripts.import_listings - --format ndjson --lister 42
+
+Columns are the fields of ListingStructure (title, bedrooms_available, ...,
+zip_code, amenities; optional latitude/longitude and image1..image4
+hashes); a file written by scripts.export_listings imports as-is. Prints
+the report and exits 1 if any row failed.
+
+A running server only learns about rows written here when it restarts;
+use POST /listings/import to import into a live server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from app.crud.listing_io import IMPORT_CHUNK_SIZE, import_listings
+from app.database import AsyncSessionLocal, engine
+from app.migrations import run_migrations
+from app.services.geocoding import get_geocoder
+
+
+async def read_chunks(f, size: int = 64 * 1024):
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def run(path: str, fmt: str, lister: int, chunk_size: int) -> dict:
+    f = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        async with AsyncSessionLocal() as session:
+            return await import_listings(session, read_chunks(f), fmt, lister, chunk_size)
+    finally:
+        await get_geocoder().aclose()
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="file to import, or - for stdin")
+    parser.add_argument("--lister", type=int, required=True, help="user id that will own the listings")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if os.path.splitext(args.path)[1].lower() in (".ndjson", ".jsonl") else "csv")
+    run_migrations(engine)
+    report = asyncio.run(run(args.path, fmt, args.lister, args.chunk_size))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failed"] or report["stopped"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Move base64 photos stored in listings.image1..image4 into the blob store.
+
+Run from backend/:  python -m scripts.migrate_images_to_blobs [--batch-size 100]
+
+Safe to re-run: columns that already hold a digest (or nothing) are skipped.
+"""
+import argparse
+import base64
+import binascii
+
+from sqlalchemy import select, update
+
+from app.database import SessionLocal
+from app.models.listing import Listing
+from app.services.blob_store import get_blob_store, is_digest
+
+IMAGE_COLUMNS = ("image1", "image2", "image3", "image4")
+
+
+def migrate(batch_size: int = 100) -> dict:
+    store = get_blob_store()
+    stats = {"listings": 0, "images": 0, "skipped": 0}
+    last_id = 0
+    session = SessionLocal()
+    try:
+        while True:
+            # keyset batches so only one chunk of base64 text is in memory at a time
+            rows = session.execute(
+                select(Listing.id, *[getattr(Listing, c) for c in IMAGE_COLUMNS])
+                .where(Listing.id > last_id)
+                .order_by(Listing.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                last_id = row.id
+                changes = {}
+                for col in IMAGE_COLUMNS:
+                    value = getattr(row, col)
+                    if not value or is_digest(value):
+                        continue
+                    try:
+                        data = base64.b64decode(value, validate=True)
+                    except (binascii.Error, ValueError):
+                        stats["skipped"] += 1
+                        continue
+                    changes[col] = store.put(data) if data else None
+                    stats["images"] += 1
+                if changes:
+                    session.execute(update(Listing).where(Listing.id == row.id).values(**changes))
+                    stats["listings"] += 1
+            session.commit()
+    finally:
+        session.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    print(migrate(args.batch_size))
@@ -0,0 +1,174 @@
+"""
+Generate synthetic users, geocoded listings and booking requests.
+
+Rows go in through the real models in batched executemany inserts, appended
+after whatever is already in the database. Listings get coordinates
+scattered around real college towns, so the map, spatial and search paths
+see realistic data, and no geocoder is called. Every user gets the same
+password (--password) so load tests can log in.
+
+Run from backend/:
+    python -m scripts.seed_data --users 10000 --listings 200000 --requests 2000000
+
+Same --seed, same data.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import bcrypt
+from sqlalchemy import func, insert, select
+
+from app.database import engine
+from app.migrations import run_migrations
+from app.models.booking_request import BookingRequest
+from app.models.listing import Listing
+from app.models.user import User
+from app.services.amenities import parse_amenities
+from app.services.change_tracking import bump_stored
+
+# (city, state, zip, latitude, longitude)
+TOWNS = [
+    ("Boston", "MA", "02115", 42.3398, -71.0892),
+    ("Cambridge", "MA", "02139", 42.3736, -71.1097),
+    ("New York", "NY", "10027", 40.8075, -73.9626),
+    ("Philadelphia", "PA", "19104", 39.9522, -75.1932),
+    ("Berkeley", "CA", "94720", 37.8719, -122.2585),
+    ("Los Angeles", "CA", "90007", 34.0224, -118.2851),
+    ("Ann Arbor", "MI", "48109", 42.2780, -83.7382),
+    ("Austin", "TX", "78712", 30.2849, -97.7341),
+    ("Chicago", "IL", "60637", 41.7886, -87.5987),
+    ("Seattle", "WA", "98195", 47.6553, -122.3035),
+]
+ADJECTIVES = ["Sunny", "Cozy", "Spacious", "Quiet", "Modern", "Renovated", "Furnished", "Bright", "Charming", "Affordable"]
+KINDS = ["Studio", "Bedroom", "Apartment", "Loft", "Room", "Suite", "Townhouse", "Sublet"]
+STREETS = ["Main St", "Huntington Ave", "College Ave", "Broadway", "Oak St", "Park Ave", "Maple Dr", "University Way"]
+AMENITIES = ["wifi", "laundry", "in-unit laundry", "furnished", "parking", "gym", "dishwasher", "air conditioning", "pets allowed", "balcony"]
+STATUSES = ["pending"] * 6 + ["approved"] * 2 + ["rejected"] * 2
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Lee", "Kim", "Patel", "Garcia", "Nguyen", "Smith", "Chen", "Lopez", "Brown", "Wong"]
+
+BASE_DATE = date(2025, 1, 1)
+
+
+def _next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _batches(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def user_rows(rnd, first_id: int, count: int, password_hash: str):
+    for user_id in range(first_id, first_id + count):
+        name = f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}"
+        yield {"id": user_id, "name": name, "email": f"user{user_id}@seed.edu", "password_hash": password_hash}
+
+
+def listing_rows(rnd, first_id: int, count: int, user_ids: range):
+    for listing_id in range(first_id, first_id + count):
+        city, state, zip_code, lat, lng = rnd.choice(TOWNS)
+        total_rooms = rnd.randint(1, 5)
+        bedrooms_available = rnd.randint(1, total_rooms)
+        start = BASE_DATE + timedelta(days=rnd.randint(0, 540))
+        row = {
+            "id": listing_id,
+            "title": f"{rnd.choice(ADJECTIVES)} {rnd.choice(KINDS)} near campus",
+            "lister": rnd.choice(user_ids),
+            "is_active": rnd.random() < 0.85,
+            "bedrooms_available": bedrooms_available,
+            "total_rooms": total_rooms,
+            "bedrooms_in_use": total_rooms - bedrooms_available,
+            "bathrooms": rnd.randint(1, 3),
+            "cost_per_month": float(rnd.randrange(500, 4500, 25)),
+            "available_start_date": start,
+            "available_end_date": start + timedelta(days=rnd.randint(30, 365)),
+            "address": f"{rnd.randint(1, 999)} {rnd.choice(STREETS)}",
+            "city": city,
+            "state": state,
+            "zip_code": zip_code,
+            "amenities": ", ".join(rnd.sample(AMENITIES, rnd.randint(0, 4))),
+            # roughly a 5 km scatter around campus
+            "latitude": lat + rnd.gauss(0, 0.03),
+            "longitude": lng + rnd.gauss(0, 0.03),
+        }
+        row["amenity_mask"] = parse_amenities(row["amenities"])
+        yield row
+
+
+def request_rows(rnd, count: int, user_ids: range, listing_ids: range):
+    for _ in range(count):
+        start = BASE_DATE + timedelta(days=rnd.randint(0, 600))
+        dated = rnd.random() < 0.7
+        yield {
+            "listing_id": rnd.choice(listing_ids),
+            "subletter_id": rnd.choice(user_ids),
+            "status": rnd.choice(STATUSES),
+            "start_date": start if dated else None,
+            "end_date": start + timedelta(days=rnd.randint(14, 120)) if dated else None,
+        }
+
+
+def seed(users: int, listings: int, requests: int, password: str = "password123",
+         seed_value: int = 1, batch_size: int = 10000, rounds: int = 4, log=print) -> dict:
+    """Append the requested volumes; returns the id ranges that were created."""
+    rnd = random.Random(seed_value)
+    run_migrations(engine)
+    # one hash for everyone: bcrypt per user would dominate the run time
+    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+    with engine.connect() as conn:
+        first_user, first_listing = _next_id(conn, User), _next_id(conn, Listing)
+    user_ids = range(first_user, first_user + users)
+    listing_ids = range(first_listing, first_listing + listings)
+    if listings and not users:
+        raise ValueError("listings need at least one new user to own them")
+    if requests and not (users and listings):
+        raise ValueError("booking requests need new users and listings")
+
+    steps = [
+        ("users", User, user_rows(rnd, first_user, users, password_hash)),
+        ("listings", Listing, listing_rows(rnd, first_listing, listings, user_ids)),
+        ("booking requests", BookingRequest, request_rows(rnd, requests, user_ids, listing_ids)),
+    ]
+    for label, model, rows in steps:
+        t = time.perf_counter()
+        written = 0
+        for batch in _batches(rows, batch_size):
+            with engine.begin() as conn:
+                conn.execute(insert(model), batch)
+                # Core inserts skip the session hooks; keep the shared listings counter honest
+                bump_stored(conn, model.__tablename__)
+            written += len(batch)
+        if written:
+            log(f"{label}: {written} rows in {time.perf_counter() - t:.1f}s")
+    return {"users": user_ids, "listings": listing_ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--listings", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=2000000)
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=4, help="bcrypt cost of the shared password hash")
+    args = parser.parse_args()
+
+    created = seed(args.users, args.listings, args.requests, args.password, args.seed, args.batch_size, args.rounds)
+    users = created["users"]
+    if users:
+        print(f"log in as user{users.start}@seed.edu .. user{users.stop - 1}@seed.edu with password {args.password!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Shared fixtures. The whole run uses one throwaway SQLite database built
+through the migrations (importing app.main runs them); every test starts
+with empty tables and freshly unloaded in-memory indexes and caches.
+
+Run from backend/:  python -m pytest
+"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["BLOB_STORE_DIR"] = os.path.join(_tmp, "blobs")
+os.environ["GEOCODER"] = "offline"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+from datetime import date  # noqa: E402
+
+import bcrypt  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.table_version import TableVersion  # noqa: E402,F401  (so Base.metadata knows every table)
+from app.models.listing import Listing  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services import amenities, availability, cluster_index, search_index, similar, spatial_index  # noqa: E402
+from app.services.result_cache import fragment_cache, identity_cache, search_cache  # noqa: E402
+
+INDEXES = (amenities, availability, cluster_index, search_index, similar, spatial_index)
+PASSWORD = "password"
+PASSWORD_HASH = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name != "table_versions":
+                conn.execute(table.delete())
+    for module in INDEXES:
+        module._loader.reset()
+    for cache in (search_cache, fragment_cache, identity_cache):
+        cache.invalidate()
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def add_users():
+    """add_users(n) inserts users 1..n (u1@b.edu, ...), all with PASSWORD."""
+    def add(n: int) -> None:
+        with engine.begin() as conn:
+            conn.execute(insert(User), [
+                {"id": i, "name": f"u{i}", "email": f"u{i}@b.edu", "password_hash": PASSWORD_HASH} for i in range(1, n + 1)
+            ])
+    return add
+
+
+@pytest.fixture
+def login(client):
+    """login(user_id) signs the test client in as that user, through /login."""
+    def sign_in(user_id: int) -> None:
+        assert client.post("/login", data={"email": f"u{user_id}@b.edu", "password": PASSWORD}).status_code == 200
+    return sign_in
+
+
+@pytest.fixture
+def add_listing():
+    """add_listing(id, **columns) inserts one active listing owned by user 1."""
+    def add(listing_id: int, **columns) -> None:
+        row = {
+            "id": listing_id, "title": f"Listing {listing_id}", "lister": 1, "is_active": True,
+            "cost_per_month": 1000, "bedrooms_available": 1, "bathrooms": 1,
+            "available_start_date": date(2025, 1, 1), "available_end_date": date(2025, 12, 31),
+            "city": "Boston", "state": "MA", "amenities": "", "amenity_mask": 0,
+            "latitude": 42.35, "longitude": -71.06,
+        }
+        row.update(columns)
+        with engine.begin() as conn:
+            conn.execute(insert(Listing), [row])
+    return add
+
@@ -0,0 +1,125 @@
+"""Amenities: parsing free text into the bitmask, the in-memory index against SQL, and ?amenities= filters."""
+import os
+import random
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from app.crud.listing_crud import has_amenities
+from app.migrations import MIGRATIONS, run_migrations
+from app.models.listing import Listing
+from app.services.amenities import BITS, AmenityIndex, amenity_keys, build_index, parse_amenities, parse_filter
+
+
+@pytest.mark.parametrize("text, keys", [
+    ("Wi-Fi, in-unit laundry", ["wifi", "in_unit_laundry"]),
+    ("washer/dryer in unit; fully furnished", ["in_unit_laundry", "furnished"]),
+    ("free wifi\ngym and parking", ["wifi", "parking", "gym"]),
+    ("Central air | pets OK | ensuite", ["air_conditioning", "pets_allowed", "private_bathroom"]),
+    ("heat included, all utilities included", ["utilities_included", "heating"]),
+    ("", []),
+    (None, []),
+    ("a view of the river", []),
+])
+def test_parse(text, keys):
+    assert amenity_keys(parse_amenities(text)) == keys
+
+
+@pytest.mark.parametrize("text", [
+    "utilities not included",
+    "tenant pays utilities",
+    "Utilities paid by tenant",
+    "heat not included",
+    "no pets",
+    "No parking",
+    "furnished: no",
+    "laundry excluded",
+])
+def test_negated_phrases_count_for_nothing(text):
+    assert parse_amenities(text) == 0
+
+
+def test_negation_only_drops_its_own_phrase():
+    assert amenity_keys(parse_amenities("wifi, no pets, heat not included, dishwasher")) == ["wifi", "dishwasher"]
+
+
+def test_parse_filter():
+    assert parse_filter("wifi,furnished") == BITS["wifi"] | BITS["furnished"]
+    assert parse_filter(["wifi", "in-unit laundry", ""]) == BITS["wifi"] | BITS["in_unit_laundry"]
+    assert parse_filter([]) == 0
+    with pytest.raises(ValueError, match="Unknown amenity: 'sauna'"):
+        parse_filter("wifi,sauna")
+
+
+def test_index_matches_sql(db, add_users, add_listing):
+    rnd = random.Random(7)
+    add_users(1)
+    for listing_id in range(1, 201):
+        add_listing(listing_id, amenity_mask=rnd.getrandbits(len(BITS)), is_active=rnd.random() < 0.9)
+    index = build_index(db)
+    index.set(500, BITS["wifi"])  # past the array built for the table: grows it
+
+    for _ in range(30):
+        wanted = 0
+        for bit in rnd.sample(list(BITS.values()), rnd.randint(1, 3)):
+            wanted |= bit
+        expected = db.execute(
+            select(Listing.id).where(Listing.is_active == True, has_amenities(wanted)).order_by(Listing.id)
+        ).scalars().all()
+        if wanted == BITS["wifi"]:
+            expected.append(500)
+        assert index.matching(wanted) == expected
+        within = rnd.sample(range(1, 300), 80)
+        assert index.matching(wanted, within) == sorted(set(within) & set(expected))
+        assert index.filter(within, wanted) == [i for i in within if i in expected]
+    assert index.filter([], BITS["wifi"]) == []
+
+
+def test_removed_listings_never_match():
+    index = AmenityIndex(size=4)
+    index.set(2, 0)
+    index.set(3, BITS["gym"])
+    assert len(index) == 2
+    assert index.matching(0) == [2, 3]  # no amenities asked for: every listing
+    index.remove(3)
+    index.remove(3)
+    assert len(index) == 1
+    assert index.matching(BITS["gym"]) == []
+    assert index.filter([3, 2, 9], 0) == [2]
+
+
+def test_search_filters_on_amenities(client, add_users, add_listing):
+    add_users(1)
+    both = BITS["wifi"] | BITS["furnished"]
+    add_listing(1, amenity_mask=both)
+    add_listing(2, amenity_mask=BITS["wifi"])
+    add_listing(3, amenity_mask=both | BITS["gym"])
+    add_listing(4, amenity_mask=both, is_active=False)
+
+    def search(**params):
+        return sorted(item["id"] for item in client.get("/search_results", params=params).json()["items"])
+
+    assert search(amenities="wifi,furnished") == [1, 3]
+    assert search(amenities=["wifi", "gym"]) == [3]
+    assert search(amenities="wifi") == [1, 2, 3]
+    assert client.get("/search_results", params={"amenities": "sauna"}).status_code == 422
+
+
+def test_migration_parses_existing_listings(monkeypatch):
+    from app import migrations
+
+    scratch = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'amenities.db')}")
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in MIGRATIONS if m[0] < 6])
+    run_migrations(scratch)
+    monkeypatch.undo()
+    # rows written before listings had an amenity_mask column
+    with scratch.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, name, email, password_hash) VALUES (1, 'a', 'a@b.edu', 'x')"))
+        conn.execute(text(
+            "INSERT INTO listings (id, title, lister, is_active, amenities) VALUES "
+            "(1, 'a', 1, 1, 'wifi, utilities not included, heat not included'), (2, 'b', 1, 1, 'gym'), (3, 'c', 1, 1, NULL)"
+        ))
+    assert 6 in run_migrations(scratch)
+    with scratch.connect() as conn:
+        assert conn.execute(text("SELECT amenity_mask FROM listings ORDER BY id")).scalars().all() == [BITS["wifi"], BITS["gym"], 0]
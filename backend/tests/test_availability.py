@@ -0,0 +1,95 @@
+"""Availability: listing windows minus approved bookings, and the index that answers date searches."""
+import random
+from datetime import date, timedelta
+
+from app.services.availability import AvailabilityIndex, free_intervals
+
+D = date.fromisoformat
+
+
+def test_free_intervals_subtracts_bookings():
+    window = (D("2025-01-01"), D("2025-12-31"))
+    assert free_intervals(*window, []) == [window]
+    assert free_intervals(*window, [(D("2025-03-01"), D("2025-03-31"))]) == [
+        (D("2025-01-01"), D("2025-02-28")), (D("2025-04-01"), D("2025-12-31")),
+    ]
+    # overlapping and unsorted bookings merge; a booking at the edge trims it
+    assert free_intervals(*window, [
+        (D("2025-06-10"), D("2025-07-10")), (D("2025-01-01"), D("2025-01-31")), (D("2025-06-01"), D("2025-06-20")),
+    ]) == [(D("2025-02-01"), D("2025-05-31")), (D("2025-07-11"), D("2025-12-31"))]
+    # bookings outside the window don't matter; one without dates takes all of it
+    assert free_intervals(*window, [(D("2024-01-01"), D("2024-02-01"))]) == [window]
+    assert free_intervals(*window, [(None, None)]) == []
+    assert free_intervals(None, D("2025-12-31"), []) == []
+
+
+def test_index_matches_a_scan():
+    rnd = random.Random(4)
+    base = D("2025-01-01")
+    listings = {}
+    for listing_id in range(1, 301):
+        start = base + timedelta(days=rnd.randint(0, 200))
+        end = start + timedelta(days=rnd.randint(0, 200))
+        booked = []
+        for _ in range(rnd.randint(0, 3)):
+            b = start + timedelta(days=rnd.randint(0, 200))
+            booked.append((b, b + timedelta(days=rnd.randint(0, 30))))
+        listings[listing_id] = free_intervals(start, end, booked)
+    index = AvailabilityIndex()
+    for listing_id, intervals in listings.items():
+        index.set_listing(listing_id, intervals)
+    for listing_id in range(1, 301, 3):  # replacing a listing's intervals leaves no trace of the old ones
+        index.set_listing(listing_id, listings[listing_id])
+
+    for _ in range(200):
+        start = base + timedelta(days=rnd.randint(0, 400))
+        end = start + timedelta(days=rnd.randint(0, 60))
+        expected = {i for i, intervals in listings.items() if any(s <= start and end <= e for s, e in intervals)}
+        assert index.available(start, end) == expected
+
+    for listing_id in listings:
+        index.remove_listing(listing_id)
+    assert len(index) == 0 and index.buckets == {} and index.months == []
+
+
+def test_approved_booking_hides_the_listing_from_date_search(client, login, add_users, add_listing):
+    add_users(2)
+    add_listing(1, available_start_date=D("2025-01-01"), available_end_date=D("2025-12-31"))
+    add_listing(2, available_start_date=D("2025-01-01"), available_end_date=D("2025-12-31"))
+
+    def search(start, end):
+        body = client.get("/search_results", params={"start_date": start, "end_date": end}).json()
+        return sorted(item["id"] for item in body["items"])
+
+    assert search("2025-06-01", "2025-06-30") == [1, 2]  # loads the index
+    created = client.post("/booking_requests", json={
+        "listing_id": 1, "subletter_id": 2, "start_date": "2025-06-01", "end_date": "2025-08-31",
+    })
+    assert created.status_code == 200
+    assert search("2025-06-01", "2025-06-30") == [1, 2]  # pending requests don't block anything
+
+    request_id = client.get("/incoming_requests/1").json()[0][0]["id"]
+    login(1)
+    assert client.post(f"/booking_requests/{request_id}/approve").json()["ok"]
+    assert search("2025-06-01", "2025-06-30") == [2]
+    assert search("2025-09-01", "2025-09-30") == [1, 2]
+
+
+def test_deleting_an_approved_booking_frees_its_dates(client, login, add_users, add_listing):
+    add_users(2)
+    add_listing(1)
+
+    def search():
+        body = client.get("/search_results", params={"start_date": "2025-06-01", "end_date": "2025-06-30"}).json()
+        return [item["id"] for item in body["items"]]
+
+    client.post("/booking_requests", json={
+        "listing_id": 1, "subletter_id": 2, "start_date": "2025-06-01", "end_date": "2025-06-30",
+    })
+    request_id = client.get("/incoming_requests/1").json()[0][0]["id"]
+    login(1)
+    assert client.post(f"/booking_requests/{request_id}/approve").json()["ok"]
+    assert search() == []
+
+    assert client.delete(f"/booking_requests/{request_id}").status_code == 200
+    assert search() == [1]
@@ -0,0 +1,53 @@
+"""Blob store: identical uploads share a blob, and blobs and their variants are served by digest."""
+import hashlib
+import os
+
+import pytest
+
+from app.services.blob_store import BlobBackend, BlobStore, LocalFSBackend, get_blob_store
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def blob_files(root):
+    return [name for _, _, names in os.walk(root) for name in names]
+
+
+def test_identical_uploads_share_one_blob(tmp_path):
+    store = BlobStore(LocalFSBackend(str(tmp_path)))
+    digest = store.put(PNG)
+    assert digest == hashlib.sha256(PNG).hexdigest()
+    assert store.put(PNG) == digest
+    assert store.put_with_variants(PNG, {"card": b"card"}) == digest
+    assert sorted(blob_files(tmp_path)) == [digest, f"{digest}.card"]
+    assert store.read(digest) == PNG and store.content_type(digest) == "image/png"
+
+
+def test_backends_implement_the_whole_interface():
+    class Partial(BlobBackend):
+        def exists(self, digest):
+            return False
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_blob_and_variant_serving(client):
+    digest = get_blob_store().put_with_variants(PNG, {"card": PNG[:100]})
+    full = client.get(f"/images/{digest}")
+    assert full.status_code == 200 and full.content == PNG
+    assert full.headers["content-type"] == "image/png" and "immutable" in full.headers["cache-control"]
+    assert client.get(f"/images/{digest}", headers={"If-None-Match": f'W/{full.headers["etag"]}'}).status_code == 304
+
+    card = client.get(f"/images/{digest}/card")
+    assert card.status_code == 200 and card.content == PNG[:100]
+    assert card.headers["etag"] != full.headers["etag"]
+    part = client.get(f"/images/{digest}/card", headers={"Range": "bytes=0-7"})
+    assert part.status_code == 206 and part.content == PNG[:8]
+    assert part.headers["content-range"] == "bytes 0-7/100"
+
+    # no thumb was stored: the original stands in, briefly cacheable
+    thumb = client.get(f"/images/{digest}/thumb", follow_redirects=False)
+    assert thumb.status_code == 307 and thumb.headers["location"] == f"/images/{digest}"
+    assert client.get(f"/images/{digest}/poster").status_code == 404
+    assert client.get(f"/images/{'0' * 64}").status_code == 404
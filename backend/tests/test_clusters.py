@@ -0,0 +1,113 @@
+"""Map clusters: counts and price ranges at every zoom, and /api/listings/clusters."""
+import random
+
+import pytest
+
+from app.database import engine
+from app.models.listing import Listing
+from app.services.change_tracking import bump_stored
+from app.services.cluster_index import ClusterIndex
+
+WORLD = (-180, -85, 180, 85)  # refused past zoom 4
+NEW_ENGLAND = (-75, 40, -70, 44)  # refused past zoom 9
+
+
+def scattered(n: int, seed: int = 3) -> dict:
+    rnd = random.Random(seed)
+    return {i: (42.0 + rnd.random(), -71.5 + rnd.random(), rnd.randint(500, 3000)) for i in range(1, n + 1)}
+
+
+def totals(index: ClusterIndex, zoom: int, box=NEW_ENGLAND):
+    items = index.clusters(zoom, *box)
+    return sum(item["count"] for item in items), items
+
+
+def test_counts_add_up_at_every_zoom():
+    points = scattered(500)
+    built = ClusterIndex.build([(i, lat, lng, price) for i, (lat, lng, price) in points.items()], max_zoom=12)
+    inserted = ClusterIndex(max_zoom=12)
+    for i, (lat, lng, price) in points.items():
+        inserted.insert(i, lat, lng, price)
+
+    around = (-71.6, 41.9, -70.4, 43.1)
+    for zoom in range(0, 12):
+        count, items = totals(built, zoom, around)
+        assert count == len(points)
+        assert items == inserted.clusters(zoom, *around)
+    prices = [price for _, _, price in points.values()]
+    (everything,) = built.clusters(0, *WORLD)
+    assert (everything["min_price"], everything["max_price"]) == (min(prices), max(prices))
+    # past the deepest level each listing comes back on its own
+    box = (-71.5, 42.0, -71.4, 42.1)
+    expected = sorted(i for i, (lat, lng, _) in points.items() if 42.0 <= lat <= 42.1 and -71.5 <= lng <= -71.4)
+    assert sorted(item["id"] for item in built.clusters(13, *box)) == expected
+
+
+def test_removals_and_moves_update_every_level():
+    index = ClusterIndex(max_zoom=10)
+    index.insert(1, 42.35, -71.06, 900)
+    index.insert(2, 42.36, -71.05, 1500)
+    index.insert(3, 42.34, -71.07, 2000)
+    (cluster,) = index.clusters(0, *WORLD)
+    assert (cluster["count"], cluster["min_price"], cluster["max_price"]) == (3, 900, 2000)
+
+    index.remove(3)
+    (cluster,) = index.clusters(0, *WORLD)
+    assert (cluster["count"], cluster["max_price"]) == (2, 1500)
+
+    index.insert(2, 40.71, -74.00, 1500)  # moved to New York
+    for zoom in range(0, 10):
+        assert totals(index, zoom)[0] == 2
+    items = index.clusters(6, *NEW_ENGLAND)
+    assert sorted(item["id"] for item in items) == [1, 2]
+
+    index.remove(1)
+    index.remove(2)
+    assert len(index) == 0 and all(level == {} for level in index.levels) and index.members == {}
+
+
+def test_expansion_zoom_is_where_a_cluster_splits():
+    index = ClusterIndex(max_zoom=16)
+    index.insert(1, 42.3500, -71.0600)
+    index.insert(2, 42.3505, -71.0605)
+    (cluster,) = index.clusters(0, *WORLD)
+    split = cluster["expansion_zoom"]
+    assert len(index.clusters(split - 1, -71.1, 42.3, -71.0, 42.4)) == 1
+    assert len(index.clusters(split, -71.1, 42.3, -71.0, 42.4)) == 2
+
+
+def test_bad_boxes_are_refused():
+    index = ClusterIndex(max_zoom=10)
+    with pytest.raises(ValueError, match="south"):
+        index.clusters(3, -71.1, 42.4, -71.0, 42.3)
+    with pytest.raises(ValueError, match="too large"):
+        index.clusters(10, *WORLD)
+
+
+def test_api_clusters(client, add_users, add_listing):
+    add_users(1)
+    add_listing(1, latitude=42.35, longitude=-71.06, cost_per_month=900)
+    add_listing(2, latitude=42.36, longitude=-71.05, cost_per_month=1500)
+    add_listing(3, latitude=40.71, longitude=-74.00)
+    add_listing(4, latitude=42.35, longitude=-71.06, is_active=False)
+
+    params = {"z": 2, "bbox": "-80,35,-60,50"}
+    first = client.get("/api/listings/clusters", params=params)
+    assert first.status_code == 200
+    assert sum(item["count"] for item in first.json()["items"]) == 3
+    etag = first.headers["etag"]
+    assert client.get("/api/listings/clusters", params=params, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    assert client.delete("/listings/1").status_code == 200
+    second = client.get("/api/listings/clusters", params=params, headers={"If-None-Match": etag})
+    assert second.status_code == 200 and second.headers["etag"] != etag
+    assert sum(item["count"] for item in second.json()["items"]) == 2
+
+    # a write from another worker or a script moves the ETag as well
+    with engine.begin() as conn:
+        bump_stored(conn, Listing.__tablename__)
+    third = client.get("/api/listings/clusters", params=params, headers={"If-None-Match": second.headers["etag"]})
+    assert third.status_code == 200
+
+    assert client.get("/api/listings/clusters", params={"z": 18, "bbox": "-180,-85,180,85"}).status_code == 400
+    assert client.get("/api/listings/clusters", params={"z": 23, "bbox": "-80,35,-60,50"}).status_code == 422
@@ -0,0 +1,61 @@
+"""Geocoder cache: hits skip the provider, and caching can never fail a lookup."""
+import asyncio
+
+import pytest
+from sqlalchemy import event, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.database import engine
+from app.models.geocode_cache import GeocodeCache
+from app.services.geocoding import GeocodeCacheStore, Geocoder, OfflineGeocodeProvider
+
+BOSTON = (42.35, -71.06)
+
+
+class CountingProvider(OfflineGeocodeProvider):
+    def __init__(self):
+        super().__init__(known={"1 Main St, Boston": BOSTON})
+        self.calls = []
+
+    async def geocode(self, address):
+        self.calls.append(address)
+        return await super().geocode(address)
+
+
+@pytest.fixture
+def provider():
+    return CountingProvider()
+
+
+def test_hits_skip_the_provider(provider):
+    geocoder = Geocoder(provider, GeocodeCacheStore())
+    first = asyncio.run(geocoder.geocode_many(["1 Main St, Boston", "1 main st boston", "2 Elm St"]))
+    assert first["1 Main St, Boston"] == first["1 main st boston"] == BOSTON
+    assert provider.calls == ["1 Main St, Boston", "2 Elm St"]  # one lookup per normalized address
+
+    again = asyncio.run(geocoder.geocode_many(["1 MAIN ST. BOSTON", "2 Elm St", "3 Oak St"]))
+    assert again["1 MAIN ST. BOSTON"] == BOSTON and again["2 Elm St"] == first["2 Elm St"]
+    assert provider.calls[2:] == ["3 Oak St"]
+
+
+def test_losing_an_insert_race_is_not_an_error(provider):
+    def another_request_caches_it(session, flush_context, instances):
+        with engine.begin() as conn:
+            conn.execute(insert(GeocodeCache), [{"address_key": "1 main st boston", "latitude": 1.0, "longitude": 2.0}])
+
+    event.listen(Session, "before_flush", another_request_caches_it, once=True)
+    geocoder = Geocoder(provider, GeocodeCacheStore())
+    assert asyncio.run(geocoder.geocode("1 Main St, Boston")) == BOSTON
+    with engine.connect() as conn:
+        assert conn.execute(select(GeocodeCache.latitude)).scalars().all() == [1.0]
+
+
+def test_cache_write_failure_still_answers(provider, monkeypatch):
+    cache = GeocodeCacheStore()
+
+    def locked(entries, name):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(cache, "put_many", locked)
+    assert asyncio.run(Geocoder(provider, cache).geocode("1 Main St, Boston")) == BOSTON
@@ -0,0 +1,84 @@
+"""Photo pipeline: what gets rejected, and what comes out of an accepted upload."""
+import asyncio
+import io
+import os
+import signal
+import struct
+import zlib
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from app.crud.listing_crud import store_image
+from app.services import images
+from app.services.images import ImagePipeline, ImagePipelineBusy, ImageRejected, process_image
+
+
+def encoded(fmt: str, size=(64, 48), **params) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 40, 40)).save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+def png_header(width: int, height: int) -> bytes:
+    """A PNG that only claims its size; Pillow reads the header before any pixels."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"")) + chunk(b"IEND", b"")
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"definitely not an image", "Not a supported image file"),
+    (encoded("BMP"), "Unsupported image format BMP"),
+    (encoded("JPEG", size=(640, 480))[:2000], "truncated or corrupt"),
+    (png_header(20_000, 20_000), "too large"),  # past Pillow's decompression bomb limit
+])
+def test_rejected(data, message):
+    with pytest.raises(ImageRejected, match=message):
+        process_image(data)
+
+
+def test_pixel_limit_is_checked_before_decoding():
+    with pytest.raises(ImageRejected, match="too large"):
+        process_image(png_header(5000, 5000), max_pixels=1_000_000)
+
+
+def test_variants_are_upright_webp_without_metadata():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored sideways: rotate 90 degrees clockwise to view
+    exif[0x8825] = {2: (40.0, 42.0, 0.0)}  # GPS
+    out = process_image(encoded("JPEG", size=(2400, 1200), exif=exif.tobytes()))
+    assert list(out) == ["full", "card", "thumb"]
+    sizes = {}
+    for name, data in out.items():
+        im = Image.open(io.BytesIO(data))
+        assert im.format == "WEBP"
+        assert "exif" not in im.info
+        sizes[name] = im.size
+    # turned upright (portrait), then each variant capped at its width
+    assert sizes == {"full": (1200, 2400), "card": (640, 1280), "thumb": (320, 640)}
+
+
+def test_oversized_upload_is_a_400():
+    upload = UploadFile(io.BytesIO(b"x" * (images.IMAGE_MAX_BYTES + 1)), filename="huge.jpg")
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(store_image(upload))
+    assert e.value.status_code == 400 and e.value.detail.startswith("huge.jpg: ")
+
+
+def die(data):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_dead_worker_means_busy_then_a_fresh_pool(monkeypatch):
+    pipeline = ImagePipeline(workers=1)
+    monkeypatch.setattr(images, "process_image", die)
+    with pytest.raises(ImagePipelineBusy):
+        asyncio.run(pipeline.process(b"anything"))
+    monkeypatch.undo()
+    assert pipeline.stats()["broken_pools"] == 1
+    assert list(asyncio.run(pipeline.process(encoded("PNG")))) == ["full", "card", "thumb"]
+    pipeline.executor.shutdown()
@@ -0,0 +1,40 @@
+"""Login: hashes made at another bcrypt cost are upgraded, touching only that user's row."""
+import bcrypt
+from sqlalchemy import update
+
+from app.database import engine
+from app.models.user import User
+from app.services.change_tracking import row_version
+from app.services.passwords import BCRYPT_ROUNDS, hash_rounds
+
+PASSWORD = "password"  # every add_users() user's
+
+
+def stored_hash(db, user_id):
+    db.expire_all()
+    return db.get(User, user_id).password_hash
+
+
+def test_login_rehashes_an_old_cost(client, db, login, add_users):
+    add_users(2)
+    old = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(BCRYPT_ROUNDS + 1)).decode()
+    with engine.begin() as conn:
+        conn.execute(update(User).where(User.id == 1).values(password_hash=old))
+    profile = client.get("/profile/2").headers["etag"]
+    before = row_version(User.__tablename__, 2)
+
+    login(1)
+    new = stored_hash(db, 1)
+    assert new != old and hash_rounds(new) == BCRYPT_ROUNDS
+    assert bcrypt.checkpw(PASSWORD.encode(), new.encode())
+    # the other user's row, and so their cached profile, didn't move
+    assert row_version(User.__tablename__, 2) == before
+    assert client.get("/profile/2", headers={"If-None-Match": profile}).status_code == 304
+
+    login(1)  # already at the current cost: left alone
+    assert stored_hash(db, 1) == new
+
+
+def test_wrong_password_is_a_401(client, add_users):
+    add_users(1)
+    assert client.post("/login", data={"email": "u1@b.edu", "password": "nope"}).status_code == 401
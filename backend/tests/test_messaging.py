@@ -0,0 +1,99 @@
+"""Conversations: one per pair and listing, and keyset pages of message history."""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.exc import IntegrityError
+
+from app.crud.message_crud import decode_message_cursor, get_messages, get_or_create_conversation
+from app.database import engine
+from app.migrations import MIGRATIONS, run_migrations
+from app.models.conversation import Conversation, Message
+
+
+def test_same_pair_gets_the_same_conversation(db, add_users, add_listing):
+    add_users(3)
+    add_listing(1)
+    direct = get_or_create_conversation(db, 2, 1)
+    assert get_or_create_conversation(db, 1, 2).id == direct.id
+    about_listing = get_or_create_conversation(db, 1, 2, listing_id=1)
+    assert about_listing.id != direct.id
+    assert get_or_create_conversation(db, 2, 1, listing_id=1).id == about_listing.id
+    assert get_or_create_conversation(db, 1, 3).id not in (direct.id, about_listing.id)
+    assert get_or_create_conversation(db, 1, 1) == {"error": "Cannot message yourself"}
+    assert get_or_create_conversation(db, 1, 99) == {"error": "User not found"}
+
+
+@pytest.mark.parametrize("listing_id", [None, 1])
+def test_database_refuses_a_second_row_for_a_pair(add_users, add_listing, listing_id):
+    add_users(2)
+    add_listing(1)
+    row = {"user_a": 1, "user_b": 2, "listing_id": listing_id}
+    with engine.begin() as conn:
+        conn.execute(insert(Conversation), [row])
+    with pytest.raises(IntegrityError):
+        with engine.begin() as conn:
+            conn.execute(insert(Conversation), [row])
+
+
+def test_losing_a_race_returns_the_winners_conversation(db, add_users):
+    add_users(2)
+
+    # the other participant's insert lands between our SELECT and our INSERT
+    @event.listens_for(db, "before_flush", once=True)
+    def other_participant(session, flush_context, instances):
+        with engine.begin() as conn:
+            conn.execute(insert(Conversation), [{"user_a": 1, "user_b": 2, "listing_id": None}])
+
+    conversation = get_or_create_conversation(db, 2, 1)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id FROM conversations")).scalars().all() == [conversation.id]
+
+
+def test_history_pages_walk_back_through_ties(db, add_users):
+    add_users(2)
+    conversation = get_or_create_conversation(db, 1, 2)
+    start = datetime(2025, 3, 1, 12, 0, 0)
+    # three messages share each timestamp, so the id has to break the tie
+    rows = [
+        {"id": i, "conversation_id": conversation.id, "sender_id": 1 + i % 2, "body": f"m{i}", "created_at": start + timedelta(seconds=i // 3)}
+        for i in range(1, 23)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Message), rows)
+
+    seen, cursor = [], None
+    while True:
+        page = get_messages(db, conversation.id, decode_message_cursor(cursor) if cursor else None, limit=4)
+        seen += [m["id"] for m in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == sorted(range(1, 23), key=lambda i: (rows[i - 1]["created_at"], i), reverse=True)
+    assert decode_message_cursor("garbage") is None
+
+
+def test_migration_folds_duplicate_direct_conversations(monkeypatch):
+    from app import migrations
+
+    scratch = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'dupes.db')}")
+    monkeypatch.setattr(migrations, "MIGRATIONS", [m for m in MIGRATIONS if m[0] < 8])
+    run_migrations(scratch)
+    monkeypatch.undo()
+    with scratch.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, name, email, password_hash) VALUES (1, 'a', 'a@b.edu', 'x'), (2, 'b', 'b@b.edu', 'x')"))
+        for day in (1, 3, 2):
+            conn.execute(text(
+                "INSERT INTO conversations (user_a, user_b, listing_id, last_message_at) VALUES (1, 2, NULL, :at)"
+            ), {"at": datetime(2025, 1, day)})
+        for conversation_id in (1, 2, 3):
+            conn.execute(text(
+                "INSERT INTO messages (conversation_id, sender_id, body, created_at) VALUES (:c, 1, 'hi', :at)"
+            ), {"c": conversation_id, "at": datetime(2025, 1, 1)})
+    run_migrations(scratch)
+    with scratch.connect() as conn:
+        (kept, last_message_at), = conn.execute(text("SELECT id, last_message_at FROM conversations")).all()
+        assert kept == 1 and last_message_at.startswith("2025-01-03")
+        assert conn.execute(text("SELECT DISTINCT conversation_id FROM messages")).scalars().all() == [1]
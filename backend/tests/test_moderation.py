@@ -0,0 +1,72 @@
+"""Approving and rejecting booking requests: only the listing's owner, only once."""
+import pytest
+
+from app.database import get_async_engine
+from app.models.booking_request import BookingRequest
+
+
+@pytest.fixture(params=["returning", "select for update"])
+def requests_on_listing_1(request, monkeypatch, client, add_users, add_listing):
+    """Users 1 (owner of listing 1), 2 and 3; requests 1 and 2 from users 2 and 3 on listing 1."""
+    if request.param == "select for update":
+        # the path for backends without UPDATE ... RETURNING (MySQL)
+        monkeypatch.setattr(get_async_engine().sync_engine.dialect, "update_returning", False)
+    add_users(3)
+    add_listing(1, lister=1)
+    for subletter in (2, 3):
+        assert client.post("/booking_requests", json={"listing_id": 1, "subletter_id": subletter}).status_code == 200
+
+
+def status(db, req_id):
+    db.expire_all()
+    return db.get(BookingRequest, req_id).status
+
+
+def test_moderation_needs_a_session(client, db, requests_on_listing_1):
+    assert client.post("/booking_requests/1/approve").status_code == 401
+    assert client.post("/booking_requests/1/reject").status_code == 401
+    assert client.post("/booking_requests/moderate", json={"action": "approve", "ids": [1]}).status_code == 401
+    # an owner named by the client counts for nothing
+    assert client.post("/booking_requests/1/approve", params={"owner_id": 1}).status_code == 401
+    assert client.post("/booking_requests/moderate", json={"owner_id": 1, "action": "approve", "ids": [1]}).status_code == 401
+    assert (status(db, 1), status(db, 2)) == ("pending", "pending")
+
+
+def test_only_the_owner_can_approve(client, db, login, requests_on_listing_1):
+    login(2)
+    assert client.post("/booking_requests/1/approve").json() == {"error": "Unauthorized"}
+    assert status(db, 1) == "pending"
+
+    login(1)
+    assert client.post("/booking_requests/1/approve").json() == {
+        "ok": True, "contact_info": {"owner_email": "u1@b.edu", "requester_email": "u2@b.edu"},
+    }
+    assert status(db, 1) == "approved"
+    assert client.post("/booking_requests/1/approve").json() == {"error": "Request already approved"}
+
+
+def test_only_the_owner_can_reject(client, db, login, requests_on_listing_1):
+    login(3)
+    assert client.post("/booking_requests/2/reject").json() == {"error": "Unauthorized"}
+    assert status(db, 2) == "pending"
+    login(1)
+    assert client.post("/booking_requests/2/reject").json() == {"ok": True}
+    assert status(db, 2) == "rejected"
+    assert client.post("/booking_requests/2/approve").json() == {"error": "Request already rejected"}
+    assert client.post("/booking_requests/99/reject").json() == {"error": "Request not found"}
+
+
+def test_batch_moderation_reports_each_request(client, db, login, requests_on_listing_1):
+    login(2)
+    out = client.post("/booking_requests/moderate", json={"action": "approve", "ids": [1, 2]}).json()
+    assert out["updated"] == 0
+    assert [r["error"] for r in out["results"]] == ["Unauthorized", "Unauthorized"]
+
+    login(1)
+    out = client.post("/booking_requests/moderate", json={"action": "approve", "ids": [2, 99, 2]}).json()
+    assert out["updated"] == 1
+    assert out["results"] == [
+        {"id": 2, "ok": True, "contact_info": {"owner_email": "u1@b.edu", "requester_email": "u3@b.edu"}},
+        {"id": 99, "error": "Request not found"},
+    ]
+    assert (status(db, 1), status(db, 2)) == ("pending", "approved")
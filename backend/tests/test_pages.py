@@ -0,0 +1,57 @@
+"""Conditional GET for rendered pages, and writes from outside this process."""
+import pytest
+from sqlalchemy import update
+
+from app.database import engine
+from app.models.listing import Listing
+from app.models.user import User
+from app.services.change_tracking import bump_stored
+
+
+def another_worker_renames(listing_id: int, title: str) -> None:
+    """A listing write that none of this process's session hooks see, like a CLI import."""
+    with engine.begin() as conn:
+        conn.execute(update(Listing).where(Listing.id == listing_id).values(title=title))
+        bump_stored(conn, Listing.__tablename__)
+
+
+@pytest.mark.parametrize("path", ["/homepage?q=listing", "/profile/1", "/listings/1"])
+def test_unchanged_page_is_a_304(client, add_users, add_listing, path):
+    add_users(1)
+    add_listing(1)
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag
+    assert client.get(path, headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+    another_worker_renames(1, "Renamed elsewhere")
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert "Renamed elsewhere" in changed.text
+
+
+def test_profile_follows_its_user_row(client, db, add_users, add_listing):
+    add_users(2)
+    add_listing(1)
+    etag = client.get("/profile/1").headers["etag"]
+    other = client.get("/profile/2").headers["etag"]
+
+    db.get(User, 1).name = "New name"
+    db.commit()
+    changed = client.get("/profile/1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and "New name" in changed.text
+    # a different user's row moved, not this one's
+    assert client.get("/profile/2", headers={"If-None-Match": other}).status_code == 304
+
+
+def test_signed_in_profile(client, login, add_users, add_listing):
+    add_users(1)
+    add_listing(1)
+    assert client.get("/profile", follow_redirects=False).status_code == 303
+    login(1)
+    first = client.get("/profile")
+    assert first.status_code == 200 and "Listing 1" in first.text
+    assert client.get("/profile", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
@@ -0,0 +1,89 @@
+"""
+Query plan regression check for the hot endpoints.
+
+Seeds the test database, drives each hot endpoint in-process, captures the
+SQL it runs on both engines and runs EXPLAIN QUERY PLAN on every SELECT.
+A request fails if any statement falls back to a full scan of a table in
+CHECKED_TABLES (e.g. after an index was dropped or a query changed shape),
+or if it captured no SELECT at all, which would mean the check itself
+stopped seeing the query.
+"""
+import re
+from datetime import date
+
+import pytest
+from sqlalchemy import event, insert, text
+
+from app.database import engine, get_async_engine
+from app.models.booking_request import BookingRequest
+from app.models.listing import Listing
+from app.models.user import User
+
+CHECKED_TABLES = {"listings", "booking_requests", "users"}
+
+# (name, method, path, body)
+HOT_REQUESTS = [
+    ("incoming requests", "GET", "/incoming_requests/1", None),
+    ("homepage price filter", "GET", "/homepage?price=1500", None),
+    ("search price filter", "GET", "/search_results?price=1500", None),
+    ("search date filter", "GET", "/search_results?start_date=2025-06-01&end_date=2025-07-01", None),
+    ("search amenity filter", "GET", "/search_results?price=1500&amenities=wifi,furnished", None),
+    ("profile listings", "GET", "/profile/1", None),
+    ("booking duplicate check", "POST", "/booking_requests", {"listing_id": 3, "subletter_id": 2}),
+]
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+@pytest.fixture
+def plan_data():
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": i, "name": f"u{i}", "email": f"u{i}@b.edu", "password_hash": "x"} for i in range(1, 201)])
+        conn.execute(insert(Listing), [
+            {
+                "id": i, "title": f"Listing {i}", "lister": i % 200 + 1, "is_active": i % 5 != 0,
+                "cost_per_month": 600 + i % 3000, "bedrooms_available": 1 + i % 3, "bathrooms": 1 + i % 2,
+                "available_start_date": date(2025, 1 + i % 6, 1), "available_end_date": date(2025, 7 + i % 6, 1),
+                "latitude": 42.3, "longitude": -71.1,
+            }
+            for i in range(1, 2001)
+        ])
+        conn.execute(insert(BookingRequest), [
+            {"listing_id": i % 2000 + 1, "subletter_id": i % 200 + 1, "status": ("pending", "approved", "rejected")[i % 3]}
+            for i in range(1, 5001)
+        ])
+        conn.execute(text("ANALYZE"))
+
+
+def capture(client, method, path, body) -> list:
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    # async endpoints (e.g. POST /booking_requests) run on the async engine's pool
+    engines = (engine, get_async_engine().sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", listener)
+    try:
+        client.request(method, path, json=body)
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", listener)
+    return statements
+
+
+@pytest.mark.parametrize("method, path, body", [r[1:] for r in HOT_REQUESTS], ids=[r[0] for r in HOT_REQUESTS])
+def test_hot_queries_use_indexes(client, plan_data, method, path, body):
+    statements = capture(client, method, path, body)
+    assert statements, "no SELECT captured"
+    scans = []
+    for statement, parameters in statements:
+        with engine.connect() as conn:
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        for row in plan:
+            match = FULL_SCAN.match(row[-1])
+            if match and match.group(1) in CHECKED_TABLES:
+                scans.append(f"full scan of {match.group(1)}: {' '.join(statement.split())}")
+    assert not scans, "\n".join(scans)
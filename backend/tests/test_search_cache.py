@@ -0,0 +1,57 @@
+"""Search result cache: entries never outlive a listing write, wherever it was made."""
+from sqlalchemy import update
+
+from app.database import engine
+from app.models.listing import Listing
+from app.services.change_tracking import bump_stored
+from app.services.result_cache import ResultCache, search_cache
+
+
+def test_result_cache_drops_what_a_write_overtook():
+    cache = ResultCache(max_bytes=100, ttl=60)
+    generation = cache.generation
+    cache.invalidate()  # a write lands while the value is being computed
+    cache.put("a", [1, 2], generation)
+    assert cache.get("a") is None
+
+    cache.put("a", [1, 2], cache.generation)
+    assert cache.get("a") == [1, 2]
+    cache.put("big", "x" * 60, cache.generation)
+    cache.put("bigger", "y" * 60, cache.generation)  # over max_bytes: the oldest go first
+    assert (cache.get("a"), cache.get("big"), cache.get("bigger")) == (None, None, "y" * 60)
+    assert cache.stats()["evictions"] == 2
+
+
+def ids(client, **params):
+    return [item["id"] for item in client.get("/search_results", params=params).json()["items"]]
+
+
+def test_cached_until_a_listing_changes(client, login, add_users, add_listing):
+    add_users(1)
+    add_listing(1, cost_per_month=900)
+    add_listing(2, cost_per_month=1500)
+    assert ids(client, price=1000) == [1]
+    hits = search_cache.stats()["hits"]
+    assert ids(client, price=1000) == [1]
+    assert search_cache.stats()["hits"] == hits + 1
+
+    login(1)
+    assert client.post("/listings/1/deactivate").json()["ok"]
+    assert ids(client, price=1000) == []
+    assert client.post("/listings/1/activate").json()["ok"]
+    assert ids(client, price=1000) == [1]
+    assert client.delete("/listings/1").status_code == 200
+    assert ids(client, price=1000) == []
+
+
+def test_writes_from_other_processes_are_seen(client, add_users, add_listing):
+    add_users(1)
+    add_listing(1, cost_per_month=900)
+    add_listing(2, cost_per_month=1500)
+    assert ids(client, price=1000) == [1]
+
+    # e.g. scripts.import_listings, which can't reach this process's cache
+    with engine.begin() as conn:
+        conn.execute(update(Listing).where(Listing.id == 2).values(cost_per_month=950))
+        bump_stored(conn, Listing.__tablename__)
+    assert ids(client, price=1000) == [1, 2]
@@ -0,0 +1,44 @@
+"""Similar listings: closest first, never the listing itself or an inactive one, and revalidation."""
+from sqlalchemy import update
+
+from app.database import engine
+from app.models.listing import Listing
+from app.services.change_tracking import bump_stored
+
+
+def similar(client, listing_id, **params):
+    return [item["id"] for item in client.get(f"/listings/{listing_id}/similar", params=params).json()["items"]]
+
+
+def test_closest_first(client, add_users, add_listing):
+    add_users(1)
+    add_listing(1, cost_per_month=1000)
+    add_listing(2, cost_per_month=2600, bedrooms_available=3)
+    add_listing(3, cost_per_month=1050)
+    add_listing(4, cost_per_month=1000, latitude=42.40)  # ~5.5 km north
+    add_listing(5, cost_per_month=1000, is_active=False)
+    add_listing(6, cost_per_month=1000, latitude=None, longitude=None)
+    assert similar(client, 1) == [3, 4, 2]
+    assert similar(client, 1, k=1) == [3]
+    assert client.get("/listings/99/similar").status_code == 404
+
+
+def test_etag_follows_listing_writes_from_anywhere(client, add_users, add_listing):
+    add_users(1)
+    add_listing(1)
+    add_listing(2, cost_per_month=1100)
+    add_listing(3, cost_per_month=3000)
+    first = client.get("/listings/1/similar")
+    etag = first.headers["etag"]
+    assert [item["id"] for item in first.json()["items"]] == [2, 3]
+    assert client.get("/listings/1/similar", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/listings/1/similar", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    # no Last-Modified to compare against, so a date alone never makes a 304
+    assert client.get("/listings/1/similar", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}).status_code == 200
+
+    # another worker (or scripts.import_listings) moves listing 3 next to listing 1
+    with engine.begin() as conn:
+        conn.execute(update(Listing).where(Listing.id == 3).values(cost_per_month=1000))
+        bump_stored(conn, Listing.__tablename__)
+    changed = client.get("/listings/1/similar", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
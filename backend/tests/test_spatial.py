@@ -0,0 +1,79 @@
+"""Viewport and radius queries: the grid index against a brute-force scan, and /api/listings?bbox= / ?near=."""
+import random
+
+from app.services.index_loader import IndexLoader
+from app.services.spatial_index import GridIndex, haversine_km
+
+
+def scattered(n: int, seed: int = 5) -> dict:
+    rnd = random.Random(seed)
+    return {i: (42.3 + rnd.random() * 0.2, -71.2 + rnd.random() * 0.2) for i in range(1, n + 1)}
+
+
+def test_bbox_matches_a_scan():
+    points = scattered(2000)
+    index = GridIndex()
+    for listing_id, (lat, lng) in points.items():
+        index.insert(listing_id, lat, lng)
+    rnd = random.Random(1)
+    for _ in range(50):
+        south, west = 42.3 + rnd.random() * 0.2, -71.2 + rnd.random() * 0.2
+        north, east = south + rnd.random() * 0.1, west + rnd.random() * 0.1
+        expected = sorted(i for i, (lat, lng) in points.items() if south <= lat <= north and west <= lng <= east)
+        assert index.bbox(south, west, north, east) == expected
+    # a viewport wider than the occupied cells takes the other path
+    assert index.bbox(-90, -180, 90, 180) == sorted(points)
+
+
+def test_near_matches_a_scan():
+    points = scattered(2000)
+    index = GridIndex()
+    for listing_id, (lat, lng) in points.items():
+        index.insert(listing_id, lat, lng)
+    rnd = random.Random(2)
+    for _ in range(50):
+        lat, lng, radius = 42.3 + rnd.random() * 0.2, -71.2 + rnd.random() * 0.2, rnd.random() * 5
+        expected = {i for i, p in points.items() if haversine_km(lat, lng, *p) <= radius}
+        found = index.near(lat, lng, radius)
+        assert set(found) == expected
+        assert all(abs(found[i] - haversine_km(lat, lng, *points[i])) < 1e-9 for i in found)
+
+
+def test_moves_and_removals():
+    index = GridIndex()
+    index.insert(1, 42.35, -71.06)
+    index.insert(1, 40.71, -74.00)  # moved to another cell
+    assert index.bbox(42.3, -71.1, 42.4, -71.0) == []
+    assert index.bbox(40.7, -74.1, 40.8, -73.9) == [1]
+    index.remove(1)
+    index.remove(1)
+    assert len(index) == 0 and index.cells == {}
+
+
+def test_writes_during_a_build_are_replayed():
+    def build(session):
+        # a listing committed after the build's SELECT
+        loader.update(lambda index: index.insert(7, 42.35, -71.06))
+        return GridIndex()
+
+    loader = IndexLoader(build)
+    loader.update(lambda index: index.insert(1, 42.35, -71.06))  # nothing built yet: dropped
+    assert loader.idle
+    assert loader.get().bbox(42, -72, 43, -71) == [7]
+
+
+def test_api_bbox_and_near(client, add_users, add_listing):
+    add_users(1)
+    add_listing(1, latitude=42.35, longitude=-71.06)
+    add_listing(2, latitude=42.36, longitude=-71.05)
+    add_listing(3, latitude=40.71, longitude=-74.00)
+    add_listing(4, latitude=42.35, longitude=-71.06, is_active=False)
+
+    body = client.get("/api/listings", params={"bbox": "-71.1,42.3,-71.0,42.4"}).json()
+    assert [item["id"] for item in body["items"]] == [1, 2]
+
+    body = client.get("/api/listings", params={"near": "42.35,-71.06", "radius_km": 1}).json()
+    assert [item["id"] for item in body["items"]] == [1]
+    assert body["items"][0]["distance_km"] == 0
+
+    assert client.get("/api/listings", params={"bbox": "1,2,3"}).status_code == 400